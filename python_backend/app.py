@@ -1,480 +1,1536 @@
+import atexit
+import bisect
+import contextlib
 import csv
+import hashlib
+import io
+import json
+import logging
 import os
 import random
-import sqlite3
-from io import StringIO, BytesIO
+import sys
+import threading
+import time
+from io import StringIO
 from datetime import datetime, date
 from typing import Optional, Dict, Any
-from flask import Flask, jsonify, request, Response, send_from_directory
+from urllib.parse import urlencode
+from flask import Blueprint, Flask, jsonify, request, Response, send_from_directory, send_file, g, has_app_context, has_request_context
 from flask_cors import CORS
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib.styles import getSampleStyleSheet
-from openpyxl import Workbook
+import exports
+import schema
+import snapshots
+from db import ConnectionPool
+from event_relay import EventRelay
+from events import EventBus, format_sse
+from export_jobs import ExportJobManager
+from metrics import InstrumentedConnection, Metrics
+from presence import PresenceTracker
+from report_db import ReportSnapshot
+from roster import RosterIndex, normalize_mac
+from roster_import import EmptyImportError, import_roster, iter_class_list
+from sightings import SightingCache
+from static_assets import AssetTable
+from write_behind import PresentSet, WriteBehindQueue
 
 # ---------------- App setup ----------------
-app = Flask(__name__)
-CORS(app)
+# Routes are registered on a blueprint; create_app() builds the Flask app around them.
+# Importing this module does not open the database.
+api = Blueprint("attendance", __name__)
 
 # ---------------- Robust paths (absolute) ----------------
+# Defaults; create_app() rebinds them from its config.
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))          # .../PRJ_GROUP5/python_backend
-DATA_DIR = os.path.join(BASE_DIR, "data")                      # .../PRJ_GROUP5/python_backend/data
+DATA_DIR = os.environ.get("ATTENDANCE_DATA_DIR") or os.path.join(BASE_DIR, "data")  # .../PRJ_GROUP5/python_backend/data
 CSV_PATH = os.path.join(DATA_DIR, "cleaned_class_list.csv")    # absolute path
 DB_PATH  = os.path.join(DATA_DIR, "attendance.db")             # absolute path
-
-print(f"[INFO] BASE_DIR = {BASE_DIR}")
-print(f"[INFO] DATA_DIR = {DATA_DIR}")
-print(f"[INFO] CSV_PATH = {CSV_PATH}")
-print(f"[INFO] DB_PATH  = {DB_PATH}")
-
-# Detect web directory (sibling to python_backend)
-WEB_DIR = os.path.join(os.path.dirname(BASE_DIR), "web")
-print(f"[INFO] WEB_DIR = {WEB_DIR}")
-
-# Configure Flask to serve the frontend static files from the sibling web/ directory
-# Disable Flask's automatic static route to avoid shadowing API paths
-app.static_folder = None
+WEB_DIR = os.path.join(os.path.dirname(BASE_DIR), "web")       # frontend, sibling to python_backend
+
+# Newest first, shared by exports and export jobs
+EXPORT_ORDER = " ORDER BY ts DESC, id DESC"
+
+# Live feed (GET /api/stream): seconds between heartbeat comments, per-subscriber queue bound
+STREAM_HEARTBEAT_SECONDS = float(os.environ.get("STREAM_HEARTBEAT_SECONDS", "15"))
+STREAM_QUEUE_SIZE = int(os.environ.get("STREAM_QUEUE_SIZE", "256"))
+# Open streams per worker process (0 = no limit). Each one holds a request thread, so
+# gunicorn.conf.py sets this below the thread count to keep threads for the API.
+STREAM_MAX_CONNECTIONS = int(os.environ.get("STREAM_MAX_CONNECTIONS", "0"))
+# Seconds a client over the limit waits before its EventSource reconnects
+STREAM_BUSY_RETRY_SECONDS = 10
+
+# Upper bound on sightings accepted by one POST /api/validate/batch (and events by POST /api/sync)
+BATCH_MAX_SIGHTINGS = int(os.environ.get("BATCH_MAX_SIGHTINGS", "20000"))
+
+# Longest client event id accepted by POST /api/sync
+SYNC_EVENT_ID_MAX_LENGTH = 128
+
+# ---------------- Logging ----------------
+# Diagnostics go to the "attendance" logger in the same "[LEVEL] message" form the old
+# print calls used; create_app() sets the level (LOG_LEVEL). Per-scan detail is DEBUG.
+log = logging.getLogger("attendance")
+
+# ---------------- Live event feed ----------------
+event_bus = EventBus(queue_size=STREAM_QUEUE_SIZE)
+
+def attendance_event(student: Dict[str, Any], mac: str, ts: str, session_id: Optional[int],
+                     room: str = "") -> Dict[str, Any]:
+    """Payload of an "attendance-logged" event."""
+    return {
+        "student_id": student["Student ID"],
+        "name": student["Name"],
+        "mac": mac,
+        "ts": ts,
+        "session_id": session_id,
+        "room": room,
+    }
+
+# With STREAM_POLL_SECONDS set, event_relay feeds event_bus from the database (see
+# event_relay.py), so every worker streams every worker's writes and handlers do not
+# publish themselves. Rebuilt by create_app(); None when off.
+event_relay: Optional[EventRelay] = None
+
+def publish_event(event_type: str, data: Dict[str, Any]) -> None:
+    if event_relay is None:
+        event_bus.publish(event_type, data)
+
+def publish_committed(events) -> None:
+    for event in events:
+        publish_event("attendance-logged", event)
 
 # ---------------- In-memory class list ----------------
-class_list: list[Dict[str, Any]] = []  # {"Name": ..., "Student ID": ..., "MAC": ...}
+class_list = RosterIndex()  # students {"Name": ..., "Student ID": ..., "MAC": ...} indexed by ID, MAC and name
 
 # ---------------- DB helpers ----------------
-def get_db():
-    os.makedirs(DATA_DIR, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Persistent connections (WAL, synchronous=NORMAL, page cache, mmap, busy timeout),
+# opened by create_app()
+db_pool: Optional[ConnectionPool] = None
+
+# Statements at or above this many milliseconds are logged as slow (0 = off); set by create_app()
+slow_query_seconds = 0.0
 
-def column_exists(con, table, column):
-    rows = con.execute(f"PRAGMA table_info({table})").fetchall()
-    return any(r[1] == column for r in rows)
+def get_db():
+    """Return the pooled connection for the current request (one per request, reused
+    by nested helpers), or a per-thread connection outside a request.
+    Request connections are wrapped to count statements and SQLite time (see metrics.py).
+    Use as `with get_db() as con:` - the block commits/rolls back but does not close.
+    """
+    if not has_app_context():
+        return db_pool.thread_connection()
+    if "db" not in g:
+        g.db = InstrumentedConnection(db_pool.acquire(), metrics, slow_query_seconds, log_slow_query)
+    return g.db
+
+def release_db(exc):
+    report_db = g.pop("report_db", None)
+    conn = g.pop("db", None)
+    if report_db is not None and report_db is not conn:
+        report_db.raw.close()
+    if conn is not None:
+        db_pool.release(conn.raw)
+
+# ---------------- Reporting snapshot ----------------
+# With REPORT_SNAPSHOT_SECONDS > 0, reports and exports read a read-only copy of the
+# database refreshed in the background (see report_db.py) instead of the one scans write
+# to; live=1 on a request reads the live database. Every report and export response says
+# which one it read and how old the data is (X-Data-Source, X-Data-As-Of,
+# X-Data-Age-Seconds). Rebuilt by create_app(); None when off.
+report_snapshot: Optional[ReportSnapshot] = None
+
+def wants_live(value) -> bool:
+    return str(value).strip().lower() in ("1", "true", "yes")
+
+def report_connector(live: bool = False):
+    """Opener of connections for reading reports: the reporting copy's, or the live
+    database's when live data is asked for, reporting mode is off or there is no copy
+    yet. Records the source for the response headers. Exports that outlive the request
+    (streamed or background) open their connection with it later."""
+    if report_snapshot is not None and not live:
+        as_of = report_snapshot.as_of()  # a refresh before the open only overstates the age
+        if as_of is not None:
+            g.data_source = ("snapshot", as_of)
+            return report_snapshot.connect
+    g.data_source = ("live", None)
+    return db_pool.connect
+
+def get_report_db(live: Optional[bool] = None):
+    """get_db() for report endpoints: the reporting copy unless the request has live=1
+    (or `live` says so); see report_connector."""
+    if "report_db" not in g:
+        connect = report_connector(wants_live(request.args.get("live", "")) if live is None else live)
+        g.report_db = (get_db() if g.data_source[0] == "live"
+                       else InstrumentedConnection(connect(), metrics, slow_query_seconds, log_slow_query))
+    return g.report_db
+
+def stamp_data_source(response):
+    """Staleness headers on responses that read through get_report_db/report_connect."""
+    source = g.get("data_source")
+    if source is not None:
+        kind, as_of = source
+        now = time.time()
+        as_of = now if as_of is None else as_of
+        response.headers["X-Data-Source"] = kind
+        response.headers["X-Data-As-Of"] = datetime.fromtimestamp(as_of).isoformat(timespec="seconds")
+        response.headers["X-Data-Age-Seconds"] = f"{max(0.0, now - as_of):.1f}"
+    return response
+
+def log_slow_query(sql: str, seconds: float) -> None:
+    where = f"{request.method} {request.path}" if has_request_context() else "startup"
+    log.warning(f"Slow query ({seconds * 1000:.1f} ms, {where}): {' '.join(sql.split())}")
 
 def init_db():
     os.makedirs(DATA_DIR, exist_ok=True)
-    with get_db() as con:
-        # sessions: track lectures
-        con.execute(
-            """
-            CREATE TABLE IF NOT EXISTS sessions (
-                id       INTEGER PRIMARY KEY AUTOINCREMENT,
-                name     TEXT,
-                start_ts TEXT NOT NULL,
-                end_ts   TEXT
-            )
-            """
-        )
-
-        # attendance: session_id is nullable (for "no active session" -> day mode)
-        con.execute(
-            """
-            CREATE TABLE IF NOT EXISTS attendance (
-                id          INTEGER PRIMARY KEY AUTOINCREMENT,
-                student_id  TEXT NOT NULL,
-                name        TEXT NOT NULL,
-                mac         TEXT,
-                ts          TEXT NOT NULL,
-                session_id  INTEGER,
-                FOREIGN KEY(session_id) REFERENCES sessions(id)
-            )
-            """
-        )
+    report = schema.ensure_schema(get_db())
+    if report is not None:
+        log.info(f"Migrated {DB_PATH} to schema version {schema.SCHEMA_VERSION}: {report}")
+    log.info(f"DB ready at {DB_PATH}")
+
+# Dedup is enforced by the partial UNIQUE indexes (see schema.py): a duplicate insert is a
+# no-op, so callers check the cursor's rowcount instead of SELECTing first.
+INSERT_ATTENDANCE_SQL = (
+    "INSERT INTO attendance (student_id, name, mac, ts, day, session_id) VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT DO NOTHING"
+)
+
+def attendance_params(student: Dict[str, Any], mac: str, ts: str, session_id: Optional[int]) -> tuple:
+    return (student["Student ID"], student["Name"], mac, ts, ts[:10], session_id)
+
+def log_attendance(con, student: Dict[str, Any], mac: str, ts: str, session_id: Optional[int]) -> bool:
+    """Insert one attendance row. Returns False if the student is already logged in scope."""
+    cur = con.execute(INSERT_ATTENDANCE_SQL, attendance_params(student, mac, ts, session_id))
+    return cur.rowcount == 1
+
+def attendance_filter(session_id: str = "", date_from: str = "", date_to: str = "", room: str = ""):
+    """Build the WHERE clause shared by the attendance list, exports and export jobs.
+    A room filter keeps rows logged in that room's sessions.
+    Returns (" WHERE ..." or "", params).
+    """
+    where = []
+    params = []
 
-        # Ensure session_id column exists (migrate older DBs)
-        if not column_exists(con, "attendance", "session_id"):
-            con.execute("ALTER TABLE attendance ADD COLUMN session_id INTEGER")
+    if session_id:
+        where.append("session_id = ?")
+        params.append(session_id)
+    if room:
+        where.append("session_id IN (SELECT id FROM sessions WHERE room = ?)")
+        params.append(room)
+    if date_from:
+        where.append("day >= DATE(?)")
+        params.append(date_from)
+    if date_to:
+        where.append("day <= DATE(?)")
+        params.append(date_to)
 
-    print(f"[INFO] DB ready at {DB_PATH}")
+    return (" WHERE " + " AND ".join(where)) if where else "", params
 
-# ---------------- CSV loader ----------------
-def load_class_list():
-    """Load Name, Student ID, MAC Address (optional) from CSV into memory.
+# ---------------- CSV import ----------------
+def read_class_list_csv(path: str = CSV_PATH) -> list:
+    """Read Name, Student ID, MAC Address (optional) from a class-list CSV.
     Support multiple CSV header layouts (e.g. Name & Student ID) or
     (student_id, first_name, last_name).
     """
-    class_list.clear()
+    students = []
     try:
-        if not os.path.exists(CSV_PATH):
-            print(f"[WARN] CSV not found at {CSV_PATH}. Validation will fail until the file exists.")
+        if not os.path.exists(path):
+            log.warning(f"CSV not found at {path}. Import skipped.")
             try:
-                print("[INFO] Files currently in DATA_DIR:")
-                for f in os.listdir(DATA_DIR):
-                    print("  -", f)
+                log.info("Files currently in DATA_DIR: " + ", ".join(os.listdir(DATA_DIR)))
             except Exception as e:
-                print(f"[INFO] Could not list DATA_DIR: {e}")
-            return
-
-        with open(CSV_PATH, mode="r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            fieldnames = [fn.strip() for fn in (reader.fieldnames or [])]
-            lower_fields = [fn.lower() for fn in fieldnames]
-
-            # Helper to grab a value from the row using case-insensitive keys
-            def get_val(row, *keys):
-                for k in keys:
-                    for fn in row.keys():
-                        if fn and fn.strip().lower() == k.lower():
-                            return (row.get(fn) or "").strip()
-                return ""
-
-            # Determine layout
-            has_name = any(fn.lower() == "name" for fn in fieldnames)
-            has_student_id = any(fn.lower() in ("student id", "student_id", "studentid") for fn in fieldnames)
-            has_first_last = ("first_name" in lower_fields or "first name" in lower_fields) and ("last_name" in lower_fields or "last name" in lower_fields)
-            has_mac = any("mac" in fn.lower() for fn in fieldnames)
-
-            for row in reader:
-                # Normalize values
-                if has_name and has_student_id:
-                    name = get_val(row, "Name")
-                    sid = get_val(row, "Student ID", "student_id")
-                elif has_first_last and has_student_id:
-                    first = get_val(row, "first_name", "first name")
-                    last = get_val(row, "last_name", "last name")
-                    name = (first + " " + last).strip()
-                    sid = get_val(row, "student_id", "Student ID")
-                else:
-                    # Fallback: try common alternatives
-                    name = get_val(row, "name", "full_name", "full name")
-                    sid = get_val(row, "student_id", "student id", "id")
-
-                mac = get_val(row, "MAC", "MAC Address", "mac_address") if has_mac else ""
-
-                if name and sid:
-                    class_list.append({"Name": name, "Student ID": sid, "MAC": mac})
-
-        print(f"[INFO] Loaded {len(class_list)} students from {CSV_PATH}")
+                log.info(f"Could not list DATA_DIR: {e}")
+            return students
+
+        with open(path, mode="r", encoding="utf-8", newline="") as f:
+            students = list(iter_class_list(f))
+
+        log.info(f"Read {len(students)} students from {path}")
     except Exception as e:
-        print(f"[ERROR] Failed to load class list: {e}")
+        log.error(f"Failed to read class list CSV: {e}")
+    return students
+
+# ---------------- Roster store ----------------
+# The students table is the source of truth. Each worker keeps class_list as a
+# read-mostly copy and revalidates it against the "roster" meta counter once per request.
+roster_lock = threading.Lock()
+
+def load_class_list(con=None):
+    """(Re)load the in-memory roster from the students table."""
+    con = con or get_db()
+    with roster_lock:
+        version = schema.read_version(con, "roster")
+        rows = con.execute("SELECT name, student_id, mac FROM students ORDER BY rowid").fetchall()
+        class_list.rebuild(({"Name": r[0], "Student ID": r[1], "MAC": r[2]} for r in rows), version)
+    sighting_cache.clear()  # MAC/name -> student may have changed
+    log.info(f"Loaded {len(class_list)} students (roster version {version})")
+
+def get_class_list() -> RosterIndex:
+    """The roster, reloaded first if another worker changed it. Checked once per request."""
+    if has_app_context() and g.get("roster_checked"):
+        return class_list
+    if schema.read_version(get_db(), "roster") != class_list.version:
+        load_class_list()
+    if has_app_context():
+        g.roster_checked = True
+    return class_list
+
+def seed_students_from_csv():
+    """First start against a database without a roster: import the class-list CSV once."""
+    con = get_db()
+    if schema.read_version(con, "roster") or con.execute("SELECT 1 FROM students LIMIT 1").fetchone():
+        return
+    students = read_class_list_csv(CSV_PATH)
+    if students:
+        report = import_roster(con, students)
+        if report["inserted"]:
+            log.info(f"Imported {report['inserted']} students from {CSV_PATH}")
 
 # ---------------- Session helpers ----------------
-def get_active_session() -> Optional[Dict[str, Any]]:
-    with get_db() as con:
-        row = con.execute(
-            "SELECT id, name, start_ts, end_ts FROM sessions WHERE end_ts IS NULL ORDER BY id DESC LIMIT 1"
-        ).fetchone()
-    return dict(row) if row else None
+# Each room (where a scanner sits) runs at most one open session at a time. Clients that
+# send no room use the default room "".
+SESSION_COLUMNS = "id, name, start_ts, end_ts, room"
+OPEN_SESSIONS_SQL = f"SELECT {SESSION_COLUMNS} FROM sessions WHERE end_ts IS NULL"
+
+def normalize_room(value) -> str:
+    return " ".join(str(value or "").split())
+
+class ActiveSessionCache:
+    """In-process map of room -> open session.
+
+    start_session / end_active_session write through. Every read compares the
+    "session" counter in the meta table (a primary-key lookup) against the cached
+    version; when another worker process has started or ended a session, all open
+    sessions are reloaded in one query on the ux_sessions_open_room index (one row
+    per running lecture). The map is replaced, never mutated, so readers need no copy.
+    on_change(rooms) is called with the rooms whose open session changed in a reload.
+    """
 
-def start_session(name: Optional[str]) -> Dict[str, Any]:
+    def __init__(self, on_change=None):
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self.on_change = on_change
+
+    def all(self, con) -> Dict[str, Dict[str, Any]]:
+        version = schema.read_version(con, "session")
+        with self._lock:
+            if version == self._version:
+                return self._sessions
+        sessions = {r["room"]: dict(r) for r in con.execute(OPEN_SESSIONS_SQL)}
+        with self._lock:
+            previous = self._sessions
+            self._version, self._sessions = version, sessions
+        if self.on_change:
+            changed = {room for room in previous.keys() | sessions.keys()
+                       if (previous.get(room) or {}).get("id") != (sessions.get(room) or {}).get("id")}
+            if changed:
+                self.on_change(changed)
+        return sessions
+
+    def get(self, con, room: str = "") -> Optional[Dict[str, Any]]:
+        session = self.all(con).get(room)
+        return dict(session) if session else None
+
+    def apply(self, version: int, room: str, session: Optional[Dict[str, Any]]) -> None:
+        """Record one room's change, committed as `version`. If the cache missed a change
+        in between, it is dropped and reloaded on the next read instead."""
+        with self._lock:
+            if self._version != version - 1:
+                self._version = None
+                return
+            sessions = dict(self._sessions)
+            if session:
+                sessions[room] = session
+            else:
+                sessions.pop(room, None)
+            self._version, self._sessions = version, sessions
+
+def forget_sightings(rooms) -> None:
+    sighting_cache.forget_rooms(rooms)
+
+active_session_cache = ActiveSessionCache(on_change=forget_sightings)
+
+def get_active_session(room: str = "") -> Optional[Dict[str, Any]]:
+    return active_session_cache.get(get_db(), room)
+
+def close_session(con, session_id: int, now: str) -> None:
+    """End a session and freeze its attendance (see snapshots.py), in the caller's transaction."""
+    con.execute("UPDATE sessions SET end_ts = ? WHERE id = ?", (now, session_id))
+    if presence is not None:
+        presence.flush_session(con, session_id)
+    snapshots.freeze_session(con, session_id)
+    if present_set is not None:
+        present_set.forget(("session", session_id))
+
+def start_session(name: Optional[str], room: str = "") -> Dict[str, Any]:
     sess_name = (name or f"Lecture {date.today().isoformat()}").strip()
     now = datetime.now().isoformat(timespec="seconds")
+    if write_behind is not None:
+        write_behind.flush()  # the snapshot of the session ended here needs its queued rows
     with get_db() as con:
-        # end any existing session automatically
-        con.execute("UPDATE sessions SET end_ts = ? WHERE end_ts IS NULL", (now,))
-        con.execute("INSERT INTO sessions (name, start_ts) VALUES (?, ?)", (sess_name, now))
-        new_id = con.execute("SELECT last_insert_rowid()").fetchone()[0]
-        row = con.execute("SELECT id, name, start_ts, end_ts FROM sessions WHERE id = ?", (new_id,)).fetchone()
+        # Under the write lock, so concurrent starts in a room run one after the other:
+        # each ends the session the previous one opened
+        con.execute("BEGIN IMMEDIATE")
+        # end the room's open session automatically
+        if previous := con.execute(OPEN_SESSIONS_SQL + " AND room = ?", (room,)).fetchone():
+            close_session(con, previous["id"], now)
+        new_id = con.execute(
+            "INSERT INTO sessions (name, start_ts, room) VALUES (?, ?, ?)", (sess_name, now, room)
+        ).lastrowid
+        row = con.execute(f"SELECT {SESSION_COLUMNS} FROM sessions WHERE id = ?", (new_id,)).fetchone()
+        version = schema.bump_version(con, "session")
+    active_session_cache.apply(version, room, dict(row))
+    sighting_cache.forget_rooms([room])
+    publish_event("session-started", dict(row))
     return dict(row)
 
-def end_active_session() -> Optional[Dict[str, Any]]:
+def end_active_session(room: str = "") -> Optional[Dict[str, Any]]:
     now = datetime.now().isoformat(timespec="seconds")
+    if write_behind is not None:
+        write_behind.flush()
     with get_db() as con:
-        row = con.execute(
-            "SELECT id, name, start_ts, end_ts FROM sessions WHERE end_ts IS NULL ORDER BY id DESC LIMIT 1"
-        ).fetchone()
+        con.execute("BEGIN IMMEDIATE")  # one of several concurrent ends closes the session
+        row = con.execute(OPEN_SESSIONS_SQL + " AND room = ?", (room,)).fetchone()
         if not row:
             return None
-        con.execute("UPDATE sessions SET end_ts = ? WHERE id = ?", (now, row["id"]))
-        row = con.execute("SELECT id, name, start_ts, end_ts FROM sessions WHERE id = ?", (row["id"],)).fetchone()
+        close_session(con, row["id"], now)
+        row = con.execute(f"SELECT {SESSION_COLUMNS} FROM sessions WHERE id = ?", (row["id"],)).fetchone()
+        version = schema.bump_version(con, "session")
+    active_session_cache.apply(version, room, None)
+    sighting_cache.forget_rooms([room])
+    publish_event("session-ended", dict(row))
     return dict(row)
 
-# ---------------- Startup ----------------
-init_db()
-load_class_list()
+# ---------------- Sighting debounce ----------------
+# Students already logged per room and scope, so repeated scans of the same device are
+# answered from memory (see sightings.py). Rebuilt by create_app().
+sighting_cache = SightingCache()
+
+def seed_sightings(con, room: str, day: str, active: Optional[Dict[str, Any]]) -> None:
+    """Load the room's current scope from the DB the first time this worker scans in it."""
+    if not sighting_cache.needs_seed(room, day, active):
+        return
+    if active:
+        rows = con.execute("SELECT student_id FROM attendance WHERE session_id = ?", (active["id"],))
+    else:
+        rows = con.execute("SELECT student_id FROM attendance WHERE day = ? AND session_id IS NULL", (day,))
+    sighting_cache.seed(room, [r[0] for r in rows], day, active)
+
+# ---------------- Fuzzy name matching ----------------
+# Scans and manual entries that carry only a device or typed name ("John's iPhone") and
+# match no roster name exactly are ranked with the roster's name index (name_match.py).
+# The best candidate is logged when it scores at least NAME_MATCH_AUTO_SCORE and leads
+# the runner-up by NAME_MATCH_MARGIN; otherwise scans with a candidate scoring at least
+# NAME_MATCH_MIN_SCORE are queued in pending_matches for the lecturer to confirm.
+NAME_MATCH_AUTO_SCORE = float(os.environ.get("NAME_MATCH_AUTO_SCORE", "0.85"))
+NAME_MATCH_MIN_SCORE = float(os.environ.get("NAME_MATCH_MIN_SCORE", "0.6"))
+NAME_MATCH_MARGIN = float(os.environ.get("NAME_MATCH_MARGIN", "0.1"))
+NAME_MATCH_CANDIDATES = 5
+
+def fuzzy_match(roster: RosterIndex, name: str):
+    """(student to log or None, candidates as [{"student_id", "name", "score"}, ...])."""
+    ranked = roster.search_name(name, limit=NAME_MATCH_CANDIDATES, min_score=NAME_MATCH_MIN_SCORE)
+    candidates = [{"student_id": st["Student ID"], "name": st["Name"], "score": score} for score, st in ranked]
+    if ranked and ranked[0][0] >= NAME_MATCH_AUTO_SCORE and (
+            len(ranked) == 1 or ranked[0][0] - ranked[1][0] >= NAME_MATCH_MARGIN):
+        return ranked[0][1], candidates
+    return None, candidates
+
+PENDING_MATCH_COLUMNS = "id, device_name, mac, room, session_id, day, ts, candidates, status, student_id, resolved_ts"
+
+def pending_match_dict(row) -> Dict[str, Any]:
+    match = dict(row)
+    match["candidates"] = json.loads(match["candidates"])
+    return match
+
+def queue_pending_match(con, name: str, mac: str, ts: str, session: Optional[Dict[str, Any]],
+                        room: str, candidates: list) -> Dict[str, Any]:
+    """Queue a pending match for this device name and scope, or return the one already
+    recorded there (possibly confirmed or rejected since)."""
+    session_id = session["id"] if session else None
+    cur = con.execute(
+        "INSERT INTO pending_matches (device_name, mac, room, session_id, day, ts, candidates) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT DO NOTHING",
+        (name, mac, room, session_id, ts[:10], ts, json.dumps(candidates)),
+    )
+    if cur.rowcount == 1:
+        row = con.execute(f"SELECT {PENDING_MATCH_COLUMNS} FROM pending_matches WHERE id = ?", (cur.lastrowid,)).fetchone()
+        con.commit()
+        match = pending_match_dict(row)
+        publish_event("match-pending", match)
+        return match
+    row = con.execute(
+        f"SELECT {PENDING_MATCH_COLUMNS} FROM pending_matches "
+        "WHERE device_name = ? AND room = ? AND day = ? AND IFNULL(session_id, 0) = ?",
+        (name, room, ts[:10], session_id or 0),
+    ).fetchone()
+    return pending_match_dict(row)
+
+# ---------------- Write-behind ingestion ----------------
+# WRITE_BEHIND=on: scans and manual marks are deduplicated against present_set and their
+# inserts are group-committed by write_behind's writer thread (see write_behind.py);
+# "sync" commits each insert before replying, for tests. Both are None when off.
+write_behind: Optional[WriteBehindQueue] = None
+present_set: Optional[PresentSet] = None
+
+def record_attendance(con, student: Dict[str, Any], mac: str, ts: str,
+                      session: Optional[Dict[str, Any]], room: str = "") -> bool:
+    """Log a scan or manual mark in the session (or, without one, the day) scope and
+    publish it once committed. Returns False if the student is already logged there."""
+    session_id = session["id"] if session else None
+    event = attendance_event(student, mac, ts, session_id, room if session else "")
+    if write_behind is None:
+        if not log_attendance(con, student, mac, ts, session_id):
+            return False
+        con.commit()
+        publish_committed([event])
+        return True
+    scope = ("session", session_id) if session else ("day", ts[:10])
+    if not present_set.claim(con, scope, student["Student ID"]):
+        return False
+    try:
+        write_behind.submit(attendance_params(student, mac, ts, session_id), event)
+    except RuntimeError:
+        present_set.forget(scope)  # not queued, so the student is not present after all
+        raise
+    return True
+
+@contextlib.contextmanager
+def direct_writes():
+    """Wrap an endpoint's own write transaction that inserts attendance rows (batch
+    uploads, sync, confirmed matches). With write-behind on, the queue is committed
+    first, so the transaction sees queued rows. The block gets claim(scope, student_id),
+    which reserves the student in the present-set and returns False if a scan queued
+    since then already has them, so two replies never both say "logged" for one row.
+    If the block fails, its rows are rolled back, so the scopes it claimed in are
+    reloaded."""
+    if present_set is None:
+        yield lambda scope, student_id: True
+        return
+    write_behind.flush()
+    scopes = set()
+
+    def claim(scope, student_id) -> bool:
+        scopes.add(scope)
+        return present_set.claim_loaded(scope, student_id)
+
+    try:
+        yield claim
+    except BaseException:
+        for scope in scopes:
+            present_set.forget(scope)
+        raise
+
+def shutdown() -> None:
+    """Commit queued write-behind inserts and presence intervals. Runs at interpreter exit
+    and on gunicorn worker exit."""
+    if write_behind is not None:
+        write_behind.close()
+    if presence is not None:
+        presence.close()
+    if report_snapshot is not None:
+        report_snapshot.close()
+    if event_relay is not None:
+        event_relay.close()
+
+atexit.register(shutdown)
+
+# ---------------- Presence tracking ----------------
+# Sightings of students during a session are folded into presence intervals (see
+# presence.py); the summed length is attendance.dwell_seconds. With min_dwell_seconds
+# set, a scan only logs a student once they have been seen for that long, and the row
+# carries the time they were first seen. Rebuilt by create_app(); None when off.
+presence: Optional[PresenceTracker] = None
+min_dwell_seconds = 0.0
+
+def dwell_pending_response(student: Dict[str, Any], session: Dict[str, Any], dwell: int):
+    """Reply for a scan of a student not yet seen for min_dwell_seconds."""
+    return jsonify({
+        "status": "valid",
+        "student": student,
+        "logged": False,
+        "reason": "dwell_pending",
+        "scope": "session",
+        "session": session,
+        "dwell_seconds": dwell,
+        "min_dwell_seconds": min_dwell_seconds,
+    }), 200
+
+# ---------------- Session snapshots ----------------
+# Decoded bitmaps of closed sessions for GET /api/reports/sets; rebuilt by create_app()
+snapshot_store = snapshots.SnapshotStore()
+
+# Most sessions one set query may cover
+SET_QUERY_MAX_SESSIONS = int(os.environ.get("SET_QUERY_MAX_SESSIONS", "1000"))
+
+# Students x sessions matrix for GET /api/reports/matrix (see attendance_matrix.py);
+# created on the first request so NumPy is only loaded by workers that serve one
+matrix_cache = None
+
+# Attendance rate below which GET /api/reports/matrix flags a student as chronically absent
+CHRONIC_ABSENCE_RATE = float(os.environ.get("CHRONIC_ABSENCE_RATE", "0.9"))
+
+def parse_session_ids(value: str) -> list:
+    """Comma-separated session ids -> list of ints (ValueError if malformed)."""
+    return [int(part) for part in value.split(",") if part.strip()]
+
+# ---------------- Export jobs ----------------
+export_jobs: Optional[ExportJobManager] = None  # started by create_app()
+
+# Picks the student for a simulated scan; reseeded by create_app()
+scan_simulator = random.Random()
+
+# ---------------- Static frontend ----------------
+# Files under WEB_DIR with ETags and gzip/brotli variants, read once by create_app()
+# (see static_assets.py); None serves straight from disk
+static_assets: Optional[AssetTable] = None
+
+# ---------------- App factory ----------------
+DEFAULT_CONFIG = {
+    "DATA_DIR": DATA_DIR,
+    # Frontend to serve: web/ by default, or e.g. a React build/ directory
+    "WEB_DIR": os.environ.get("WEB_DIR") or WEB_DIR,
+    # Keep the frontend in memory, precompressed; off re-reads files on every request
+    # (handy while editing web/)
+    "STATIC_ASSET_TABLE": os.environ.get("STATIC_ASSET_TABLE", "on") != "off",
+    # Idle connections kept for reuse; busier moments open more (one per request thread)
+    "DB_POOL_MAX_IDLE": int(os.environ.get("DB_POOL_MAX_IDLE") or os.environ.get("DB_POOL_SIZE") or "8"),
+    "DB_BUSY_TIMEOUT_MS": int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000")),
+    "EXPORT_WORKERS": int(os.environ.get("EXPORT_WORKERS", "2")),
+    "SEED_ROSTER_CSV": True,  # import the class-list CSV into an empty students table
+    # Seed for the student picked by a simulated scan (POST /api/validate with no device);
+    # set it to make simulated scans reproducible
+    "SIMULATED_SCAN_SEED": os.environ.get("SIMULATED_SCAN_SEED"),
+    "LOG_LEVEL": os.environ.get("LOG_LEVEL", "INFO"),  # DEBUG adds per-scan detail
+    "SLOW_QUERY_MS": float(os.environ.get("SLOW_QUERY_MS", "0")),  # log slower statements; 0 = off
+    # Repeated scans answered from memory: entries kept (LRU) and their lifetime; 0 = off
+    "SIGHTING_CACHE_SIZE": int(os.environ.get("SIGHTING_CACHE_SIZE", "50000")),
+    "SIGHTING_CACHE_TTL_SECONDS": float(os.environ.get("SIGHTING_CACHE_TTL_SECONDS", "120")),
+    # Group-commit scan inserts from one writer thread: off, on, or sync (tests)
+    "WRITE_BEHIND": os.environ.get("WRITE_BEHIND", "off"),
+    "WRITE_BEHIND_FLUSH_MS": float(os.environ.get("WRITE_BEHIND_FLUSH_MS", "5")),
+    "WRITE_BEHIND_MAX_BATCH": int(os.environ.get("WRITE_BEHIND_MAX_BATCH", "500")),
+    # Presence intervals: sightings further apart than the gap (e.g. 300) start a new
+    # interval; 0 = tracking off. Intervals are written every PRESENCE_FLUSH_SECONDS, and
+    # each write changes the /api/attendance ETag, so only turn it on when dwell is used
+    "PRESENCE_GAP_SECONDS": float(os.environ.get("PRESENCE_GAP_SECONDS", "0")),
+    "PRESENCE_FLUSH_SECONDS": float(os.environ.get("PRESENCE_FLUSH_SECONDS", "15")),
+    # Seconds a student must be seen in a session before a scan logs them; 0 = first sighting
+    "PRESENCE_MIN_DWELL_SECONDS": float(os.environ.get("PRESENCE_MIN_DWELL_SECONDS", "0")),
+    # Reporting mode: reports and exports read a copy of the database refreshed at least
+    # this often (and after a session ends); 0 = they read the live database
+    "REPORT_SNAPSHOT_SECONDS": float(os.environ.get("REPORT_SNAPSHOT_SECONDS", "0")),
+    # Live feed from the database, polled this often, so streams see every worker's
+    # writes; 0 = each worker streams only its own (gunicorn.conf.py turns it on)
+    "STREAM_POLL_SECONDS": float(os.environ.get("STREAM_POLL_SECONDS", "0")),
+}
+
+def create_app(config: Optional[Dict[str, Any]] = None) -> Flask:
+    """Build the app for one worker process: paths, connection pool, export workers,
+    schema and routes. Keys in `config` override DEFAULT_CONFIG.
+
+    The services are module-level, so the last app created in a process is the live one.
+    Schema setup goes through schema.ensure_schema, which migrates once even when several
+    workers start together. The roster is loaded by the first request that needs it.
+    """
+    global DATA_DIR, CSV_PATH, DB_PATH, WEB_DIR, db_pool, export_jobs, active_session_cache, scan_simulator
+    global slow_query_seconds, sighting_cache, write_behind, present_set, snapshot_store, presence, min_dwell_seconds
+    global matrix_cache, static_assets, report_snapshot, event_relay
+    cfg = {**DEFAULT_CONFIG, **(config or {})}
+    if not log.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+        log.addHandler(handler)
+        log.propagate = False
+    log.setLevel(str(cfg["LOG_LEVEL"]).upper())
+    slow_query_seconds = float(cfg["SLOW_QUERY_MS"]) / 1000
+    DATA_DIR = cfg["DATA_DIR"]
+    CSV_PATH = os.path.join(DATA_DIR, "cleaned_class_list.csv")
+    DB_PATH = os.path.join(DATA_DIR, "attendance.db")
+    WEB_DIR = cfg["WEB_DIR"]
+
+    # Flask's automatic static route is disabled so it cannot shadow API paths;
+    # serve_frontend_file serves WEB_DIR instead
+    app = Flask(__name__, static_folder=None)
+    app.config.update(cfg)
+    CORS(app, expose_headers=["ETag", "Link", "X-Next-Cursor", "X-Prev-Cursor",
+                              "X-Data-Source", "X-Data-As-Of", "X-Data-Age-Seconds"])
+    app.register_blueprint(api)
+    app.before_request(start_request_metrics)
+    app.after_request(finish_request_metrics)
+    app.after_request(stamp_data_source)
+    app.teardown_request(end_request_metrics)
+    app.teardown_appcontext(release_db)
+
+    if export_jobs is not None:
+        export_jobs.shutdown(wait=False)
+    shutdown()
+    if db_pool is not None:
+        db_pool.close_all()
+    db_pool = ConnectionPool(DB_PATH, max_idle=cfg["DB_POOL_MAX_IDLE"], busy_timeout_ms=cfg["DB_BUSY_TIMEOUT_MS"])
+    export_jobs = ExportJobManager(
+        os.path.join(DATA_DIR, "exports"), db_pool.connect, max_workers=cfg["EXPORT_WORKERS"]
+    )
+    active_session_cache = ActiveSessionCache(on_change=forget_sightings)
+    sighting_cache = SightingCache(cfg["SIGHTING_CACHE_SIZE"], cfg["SIGHTING_CACHE_TTL_SECONDS"])
+    snapshot_store = snapshots.SnapshotStore()
+    matrix_cache = None
+    static_assets = AssetTable(WEB_DIR) if cfg["STATIC_ASSET_TABLE"] else None
+    if static_assets is not None:
+        log.info(f"Static assets: {static_assets.stats()}")
+    mode = str(cfg["WRITE_BEHIND"]).lower()
+    if mode not in ("off", "on", "sync"):
+        raise ValueError(f"WRITE_BEHIND must be off, on or sync, not {cfg['WRITE_BEHIND']!r}")
+    if mode == "off":
+        write_behind = present_set = None
+    else:
+        write_behind = WriteBehindQueue(
+            db_pool.connect, INSERT_ATTENDANCE_SQL, flush_interval=cfg["WRITE_BEHIND_FLUSH_MS"] / 1000,
+            max_batch=cfg["WRITE_BEHIND_MAX_BATCH"], on_commit=publish_committed, synchronous=mode == "sync",
+        )
+        present_set = PresentSet(before_load=write_behind.flush)
+    presence = (PresenceTracker(db_pool.connect, cfg["PRESENCE_GAP_SECONDS"], cfg["PRESENCE_FLUSH_SECONDS"])
+                if cfg["PRESENCE_GAP_SECONDS"] > 0 else None)
+    min_dwell_seconds = float(cfg["PRESENCE_MIN_DWELL_SECONDS"]) if presence is not None else 0.0
+    scan_simulator = random.Random(cfg["SIMULATED_SCAN_SEED"])
+    class_list.clear()
+
+    with app.app_context():
+        init_db()
+        if cfg["SEED_ROSTER_CSV"]:
+            seed_students_from_csv()
+    # After the schema is in place, so the first copy has it
+    report_snapshot = (ReportSnapshot(db_pool.connect, os.path.join(DATA_DIR, "reports.db"),
+                                      cfg["REPORT_SNAPSHOT_SECONDS"])
+                       if cfg["REPORT_SNAPSHOT_SECONDS"] > 0 else None)
+    event_relay = (EventRelay(db_pool.connect, event_bus.publish, cfg["STREAM_POLL_SECONDS"])
+                   if cfg["STREAM_POLL_SECONDS"] > 0 else None)
+    log.info(f"App ready (DATA_DIR = {DATA_DIR}, WEB_DIR = {WEB_DIR})")
+    return app
+
+# ---------------- Request metrics ----------------
+# Per-route latency histograms, status counts, in-flight gauges and SQLite time,
+# served at GET /metrics. Latency is measured to the response headers, so streamed
+# bodies (CSV exports, /api/stream) are not included.
+metrics = Metrics()
+
+def start_request_metrics():
+    g.metrics_route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+    g.request_started = time.perf_counter()
+    metrics.request_started(g.metrics_route)
+
+def finish_request_metrics(response):
+    if "request_started" not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    db, report_db = g.get("db"), g.get("report_db")
+    conns = [c for c in (db, report_db if report_db is not db else None) if c is not None]
+    queries, sql_seconds = sum(c.queries for c in conns), sum(c.seconds for c in conns)
+    metrics.observe_request(g.metrics_route, request.method, response.status_code, elapsed, queries, sql_seconds)
+    response.headers["Server-Timing"] = (
+        f'app;dur={elapsed * 1000:.2f}, db;dur={sql_seconds * 1000:.2f};desc="{queries} queries"'
+    )
+    return response
+
+def end_request_metrics(exc):
+    if (route := g.pop("metrics_route", None)) is not None:
+        metrics.request_finished(route)
 
 # ---------------- Routes ----------------
-@app.route("/")
+@api.route("/")
 def home():
     # Serve the frontend index.html from the configured WEB_DIR
+    if static_assets is not None:
+        if static_assets.index is not None:
+            return static_response(static_assets.index)
+        return "Frontend not found", 404
     try:
         return send_from_directory(WEB_DIR, "index.html")
     except Exception as e:
-        print(f"[ERROR] Could not serve index.html: {e}")
+        log.error(f"Could not serve index.html: {e}")
         return "Frontend not found", 404
 
-@app.route("/health")
+@api.route("/health")
 def health():
     with get_db() as con:
         count = con.execute("SELECT COUNT(*) FROM attendance").fetchone()[0]
-        sess = con.execute(
-            "SELECT id, name, start_ts, end_ts FROM sessions WHERE end_ts IS NULL ORDER BY id DESC LIMIT 1"
-        ).fetchone()
+    sess = get_active_session()
     return jsonify({
         "status": "ok",
-        "students_loaded": len(class_list),
+        "students_loaded": len(get_class_list()),
         "attendance_rows": count,
         "csv_exists": os.path.exists(CSV_PATH),
-        "active_session": dict(sess) if sess else None
+        "active_session": sess,
+        "report_snapshot": report_snapshot.status() if report_snapshot is not None else None,
     })
 
+@api.route("/metrics")
+def prometheus_metrics():
+    """Prometheus scrape endpoint. Counters are this worker process's own."""
+    body = metrics.render({
+        "attendance_roster_students": ("Students in this worker's roster copy.", len(class_list)),
+        "attendance_stream_subscribers": ("Open /api/stream connections.", event_bus.subscriber_count),
+        "attendance_sighting_cache_entries": ("Students remembered as already logged.", len(sighting_cache)),
+        **({"attendance_write_behind_pending": ("Inserts queued, not yet committed.", write_behind.pending)}
+           if write_behind is not None else {}),
+        **({"attendance_presence_tracked": ("(Session, student) pairs with presence intervals in memory.",
+                                            presence.tracked)} if presence is not None else {}),
+        **({"attendance_report_snapshot_age_seconds": ("Age of the reporting copy's data.",
+                                                       time.time() - (report_snapshot.as_of() or time.time()))}
+           if report_snapshot is not None else {}),
+    }, {
+        "attendance_sighting_cache_hits_total": ("Repeated scans answered from memory.", sighting_cache.hits),
+        "attendance_sighting_cache_misses_total": ("Scans checked against the database.", sighting_cache.misses),
+        "attendance_sighting_cache_evictions_total": ("Entries dropped to stay within the size bound.",
+                                                      sighting_cache.evictions),
+        **({
+            "attendance_write_behind_batches_total": ("Write-behind transactions committed.", write_behind.batches),
+            "attendance_write_behind_rows_total": ("Attendance rows committed by write-behind.", write_behind.rows),
+            "attendance_write_behind_failed_rows": ("Rows write-behind could not insert (queue stopped).",
+                                                    len(write_behind.failed)),
+        } if write_behind is not None else {}),
+        **({"attendance_presence_flushes_total": ("Presence interval flushes committed.", presence.flushes)}
+           if presence is not None else {}),
+        **({"attendance_report_snapshot_refreshes_total": ("Reporting copies made by this worker.",
+                                                           report_snapshot.refreshes)}
+           if report_snapshot is not None else {}),
+    })
+    return Response(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
 # ---- Session management ----
-@app.route("/api/session", methods=["GET"])
+# Sessions are per room: ?room= on GET, "room" in the POST bodies (default room if omitted).
+@api.route("/api/session", methods=["GET"])
 def get_session():
-    s = get_active_session()
+    s = get_active_session(normalize_room(request.args.get("room")))
     return jsonify({"active_session": s}), 200
 
-@app.route("/api/session/start", methods=["POST"])
+@api.route("/api/session/start", methods=["POST"])
 def api_start_session():
     data = request.get_json(silent=True) or {}
     name = (data.get("name") or "").strip()
-    s = start_session(name)
+    s = start_session(name, normalize_room(data.get("room")))
     return jsonify({"active_session": s, "message": "Session started"}), 200
 
-@app.route("/api/session/end", methods=["POST"])
+@api.route("/api/session/end", methods=["POST"])
 def api_end_session():
-    s = end_active_session()
+    data = request.get_json(silent=True) or {}
+    s = end_active_session(normalize_room(data.get("room")))
     if not s:
         return jsonify({"message": "No active session to end"}), 400
     return jsonify({"ended_session": s, "message": "Session ended"}), 200
 
 # ---- Validation & logging with rules ----
-@app.route("/api/validate", methods=["POST"])
+@api.route("/api/validate", methods=["POST"])
 def validate_scan():
     """
-    Simulates Bluetooth scanning by randomly selecting a student from the class list.
+    Matches a scanned device against the class list by MAC/device id ("mac_address")
+    or device name ("name"). "room" names the scanner's room; the scan goes to that
+    room's open session (default room if omitted). With neither in the body, simulates a Bluetooth scan by
+    picking a student from the class list with scan_simulator (reproducible when
+    SIMULATED_SCAN_SEED is set).
     Rules:
       - If a session is active: only one log per student per session.
       - If no active session: only one log per student per day.
     On (first) success, logs attendance with a timestamp.
+    Repeats of a student already logged in the room's scope are answered from
+    sighting_cache without opening a DB connection.
+    Every scan in a session extends the student's presence intervals. With
+    PRESENCE_MIN_DWELL_SECONDS set, a student is only logged once seen that long
+    (until then: logged False, reason "dwell_pending").
+    A name that matches no student exactly is matched fuzzily (see fuzzy_match): a
+    confident match is logged with "match": {"method": "fuzzy", "score"}; a doubtful
+    one is queued for confirmation and answered 202 {"status": "pending_confirmation"}.
     """
-    print(f"[DEBUG] Simulating Bluetooth scan...")
-    print(f"[DEBUG] Loaded class_list count: {len(class_list)}")
-    if len(class_list) > 0:
-        print(f"[DEBUG] First 3 students: {class_list[:3]}")
-
-    matched = random.choice(class_list) if class_list else None
+    data = request.get_json(silent=True) or {}
+    mac_addr = normalize_mac(data.get("mac_address"))
+    scan_name = (data.get("name") or "").strip()
+    room = normalize_room(data.get("room"))
+    now = datetime.now().isoformat(timespec="seconds")
+    today = now[:10]  # YYYY-MM-DD
+
+    # Debounce: match against this worker's roster copy as loaded (no revalidation) and
+    # answer known repeats from memory
+    if sighting_cache.enabled and class_list and (mac_addr or scan_name):
+        known = class_list.match(mac=mac_addr, name=scan_name)
+        if known and (hit := sighting_cache.get(room, known["Student ID"], today)):
+            if presence is not None and hit[0]:
+                presence.observe(hit[0]["id"], known["Student ID"], now)
+            return already_logged_response(known, hit[0], today)
+
+    roster = get_class_list()
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(f"Scan mac={mac_addr!r} name={scan_name!r}; class_list count: {len(roster)}; "
+                  f"first 3 students: {roster[:3]}")
+
+    match_info = None
+    candidates = []
+    if mac_addr or scan_name:
+        matched = roster.match(mac=mac_addr, name=scan_name)
+        if not matched and scan_name:
+            matched, candidates = fuzzy_match(roster, scan_name)
+            if matched:
+                match_info = {"method": "fuzzy", "score": candidates[0]["score"]}
+    else:
+        matched = scan_simulator.choice(roster) if roster else None
+    if not matched and candidates:
+        with get_db() as con:
+            pending = queue_pending_match(con, scan_name, mac_addr, now, get_active_session(room), room, candidates)
+        if pending["status"] == "pending":
+            return jsonify({"status": "pending_confirmation", "logged": False, "pending_match": pending}), 202
+        if pending["status"] == "confirmed":
+            # The lecturer already chose the student for this device name in this scope
+            matched = roster.get_by_id(pending["student_id"])
+            match_info = {"method": "confirmed", "pending_match_id": pending["id"]}
     if not matched:
-        print("[DEBUG] No students in class list")
+        log.debug("No matching student in class list")
         return jsonify({"status": "invalid"}), 404
 
-    now = datetime.now().isoformat(timespec="seconds")
+    mac = mac_addr or normalize_mac(matched.get("MAC"))
 
     with get_db() as con:
-        # Use named expression + swapped branches per Sourcery:
-        if not (active := get_active_session()):
+        active = get_active_session(room)
+        if sighting_cache.enabled:
+            seed_sightings(con, room, today, active)
+        ts = now
+        if presence is not None and active:
+            dwell = presence.observe(active["id"], matched["Student ID"], now)
+            if min_dwell_seconds:
+                if dwell < min_dwell_seconds and not con.execute(
+                    "SELECT 1 FROM attendance WHERE session_id = ? AND student_id = ?",
+                    (active["id"], matched["Student ID"])
+                ).fetchone():
+                    return dwell_pending_response(matched, active, dwell)
+                ts = presence.first_seen(active["id"], matched["Student ID"]) or now
+        logged = record_attendance(con, matched, mac, ts, active, room)
+        if sighting_cache.enabled:
+            sighting_cache.add(room, [matched["Student ID"]], today, active)
+
+        if not active:
             # --- No active session: day scope uniqueness ---
-            today = date.today().isoformat()  # YYYY-MM-DD
-            if (dup := con.execute(
-                "SELECT 1 FROM attendance WHERE student_id = ? AND DATE(ts) = ? AND session_id IS NULL LIMIT 1",
-                (matched['Student ID'], today)
-            ).fetchone()):
-                return jsonify({
-                    "status": "valid",
-                    "student": matched,
-                    "logged": False,
-                    "reason": "already_logged_today",
-                    "scope": "day",
-                    "date": today
-                }), 200
+            if not logged:
+                return already_logged_response(matched, None, today, match_info)
 
-            con.execute(
-                "INSERT INTO attendance (student_id, name, mac, ts, session_id) VALUES (?, ?, ?, ?, NULL)",
-                (matched['Student ID'], matched['Name'], mac_addr or matched.get('MAC') or '', now)
-            )
-            return jsonify({
+            body = {
                 "status": "valid",
                 "student": matched,
                 "logged": True,
                 "timestamp": now,
                 "scope": "day"
-            }), 200
+            }
         else:
             # --- Active session: one log per student per session ---
-            if (dup := con.execute(
-                "SELECT 1 FROM attendance WHERE session_id = ? AND student_id = ? LIMIT 1",
-                (active["id"], matched["Student ID"])
-            ).fetchone()):
-                return jsonify({
-                    "status": "valid",
-                    "student": matched,
-                    "logged": False,
-                    "reason": "already_logged_in_session",
-                    "scope": "session",
-                    "session": active
-                }), 200
+            if not logged:
+                return already_logged_response(matched, active, today, match_info)
 
-            con.execute(
-                "INSERT INTO attendance (student_id, name, mac, ts, session_id) VALUES (?, ?, ?, ?, ?)",
-                (matched['Student ID'], matched['Name'], mac_addr or matched.get('MAC') or '', now, active["id"])
-            )
-            return jsonify({
+            body = {
                 "status": "valid",
                 "student": matched,
                 "logged": True,
-                "timestamp": now,
+                "timestamp": ts,
                 "scope": "session",
                 "session": active
-            }), 200
+            }
+    if match_info:
+        body["match"] = match_info
+    return jsonify(body), 200
+
+def already_logged_response(student: Dict[str, Any], session: Optional[Dict[str, Any]], today: str,
+                            match_info: Optional[Dict[str, Any]] = None):
+    """validate_scan's reply for a student already logged in the session (or today)."""
+    if session:
+        body = {
+            "status": "valid",
+            "student": student,
+            "logged": False,
+            "reason": "already_logged_in_session",
+            "scope": "session",
+            "session": session
+        }
+    else:
+        body = {
+            "status": "valid",
+            "student": student,
+            "logged": False,
+            "reason": "already_logged_today",
+            "scope": "day",
+            "date": today
+        }
+    if match_info:
+        body["match"] = match_info
+    return jsonify(body), 200
+
+def parse_sighting_ts(value) -> Optional[str]:
+    """Normalize a client-supplied sighting time to the local ISO format stored in ts.
+    Returns None when the value cannot be parsed.
+    """
+    try:
+        ts = datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone().replace(tzinfo=None)
+    return ts.isoformat(timespec="seconds")
+
+@api.route("/api/validate/batch", methods=["POST"])
+def validate_batch():
+    """
+    Validates and logs many scanner sightings in one request.
+    Body: {"room": ..., "sightings": [{"mac_address": ..., "name": ..., "timestamp": ...}, ...]}
+    "room" is the scanner's room (default room if omitted).
+    Each sighting is matched by MAC/device id first, then by name.
+    The same rules as /api/validate apply:
+      - If a session is active: only one log per student per session.
+      - If no active session: only one log per student per day (of the sighting).
+    Sightings in a session extend presence intervals; with PRESENCE_MIN_DWELL_SECONDS
+    set, a student not yet seen that long is reported as dwell_pending.
+    Duplicates are decided set-wise and every new row is written with a single
+    executemany in one transaction. Returns one result per sighting, in order:
+    logged / duplicate / dwell_pending / unknown (or invalid for a malformed item).
+    """
+    data = request.get_json(silent=True) or {}
+    sightings = data.get("sightings")
+    if not isinstance(sightings, list):
+        return jsonify({"error": "sightings list required"}), 400
+    if len(sightings) > BATCH_MAX_SIGHTINGS:
+        return jsonify({"error": f"At most {BATCH_MAX_SIGHTINGS} sightings per batch"}), 413
+
+    room = normalize_room(data.get("room"))
+    roster = get_class_list()
+    now = datetime.now().isoformat(timespec="seconds")
+    active = get_active_session(room)
+    results = []
+    rows = []
+    current_scope = []  # students now known to be logged in the room's current scope
+
+    with direct_writes() as claim, get_db() as con:
+        # Take the write lock up front so the set-wise duplicate check and the insert
+        # see the same data (no other writer can slip in between).
+        con.execute("BEGIN IMMEDIATE")
+        if active:
+            seen = {(active["id"], r[0]) for r in con.execute(
+                "SELECT student_id FROM attendance WHERE session_id = ?", (active["id"],)
+            )}
+        else:
+            seen = set()
+            days_checked = set()
+
+        for i, item in enumerate(sightings):
+            if not isinstance(item, dict):
+                results.append({"index": i, "status": "invalid", "error": "Sighting must be an object"})
+                continue
+
+            mac = normalize_mac(item.get("mac_address") or item.get("device_id"))
+            name = (item.get("name") or "").strip()
+            if not (matched := roster.match(mac=mac, name=name)):
+                results.append({"index": i, "status": "unknown", "mac_address": mac, "name": name})
+                continue
+
+            ts = parse_sighting_ts(item["timestamp"]) if item.get("timestamp") else now
+            if not ts:
+                results.append({"index": i, "status": "invalid", "error": "Unparseable timestamp"})
+                continue
+
+            if active:
+                key = (active["id"], matched["Student ID"])
+                reason = "already_logged_in_session"
+            else:
+                day = ts[:10]
+                if day not in days_checked:
+                    # One query per distinct day in the batch (usually exactly one)
+                    seen.update((day, r[0]) for r in con.execute(
+                        "SELECT student_id FROM attendance WHERE day = ? AND session_id IS NULL", (day,)
+                    ))
+                    days_checked.add(day)
+                key = (day, matched["Student ID"])
+                reason = "already_logged_today"
+            if presence is not None and active:
+                dwell = presence.observe(active["id"], matched["Student ID"], ts)
+                if min_dwell_seconds and key not in seen:
+                    if dwell < min_dwell_seconds:
+                        results.append({"index": i, "status": "dwell_pending", "student": matched,
+                                        "dwell_seconds": dwell})
+                        continue
+                    ts = presence.first_seen(active["id"], matched["Student ID"]) or ts
+            if active or key[0] == now[:10]:
+                current_scope.append(matched["Student ID"])
+
+            scope = ("session", active["id"]) if active else ("day", key[0])
+            if key in seen or not claim(scope, matched["Student ID"]):
+                results.append({"index": i, "status": "duplicate", "student": matched, "reason": reason})
+                continue
+
+            seen.add(key)
+            rows.append((matched["Student ID"], matched["Name"], mac or normalize_mac(matched.get("MAC")), ts, ts[:10],
+                         active["id"] if active else None))
+            results.append({"index": i, "status": "logged", "student": matched, "timestamp": ts})
+
+        if rows:
+            con.executemany(INSERT_ATTENDANCE_SQL, rows)
+
+    if sighting_cache.enabled:
+        sighting_cache.add(room, current_scope, now[:10], active)
+
+    for student_id, name, mac, ts, _day, session_id in rows:
+        publish_event("attendance-logged", {
+            "student_id": student_id, "name": name, "mac": mac, "ts": ts, "session_id": session_id,
+            "room": room if session_id else "",
+        })
+
+    counts = {"logged": 0, "duplicate": 0, "dwell_pending": 0, "unknown": 0, "invalid": 0}
+    for r in results:
+        counts[r["status"]] += 1
+
+    return jsonify({
+        "scope": "session" if active else "day",
+        "room": room,
+        "session": active,
+        "counts": counts,
+        "results": results
+    }), 200
+
+# ---- Offline sync ----
+def session_at(sessions, starts, ts: str) -> Optional[Dict[str, Any]]:
+    """The session of one room (sessions sorted by start_ts, starts their start_ts) that
+    was running at ts, or None. A room's sessions never overlap."""
+    i = bisect.bisect_right(starts, ts) - 1
+    if i >= 0 and (sessions[i]["end_ts"] is None or ts < sessions[i]["end_ts"]):
+        return sessions[i]
+    return None
+
+@api.route("/api/sync", methods=["POST"])
+def sync_events():
+    """
+    Idempotent upload of sightings captured offline (see scan_spool.py).
+    Body: {"scanner": ..., "room": ..., "events": [{"event_id": ..., "seq": N,
+           "captured_at": ..., "mac_address": ..., "name": ..., "room": ...}, ...]}
+    Each event id is applied once: a replayed id is answered with its stored outcome
+    ("replayed": true) and changes nothing. An event is logged in the session that was
+    running in its room (the event's "room", else the body's) at its capture time, or in
+    the capture day's day scope without one; the usual one-log-per-scope rules apply.
+    "seq" numbers the scanner's events in capture order; the reply's "watermark" is the
+    highest seq the server has taken, so a client resumes after it
+    (GET /api/sync/<scanner>). Outcomes: logged / duplicate / dwell_pending / unknown,
+    or invalid (not stored; retrying cannot help).
+    """
+    data = request.get_json(silent=True) or {}
+    events = data.get("events")
+    if not isinstance(events, list):
+        return jsonify({"error": "events list required"}), 400
+    if len(events) > BATCH_MAX_SIGHTINGS:
+        return jsonify({"error": f"At most {BATCH_MAX_SIGHTINGS} events per request"}), 413
+
+    scanner = (data.get("scanner") or "").strip()
+    default_room = normalize_room(data.get("room"))
+    roster = get_class_list()
+    now = datetime.now().isoformat(timespec="seconds")
+    results = [None] * len(events)
+    parsed = []  # (index, event_id, ts, room, item)
+    seqs = []
+    for i, item in enumerate(events):
+        if not isinstance(item, dict):
+            results[i] = {"index": i, "status": "invalid", "error": "Event must be an object"}
+            continue
+        if isinstance(item.get("seq"), int):
+            seqs.append(item["seq"])
+        event_id = str(item.get("event_id") or "").strip()
+        if not event_id or len(event_id) > SYNC_EVENT_ID_MAX_LENGTH:
+            results[i] = {"index": i, "status": "invalid",
+                          "error": f"event_id required (at most {SYNC_EVENT_ID_MAX_LENGTH} characters)"}
+            continue
+        ts = parse_sighting_ts(item["captured_at"]) if item.get("captured_at") else None
+        if not ts:
+            results[i] = {"index": i, "status": "invalid", "event_id": event_id,
+                          "error": "captured_at missing or unparseable"}
+            continue
+        room = normalize_room(item["room"]) if "room" in item else default_room
+        parsed.append((i, event_id, ts, room, item))
+
+    rows = []
+    event_rows = []
+    closed_sessions = set()
+    with direct_writes() as claim, get_db() as con:
+        # One writer at a time: the replay check, the dedup sets and the inserts agree
+        con.execute("BEGIN IMMEDIATE")
+        stored = {}
+        ids = sorted({p[1] for p in parsed})
+        for k in range(0, len(ids), 500):
+            chunk = ids[k:k + 500]
+            stored.update((r[0], {"status": r[1], "student_id": r[2], "session_id": r[3]}) for r in con.execute(
+                f"SELECT event_id, status, student_id, session_id FROM scan_events "
+                f"WHERE event_id IN ({','.join('?' * len(chunk))})", chunk
+            ))
+
+        # Sessions that may contain a capture time, per room
+        timelines = {}
+        fresh = [p for p in parsed if p[1] not in stored]
+        for room in {p[3] for p in fresh}:
+            times = [p[2] for p in fresh if p[3] == room]
+            sessions = [dict(r) for r in con.execute(
+                f"SELECT {SESSION_COLUMNS} FROM sessions WHERE room = ? AND start_ts <= ? "
+                "AND (end_ts IS NULL OR end_ts > ?) ORDER BY start_ts",
+                (room, max(times), min(times))
+            )]
+            timelines[room] = (sessions, [s["start_ts"] for s in sessions])
+
+        seen = set()
+        loaded = set()
+        for i, event_id, ts, room, item in parsed:
+            if event_id in stored:
+                results[i] = {"index": i, "event_id": event_id, "replayed": True, **stored[event_id]}
+                continue
+            mac = normalize_mac(item.get("mac_address") or item.get("device_id"))
+            name = (item.get("name") or "").strip()
+            matched = roster.match(mac=mac, name=name)
+            session = session_at(*timelines[room], ts)
+            session_id = session["id"] if session else None
+            outcome = {"status": "unknown", "student_id": None, "session_id": session_id}
+            if matched:
+                student_id = matched["Student ID"]
+                scope = ("session", session_id) if session else ("day", ts[:10])
+                if scope not in loaded:
+                    if session:
+                        query = ("SELECT student_id FROM attendance WHERE session_id = ?", (session_id,))
+                    else:
+                        query = ("SELECT student_id FROM attendance WHERE day = ? AND session_id IS NULL", (ts[:10],))
+                    seen.update((scope, r[0]) for r in con.execute(*query))
+                    loaded.add(scope)
+                outcome.update(status="duplicate" if (scope, student_id) in seen else "logged", student_id=student_id)
+                log_ts = ts
+                if presence is not None and session:
+                    dwell = presence.observe(session_id, student_id, ts)
+                    if min_dwell_seconds and outcome["status"] == "logged":
+                        if dwell < min_dwell_seconds:
+                            outcome["status"] = "dwell_pending"
+                        else:
+                            log_ts = presence.first_seen(session_id, student_id) or ts
+                if outcome["status"] == "logged" and not claim(scope, student_id):
+                    outcome["status"] = "duplicate"
+                if outcome["status"] == "logged":
+                    seen.add((scope, student_id))
+                    rows.append(attendance_params(matched, mac or normalize_mac(matched.get("MAC")), log_ts, session_id)
+                                + (room if session else "",))
+                    if session and session["end_ts"] is not None:
+                        closed_sessions.add(session_id)
+            stored[event_id] = outcome
+            event_rows.append((event_id, scanner, ts, now, outcome["status"], outcome["student_id"], session_id))
+            results[i] = {"index": i, "event_id": event_id, "replayed": False, **outcome}
+
+        if rows:
+            con.executemany(INSERT_ATTENDANCE_SQL, [r[:-1] for r in rows])
+        if event_rows:
+            con.executemany(
+                "INSERT INTO scan_events (event_id, scanner, captured_ts, received_ts, status, student_id, session_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", event_rows
+            )
+        for session_id in sorted(closed_sessions):
+            snapshots.refreeze_session(con, session_id)
+        if scanner and seqs:
+            con.execute(
+                "INSERT INTO sync_cursors (scanner, watermark, updated_ts) VALUES (?, ?, ?) "
+                "ON CONFLICT(scanner) DO UPDATE SET watermark = MAX(watermark, excluded.watermark), "
+                "updated_ts = excluded.updated_ts",
+                (scanner, max(seqs), now)
+            )
+        cursor = con.execute("SELECT watermark FROM sync_cursors WHERE scanner = ?", (scanner,)).fetchone()
+
+    for student_id, name, mac, ts, _day, session_id, room in rows:
+        publish_event("attendance-logged", {
+            "student_id": student_id, "name": name, "mac": mac, "ts": ts, "session_id": session_id, "room": room,
+        })
+
+    counts = {"logged": 0, "duplicate": 0, "dwell_pending": 0, "unknown": 0, "invalid": 0, "replayed": 0}
+    for r in results:
+        counts["replayed" if r.get("replayed") else r["status"]] += 1
+    return jsonify({
+        "scanner": scanner,
+        "watermark": cursor[0] if cursor else None,
+        "counts": counts,
+        "results": results,
+    }), 200
+
+@api.route("/api/sync/<path:scanner>", methods=["GET"])
+def sync_cursor(scanner):
+    """A scanner's high-watermark: every event up to this seq has been taken (null if none)."""
+    with get_db() as con:
+        row = con.execute("SELECT watermark, updated_ts FROM sync_cursors WHERE scanner = ?", (scanner,)).fetchone()
+    return jsonify({
+        "scanner": scanner,
+        "watermark": row["watermark"] if row else None,
+        "updated_ts": row["updated_ts"] if row else None,
+    }), 200
+
+# ---- Live feed ----
+@api.route("/api/stream", methods=["GET"])
+def stream_events():
+    """
+    Server-Sent Events feed of attendance-logged, session-started and session-ended.
+    Optional query params: session_id=<id> (only attendance for that session; session
+    events are always sent), room=<room> (only attendance and session events of that room). Reconnects resume from the Last-Event-ID header (or
+    ?last_event_id=); when that is impossible a "resync" event asks the client to refetch.
+    A comment heartbeat is sent every STREAM_HEARTBEAT_SECONDS. With STREAM_POLL_SECONDS
+    set, events are read back from the database, so every worker streams every write;
+    otherwise each worker process streams only its own.
+    A worker already holding STREAM_MAX_CONNECTIONS streams answers with a "busy" event
+    and closes; the EventSource reconnects after STREAM_BUSY_RETRY_SECONDS, possibly to
+    another worker, so streams cannot take every request thread.
+    """
+    session_filter = request.args.get("session_id", "").strip()
+    room_filter = normalize_room(request.args.get("room")) if "room" in request.args else None
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    sub, missed, resync = event_bus.subscribe(last_event_id, limit=STREAM_MAX_CONNECTIONS)
+    if sub is None:
+        return Response(f"retry: {STREAM_BUSY_RETRY_SECONDS * 1000}\nevent: busy\ndata: {{}}\n\n",
+                        mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    def wanted(event):
+        if room_filter is not None and event["data"].get("room", "") != room_filter:
+            return False
+        if session_filter and event["type"] == "attendance-logged":
+            return str(event["data"].get("session_id") or "") == session_filter
+        return True
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            if resync:
+                yield "event: resync\ndata: {}\n\n"
+            for event in missed:
+                if wanted(event):
+                    yield format_sse(event)
+            while True:
+                event = sub.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                if sub.lagged:
+                    # Fell behind the bounded queue: tell the client to refetch and reconnect
+                    yield "event: resync\ndata: {}\n\n"
+                    return
+                if event is None:
+                    yield ": heartbeat\n\n"
+                elif wanted(event):
+                    yield format_sse(event)
+        finally:
+            event_bus.unsubscribe(sub)
+
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
 
 # ---- Attendance list & export ----
-@app.route("/api/attendance", methods=["GET"])
+@api.route("/api/attendance", methods=["GET"])
 def list_attendance():
     """
-    Returns attendance rows.
+    Returns attendance rows, newest first.
     Optional query params:
       - session_id=<id>    (filter by session)
+      - room=<room>        (rows from that room's sessions)
       - date_from=YYYY-MM-DD
       - date_to=YYYY-MM-DD
       - limit=N (default 200)
+      - after=<ts,id>      (next page: rows older than this cursor)
+      - before=<ts,id>     (rows newer than this cursor, e.g. for polling)
+    Pages are keyset-based on the (ts, id) index. The body stays a JSON array; cursors
+    come back in the X-Next-Cursor / X-Prev-Cursor headers (and a Link rel="next").
+    Rows carry dwell_seconds (time seen in the session; null when untracked).
+    Responses carry an ETag built from the max attendance id, the presence and data
+    versions and the query, so an unchanged poll with If-None-Match gets 304 without
+    running the query.
     """
     session_id = request.args.get("session_id", "").strip()
     date_from  = request.args.get("date_from", "").strip()
     date_to    = request.args.get("date_to", "").strip()
+    room       = normalize_room(request.args.get("room"))
     try:
         limit = int(request.args.get("limit", "200"))
     except ValueError:
         limit = 200
-
-    base_sql = "SELECT id, student_id, name, mac, ts, session_id FROM attendance"
-    where = []
-    params = []
-
-    if session_id:
-        where.append("session_id = ?")
-        params.append(session_id)
-    if date_from:
-        where.append("DATE(ts) >= DATE(?)")
-        params.append(date_from)
-    if date_to:
-        where.append("DATE(ts) <= DATE(?)")
-        params.append(date_to)
-
-    if where:
-        base_sql += " WHERE " + " AND ".join(where)
-
-    base_sql += " ORDER BY ts DESC, id DESC LIMIT ?"
-    params.append(limit)
+    after = request.args.get("after", "").strip()
+    before = request.args.get("before", "").strip()
+    if after and before:
+        return jsonify({"error": "Use either after or before, not both"}), 400
+    cursor = parse_cursor(after or before) if (after or before) else None
+    if (after or before) and not cursor:
+        return jsonify({"error": "Cursor must look like <ts>,<id>"}), 400
 
     with get_db() as con:
+        max_id = con.execute("SELECT MAX(id) FROM attendance").fetchone()[0]
+        presence_version = schema.read_version(con, "presence")  # dwell_seconds updates
+        data_version = schema.read_version(con, "data")  # rows archived
+        etag = hashlib.sha1(
+            f"{max_id}|{presence_version}|{data_version}|{sorted(request.args.items(multi=True))}".encode("utf-8")
+        ).hexdigest()
+        if etag in request.if_none_match:
+            return "", 304, {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+
+        where_sql, params = attendance_filter(session_id, date_from, date_to, room)
+        if cursor:
+            where_sql += (" AND " if where_sql else " WHERE ") + ("(ts, id) < (?, ?)" if after else "(ts, id) > (?, ?)")
+            params.extend(cursor)
+        base_sql = "SELECT id, student_id, name, mac, ts, session_id, dwell_seconds FROM attendance" + where_sql
+        # "before" walks the index upwards from the cursor, then flips to newest-first
+        base_sql += " ORDER BY ts ASC, id ASC LIMIT ?" if before else " ORDER BY ts DESC, id DESC LIMIT ?"
+        params.append(limit)
         rows = [dict(r) for r in con.execute(base_sql, params).fetchall()]
-
-    return jsonify(rows), 200
-
-@app.route("/api/attendance/export", methods=["GET"])
+    if before:
+        rows.reverse()
+
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+    if rows:
+        headers["X-Prev-Cursor"] = f"{rows[0]['ts']},{rows[0]['id']}"
+    if rows and len(rows) == limit:
+        next_cursor = f"{rows[-1]['ts']},{rows[-1]['id']}"
+        headers["X-Next-Cursor"] = next_cursor
+        next_args = {k: v for k, v in request.args.items() if k not in ("after", "before")}
+        next_args["after"] = next_cursor
+        headers["Link"] = f'<{request.base_url}?{urlencode(next_args)}>; rel="next"'
+    return jsonify(rows), 200, headers
+
+def parse_cursor(value: str):
+    """Split a "<ts>,<id>" pagination cursor into (ts, id), or None if malformed."""
+    ts, _, row_id = value.rpartition(",")
+    if not ts or not row_id.isdigit():
+        return None
+    return ts, int(row_id)
+
+@api.route("/api/attendance/export", methods=["GET"])
 def export_attendance():
     """
     Exports attendance as CSV, PDF, or Excel.
-    Optional query params: session_id, date_from, date_to, format (csv, pdf, xlsx)
+    Optional query params: session_id, room, date_from, date_to, format (csv, pdf, xlsx),
+    live=1 (read the live database in reporting mode)
     """
     session_id = request.args.get("session_id", "").strip()
     date_from  = request.args.get("date_from", "").strip()
     date_to    = request.args.get("date_to", "").strip()
+    room       = normalize_room(request.args.get("room"))
     export_format = request.args.get("format", "csv").lower()
-
-    base_sql = "SELECT student_id, name, mac, ts, session_id FROM attendance"
-    where = []
-    params = []
-
-    if session_id:
-        where.append("session_id = ?")
-        params.append(session_id)
-    if date_from:
-        where.append("DATE(ts) >= DATE(?)")
-        params.append(date_from)
-    if date_to:
-        where.append("DATE(ts) <= DATE(?)")
-        params.append(date_to)
-
-    if where:
-        base_sql += " WHERE " + " AND ".join(where)
-
-    base_sql += " ORDER BY ts DESC, rowid DESC"
-
-    with get_db() as con:
-        rows = [dict(r) for r in con.execute(base_sql, params).fetchall()]
-
-    if export_format == "pdf":
-        # Generate PDF
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
-        elements = []
-
-        # Title
-        title = Paragraph("Attendance Report", styles['Title'])
-        elements.append(title)
-
-        # Table data
-        data = [["Student ID", "Name", "MAC", "Timestamp", "Session ID"]]
-        for r in rows:
-            data.append([r["student_id"], r["name"], r["mac"], r["ts"], str(r.get("session_id") or "")])
-
-        table = Table(data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), '#f0f0f0'),
-            ('TEXTCOLOR', (0, 0), (-1, 0), '#000000'),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), '#ffffff'),
-            ('GRID', (0, 0), (-1, -1), 1, '#000000'),
-        ]))
-        elements.append(table)
-
-        doc.build(elements)
-        buffer.seek(0)
-        pdf_data = buffer.getvalue()
-        buffer.close()
-
-        filename = f"attendance_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        return Response(
-            pdf_data,
-            mimetype="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
-
-    elif export_format == "xlsx":
-        # Generate Excel
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Attendance"
-
-        # Headers
-        ws.append(["Student ID", "Name", "MAC", "Timestamp", "Session ID"])
-
-        # Data
-        for r in rows:
-            ws.append([r["student_id"], r["name"], r["mac"], r["ts"], r.get("session_id") or ""])
-
-        buffer = BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
-        xlsx_data = buffer.getvalue()
-        buffer.close()
-
-        filename = f"attendance_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    live = wants_live(request.args.get("live", ""))
+
+    where_sql, params = attendance_filter(session_id, date_from, date_to, room)
+    base_sql = exports.EXPORT_SQL + where_sql + EXPORT_ORDER
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    if export_format in ("pdf", "xlsx"):
+        # Rendered into a spooled temp file (PDF as LongTable page chunks, XLSX in write-only
+        # mode) and streamed back in chunks. Large date ranges should use POST /api/exports.
+        # Uses its own connection: the response body is read after the request ends.
+        writer = exports.write_pdf if export_format == "pdf" else exports.write_xlsx
+        con = report_connector(live)()
+        try:
+            out = writer(con.execute(base_sql, params))
+        finally:
+            con.close()
+
+        filename = f"attendance_export_{timestamp}.{export_format}"
         return Response(
-            xlsx_data,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            exports.iter_file(out),
+            mimetype=exports.EXPORT_FORMATS[export_format],
             headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
 
     else:  # default to csv
-        buf = StringIO()
-        writer = csv.writer(buf)
-        writer.writerow(["Student ID", "Name", "MAC", "Timestamp", "Session ID"])
-        for r in rows:
-            writer.writerow([r["student_id"], r["name"], r["mac"], r["ts"], r.get("session_id") or ""])
+        # Stream straight from the cursor; the connection lives as long as the response body.
+        connect = report_connector(live)
 
-        csv_data = buf.getvalue()
-        buf.close()
+        def generate_csv():
+            con = connect()
+            try:
+                yield from exports.iter_csv(lambda: con.execute(base_sql, params))
+            finally:
+                con.close()
 
-        filename = f"attendance_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        filename = f"attendance_export_{timestamp}.csv"
         return Response(
-            csv_data,
+            generate_csv(),
             mimetype="text/csv",
             headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
 
+# ---- Background export jobs ----
+@api.route("/api/exports", methods=["POST"])
+def create_export_job():
+    """
+    Queues an export on the background worker pool and returns its job id.
+    Body: {"format": "csv"|"xlsx"|"pdf", "session_id": ..., "room": ..., "date_from": ..., "date_to": ...,
+           "live": true (read the live database in reporting mode)}
+    Finished files are cached on disk, keyed by the query and a data-version stamp (row
+    count and max id of the matching rows, the presence and data versions, and whether
+    the live database or the reporting copy was read), so an unchanged report is served
+    again without re-rendering. The job reads the stamp again with its rows (see
+    export_jobs.py).
+    """
+    data = request.get_json(silent=True) or {}
+    export_format = str(data.get("format") or "csv").lower()
+    if export_format not in exports.EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(exports.EXPORT_FORMATS)}"}), 400
+
+    filters = {k: str(data.get(k) or "").strip() for k in ("session_id", "date_from", "date_to")}
+    filters["room"] = normalize_room(data.get("room"))
+    where_sql, params = attendance_filter(**filters)
+    live = wants_live(data.get("live", request.args.get("live", "")))
+    connect = report_connector(live)
+    source = g.data_source[0]
+
+    def read_stamp(con):
+        total, max_id = con.execute(f"SELECT COUNT(*), MAX(id) FROM attendance{where_sql}", params).fetchone()
+        # Rows change without new ids too: dwell updates (presence) and archiving (data)
+        return [total, max_id, schema.read_version(con, "presence"), schema.read_version(con, "data"), source], total
+
+    with get_report_db(live) as con:
+        stamp, total = read_stamp(con)
+
+    job = export_jobs.submit(
+        export_format, exports.EXPORT_SQL + where_sql + EXPORT_ORDER, params,
+        filters, stamp=stamp, total=total, connect=connect, read_stamp=read_stamp,
+    )
+    return jsonify(export_job_payload(job)), 202, {"Location": f"/api/exports/{job.id}"}
+
+@api.route("/api/exports/<job_id>", methods=["GET"])
+def get_export_job(job_id):
+    """Reports a job's progress; with ?download=1 serves the finished file."""
+    job = export_jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Export job not found"}), 404
+
+    if request.args.get("download"):
+        if job.status != "done":
+            return jsonify(export_job_payload(job)), 409
+        return send_file(
+            job.path,
+            mimetype=exports.EXPORT_FORMATS[job.format],
+            as_attachment=True,
+            download_name=f"attendance_export_{job.id[:8]}.{job.format}",
+        )
+    return jsonify(export_job_payload(job)), 200
+
+def export_job_payload(job) -> Dict[str, Any]:
+    payload = job.to_dict()
+    payload["download_url"] = f"/api/exports/{job.id}?download=1" if job.status == "done" else None
+    return payload
+
 # ---- Students management ----
-@app.route("/api/students", methods=["GET"])
+@api.route("/api/students", methods=["GET"])
 def get_students():
     """Return list of students from class list."""
-    return jsonify(class_list), 200
+    return jsonify(get_class_list().students), 200
+
+@api.route("/api/students/search", methods=["GET"])
+def search_students():
+    """Students ranked by fuzzy name match. Query params: q (a name or device name),
+    limit (default 10, at most 50), min_score (default 0)."""
+    query = (request.args.get("q") or "").strip()
+    try:
+        limit = min(max(int(request.args.get("limit", "10")), 1), 50)
+        min_score = float(request.args.get("min_score", "0"))
+    except ValueError:
+        return jsonify({"error": "limit and min_score must be numbers"}), 400
+    if not query:
+        return jsonify({"error": "q required"}), 400
+    ranked = get_class_list().search_name(query, limit=limit, min_score=min_score)
+    return jsonify({
+        "query": query,
+        "results": [{"student": st, "score": score} for score, st in ranked],
+    }), 200
 
-@app.route("/api/students", methods=["POST"])
+@api.route("/api/students", methods=["POST"])
 def add_student():
-    """Add a new student to class list and CSV."""
+    """Add a new student to the roster."""
     data = request.get_json(silent=True) or {}
     name = (data.get("name") or "").strip()
     student_id = (data.get("student_id") or "").strip()
@@ -483,152 +1539,522 @@ def add_student():
     if not name or not student_id:
         return jsonify({"error": "Name and Student ID are required"}), 400
 
-    # Check if student_id already exists
-    if any(s["Student ID"] == student_id for s in class_list):
-        return jsonify({"error": "Student ID already exists"}), 400
-
     new_student = {"Name": name, "Student ID": student_id, "MAC": mac}
-    class_list.append(new_student)
 
-    # Append to CSV
-    try:
-        with open(CSV_PATH, mode="a", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=["Name", "Student ID", "MAC"])
-            writer.writerow(new_student)
-    except Exception as e:
-        print(f"[ERROR] Failed to append to CSV: {e}")
-        return jsonify({"error": "Failed to save to CSV"}), 500
+    with get_db() as con:
+        # The primary key rejects duplicate student IDs
+        if not con.execute(
+            "INSERT INTO students (student_id, name, mac) VALUES (?, ?, ?) ON CONFLICT(student_id) DO NOTHING",
+            (student_id, name, mac)
+        ).rowcount:
+            return jsonify({"error": "Student ID already exists"}), 400
+        version = schema.bump_version(con, "roster")
+
+    with roster_lock:
+        incremental = class_list.version == version - 1
+        if incremental:
+            class_list.add(new_student, version)
+    if not incremental:
+        load_class_list()
 
     return jsonify({"message": "Student added", "student": new_student}), 201
 
-@app.route("/api/students/upload", methods=["POST"])
+@api.route("/api/students/export", methods=["GET"])
+def export_students():
+    """Download the roster as a class-list CSV (Name, Student ID, MAC)."""
+    buf = StringIO()
+    writer = csv.DictWriter(buf, fieldnames=["Name", "Student ID", "MAC"])
+    writer.writeheader()
+    writer.writerows(get_class_list().students)
+    return Response(
+        buf.getvalue(),
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=class_list.csv"}
+    )
+
+@api.route("/api/students/upload", methods=["POST"])
 def upload_students():
-    """Upload CSV data to update class list."""
-    data = request.get_json(silent=True) or {}
-    csv_data = data.get("csv", "").strip()
-    if not csv_data:
-        return jsonify({"error": "CSV data required"}), 400
+    """Import a class-list CSV and apply only the differences to the roster.
 
-    try:
-        reader = csv.DictReader(StringIO(csv_data))
-        new_students = []
-        for row in reader:
-            name = (row.get("Name") or row.get("name") or "").strip()
-            sid = (row.get("Student ID") or row.get("student_id") or "").strip()
-            mac = (row.get("MAC") or row.get("mac") or "").strip()
-            if name and sid:
-                new_students.append({"Name": name, "Student ID": sid, "MAC": mac})
-
-        # Overwrite CSV
-        with open(CSV_PATH, mode="w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=["Name", "Student ID", "MAC"])
-            writer.writeheader()
-            for s in new_students:
-                writer.writerow(s)
-
-        # Reload class list
-        load_class_list()
+    Accepts a multipart upload (field "file"), parsed row by row from the upload stream,
+    or the older JSON body {"csv": "..."}. Query options: mode=replace (default; students
+    missing from the file are removed, unless the file has no students at all: 400) or
+    mode=merge (nothing is removed), and dry_run=1 to get the change report without
+    applying it.
+    """
+    mode = (request.args.get("mode") or "replace").lower()
+    if mode not in ("replace", "merge"):
+        return jsonify({"error": "mode must be replace or merge"}), 400
+    dry_run = request.args.get("dry_run", "").lower() in ("1", "true", "yes")
+
+    upload = request.files.get("file")
+    if upload is not None:
+        stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+    else:
+        data = request.get_json(silent=True) or {}
+        csv_data = (data.get("csv") or "").strip()
+        if not csv_data:
+            return jsonify({"error": "CSV file or data required"}), 400
+        stream = StringIO(csv_data)
 
-        return jsonify({"message": f"Uploaded {len(new_students)} students"}), 200
-    except Exception as e:
-        print(f"[ERROR] Failed to upload CSV: {e}")
+    try:
+        report = import_roster(get_db(), iter_class_list(stream),
+                               delete_missing=(mode == "replace"), dry_run=dry_run)
+    except (csv.Error, UnicodeDecodeError) as e:
+        log.error(f"Failed to upload CSV: {e}")
         return jsonify({"error": "Invalid CSV format"}), 400
+    except EmptyImportError:
+        return jsonify({"error": "No students found in the file (it needs Name and Student ID "
+                                 "columns); the roster was left unchanged"}), 400
+
+    if not dry_run and report["version"] != class_list.version:
+        load_class_list()
+    total = report["inserted"] + report["updated"] + report["unchanged"]
+    verb = "Would apply" if dry_run else "Applied"
+    report["message"] = (f"{verb} {total} students: {report['inserted']} added, "
+                         f"{report['updated']} updated, {report['deleted']} removed")
+    return jsonify(report), 200
 
 # ---- Manual attendance logging ----
-@app.route("/api/attendance", methods=["POST"])
+@api.route("/api/attendance", methods=["POST"])
 def manual_attendance():
-    """Manually log attendance for a student."""
+    """Manually log attendance for a student. A name that matches no student exactly is
+    matched fuzzily; without a confident match the 404 lists the candidates."""
     data = request.get_json(silent=True) or {}
     student_id = (data.get("student_id") or "").strip()
     name = (data.get("name") or "").strip()
+    room = normalize_room(data.get("room"))
 
     if not student_id and not name:
         return jsonify({"error": "Student ID or Name required"}), 400
 
     # Find student
-    matched = None
-    for s in class_list:
-        if student_id and s["Student ID"] == student_id:
-            matched = s
-            break
-        elif name and s["Name"].lower() == name.lower():
-            matched = s
-            break
-
+    roster = get_class_list()
+    matched = roster.match(student_id=student_id, name=name)
+    if not matched and name:
+        matched, candidates = fuzzy_match(roster, name)
+        if not matched:
+            return jsonify({"error": "Student not found", "candidates": candidates}), 404
     if not matched:
         return jsonify({"error": "Student not found"}), 404
 
     now = datetime.now().isoformat(timespec="seconds")
 
     with get_db() as con:
-        active = get_active_session()
-        if active:
-            # Check duplicate in session
-            if con.execute("SELECT 1 FROM attendance WHERE session_id = ? AND student_id = ? LIMIT 1", (active["id"], matched["Student ID"])).fetchone():
+        active = get_active_session(room)
+        # One log per student per session, or per day without one
+        if not record_attendance(con, matched, normalize_mac(matched.get("MAC")), now, active, room):
+            if active:
                 return jsonify({"error": "Already logged for this session"}), 400
-            con.execute("INSERT INTO attendance (student_id, name, mac, ts, session_id) VALUES (?, ?, ?, ?, ?)",
-                        (matched["Student ID"], matched["Name"], matched.get("MAC") or "", now, active["id"]))
-        else:
-            # Day scope
-            today = date.today().isoformat()
-            if con.execute("SELECT 1 FROM attendance WHERE student_id = ? AND DATE(ts) = ? AND session_id IS NULL LIMIT 1",
-                           (matched["Student ID"], today)).fetchone():
-                return jsonify({"error": "Already logged today"}), 400
-            con.execute("INSERT INTO attendance (student_id, name, mac, ts, session_id) VALUES (?, ?, ?, ?, NULL)",
-                        (matched["Student ID"], matched["Name"], matched.get("MAC") or "", now))
+            return jsonify({"error": "Already logged today"}), 400
 
     return jsonify({"message": "Attendance logged", "student": matched, "timestamp": now}), 200
 
 # ---- Sessions list ----
-@app.route("/api/sessions", methods=["GET"])
+@api.route("/api/sessions", methods=["GET"])
 def get_sessions():
-    """Return list of all sessions."""
+    """Return list of all sessions, newest first. Optional query param: room."""
     with get_db() as con:
-        rows = con.execute("SELECT id, name, start_ts, end_ts FROM sessions ORDER BY id DESC").fetchall()
+        if "room" in request.args:
+            rows = con.execute(
+                f"SELECT {SESSION_COLUMNS} FROM sessions WHERE room = ? ORDER BY id DESC",
+                (normalize_room(request.args.get("room")),)
+            ).fetchall()
+        else:
+            rows = con.execute(f"SELECT {SESSION_COLUMNS} FROM sessions ORDER BY id DESC").fetchall()
     return jsonify([dict(r) for r in rows]), 200
 
+@api.route("/api/sessions/active", methods=["GET"])
+def get_active_sessions():
+    """Open sessions in every room, ordered by room."""
+    sessions = active_session_cache.all(get_db())
+    return jsonify([sessions[room] for room in sorted(sessions)]), 200
+
 # ---- Reports summary ----
-@app.route("/api/reports/summary", methods=["GET"])
+@api.route("/api/reports/summary", methods=["GET"])
 def get_summary():
-    """Get attendance summary for session or day."""
+    """Get attendance summary for a session, a day, or a room.
+    Query params: session_id; or date (day-mode logs); or room (that room's open
+    session); or room + date (distinct students across the room's sessions that day).
+    In reporting mode counts come from the reporting copy; live=1 for current counts.
+    """
     session_id = request.args.get("session_id", "").strip()
     date_str = request.args.get("date", "").strip()  # YYYY-MM-DD
+    room = normalize_room(request.args.get("room"))
+    has_room = "room" in request.args
 
-    total_students = len(class_list)
+    total_students = len(get_class_list())
 
-    with get_db() as con:
+    # Counters are maintained by triggers on attendance (see schema.migrate_stats)
+    with get_report_db() as con:
+        if has_room and not session_id and not date_str:
+            if not (active := get_active_session(room)):
+                return jsonify({"error": f"No active session in room '{room}'; provide session_id or date"}), 400
+            session_id = str(active["id"])
         if session_id:
-            present = con.execute("SELECT COUNT(DISTINCT student_id) FROM attendance WHERE session_id = ?", (session_id,)).fetchone()[0]
+            scope = "session"
+            row = con.execute("SELECT present FROM session_stats WHERE session_id = ?", (session_id,)).fetchone()
+        elif date_str and has_room:
+            scope = "room-day"
+            row = con.execute(
+                "SELECT COUNT(DISTINCT student_id) FROM attendance WHERE session_id IN "
+                "(SELECT id FROM sessions WHERE room = ? AND substr(start_ts, 1, 10) = ?)",
+                (room, date_str)
+            ).fetchone()
         elif date_str:
-            present = con.execute("SELECT COUNT(DISTINCT student_id) FROM attendance WHERE DATE(ts) = ? AND session_id IS NULL", (date_str,)).fetchone()[0]
+            scope = "day"
+            row = con.execute("SELECT present FROM day_stats WHERE day = ?", (date_str,)).fetchone()
         else:
-            return jsonify({"error": "Provide session_id or date"}), 400
+            return jsonify({"error": "Provide session_id, date or room"}), 400
+    present = row[0] if row else 0
 
     absent = total_students - present
-    return jsonify({
+    summary = {
         "total_students": total_students,
         "present": present,
         "absent": absent,
-        "scope": "session" if session_id else "day"
+        "scope": scope
+    }
+    if has_room:
+        summary["room"] = room
+    if scope == "session":
+        summary["session_id"] = int(session_id) if session_id.isdigit() else session_id
+    return jsonify(summary), 200
+
+@api.route("/api/reports/students", methods=["GET"])
+def get_student_report():
+    """
+    Per-student attendance history over closed sessions: sessions attended, total
+    sessions, rate, and day-mode (no session) days attended. A student's total counts
+    the closed sessions held in the rooms they attended at least once, so lectures of
+    other classes do not lower their rate; open sessions are left out until they end.
+    Optional query param room=<room> limits both counts to that room's sessions.
+    Sessions come from the cached attendance matrix (see matrix_report), days from the
+    trigger-maintained student_stats table.
+    Students who have attendance but are no longer on the roster are listed last
+    with in_roster false.
+    """
+    import attendance_matrix  # loads NumPy
+    room = normalize_room(request.args.get("room")) if "room" in request.args else None
+    with get_report_db() as con:
+        matrix = get_attendance_matrix(con)
+        ordinal_of = {r[1]: r[0] for r in con.execute("SELECT ordinal, student_id FROM student_ordinals")}
+        days = {r[0]: r[1] for r in con.execute("SELECT student_id, days_attended FROM student_stats")}
+
+    roster = get_class_list().by_id
+    listed = [(s["Student ID"], s["Name"], True) for s in roster.values()]
+    listed.extend((sid, None, False) for sid in sorted(set(ordinal_of).union(days) - set(roster)))
+    np = attendance_matrix.np
+    rows = matrix.select(room)
+    ordinals = np.array([ordinal_of.get(sid, -1) for sid, _, _ in listed], dtype=np.intp)
+    known = ordinals >= 0
+    attended = np.zeros(len(listed), dtype=np.int64)
+    totals = np.zeros(len(listed), dtype=np.int64)
+    attended[known], totals[known] = attendance_matrix.student_totals(matrix, rows, ordinals[known])
+
+    report = []
+    for (student_id, name, in_roster), a, total in zip(listed, attended.tolist(), totals.tolist()):
+        if not in_roster and not a and student_id not in days:
+            continue  # numbered once, but no attendance left
+        report.append({
+            "student_id": student_id,
+            "name": name,
+            "in_roster": in_roster,
+            "sessions_attended": a,
+            "total_sessions": total,
+            "rate": round(a / total, 4) if total else None,
+            "days_attended": days.get(student_id, 0),
+        })
+    return jsonify({"total_sessions": len(rows), "room": room, "students": report}), 200
+
+@api.route("/api/reports/sets", methods=["GET"])
+def get_set_report():
+    """
+    Set queries across closed sessions, answered with bitwise operations on their
+    snapshots (see snapshots.py). Students are those on the current roster.
+    Query params (any combination; every condition must hold):
+      - sessions: comma-separated session ids, or last:N for the N most recent closed
+        sessions (of `room`, if given); with min_missed=k keeps students absent from at
+        least k of them (default: absent from all of them)
+      - present: session ids the student attended, every one
+      - absent: session ids the student missed, every one
+    e.g. ?sessions=last:5&min_missed=3 (missed 3 of the last 5), ?present=12&absent=14
+    """
+    spec = request.args.get("sessions", "").strip()
+    room = normalize_room(request.args.get("room"))
+    try:
+        present_ids = parse_session_ids(request.args.get("present", ""))
+        absent_ids = parse_session_ids(request.args.get("absent", ""))
+        window_ids = [] if not spec or spec.startswith("last:") else parse_session_ids(spec)
+        last_n = int(spec[5:]) if spec.startswith("last:") else 0
+        min_missed = int(request.args["min_missed"]) if "min_missed" in request.args else None
+    except ValueError:
+        return jsonify({"error": "Session ids, last:N and min_missed must be integers"}), 400
+    if not (spec or present_ids or absent_ids):
+        return jsonify({"error": "Provide sessions, present or absent"}), 400
+    if last_n < 0 or (min_missed is not None and min_missed < 0):
+        return jsonify({"error": "last:N and min_missed must not be negative"}), 400
+
+    with get_report_db() as con:
+        if spec.startswith("last:"):
+            where = " AND room = ?" if "room" in request.args else ""
+            window_ids = [r[0] for r in con.execute(
+                f"SELECT id FROM sessions WHERE end_ts IS NOT NULL{where} ORDER BY id DESC LIMIT ?",
+                ((room,) if where else ()) + (min(last_n, SET_QUERY_MAX_SESSIONS),)
+            )]
+        wanted = set(window_ids) | set(present_ids) | set(absent_ids)
+        if len(wanted) > SET_QUERY_MAX_SESSIONS:
+            return jsonify({"error": f"At most {SET_QUERY_MAX_SESSIONS} sessions per query"}), 413
+        ended = {}
+        for i in range(0, len(wanted), 500):
+            chunk = sorted(wanted)[i:i + 500]
+            ended.update(con.execute(
+                f"SELECT id, end_ts FROM sessions WHERE id IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall())
+        if missing := sorted(wanted - ended.keys()):
+            return jsonify({"error": f"Unknown session ids: {missing}"}), 404
+        if still_open := sorted(sid for sid, end_ts in ended.items() if end_ts is None):
+            return jsonify({"error": f"Sessions still open: {still_open}"}), 400
+
+        bitmaps = snapshot_store.bitmaps(con, wanted, live=get_db())
+        universe, students = snapshot_store.roster(con, schema.read_version(con, "roster"))
+
+    result = universe
+    for sid in present_ids:
+        result &= bitmaps[sid]
+    for sid in absent_ids:
+        result &= ~bitmaps[sid]
+    window = [bitmaps[sid] for sid in window_ids]
+    if spec:
+        k = len(window) if min_missed is None else min_missed
+        result &= snapshots.missed_at_least(universe, window, k)
+
+    listed = []
+    for ordinal in snapshots.iter_ordinals(result):
+        student_id, name = students[ordinal]
+        entry = {"student_id": student_id, "name": name}
+        if spec:
+            entry["missed"] = sum(1 for bits in window if not (bits >> ordinal) & 1)
+        listed.append(entry)
+    listed.sort(key=lambda e: e["student_id"])
+    return jsonify({
+        "sessions": window_ids,
+        "min_missed": (len(window) if min_missed is None else min_missed) if spec else None,
+        "present": present_ids,
+        "absent": absent_ids,
+        "count": len(listed),
+        "students": listed,
+    }), 200
+
+def get_attendance_matrix(con):
+    """The closed-session matrix (see attendance_matrix.py), cached per session, roster
+    and snapshot version."""
+    global matrix_cache
+    import attendance_matrix  # loads NumPy
+    roster_version = schema.read_version(con, "roster")
+    version = (schema.read_version(con, "session"), roster_version, schema.read_version(con, "snapshot"))
+    _, students = snapshot_store.roster(con, roster_version)
+    if matrix_cache is None:
+        matrix_cache = attendance_matrix.MatrixCache()
+    return matrix_cache.get(con, version, max(students, default=0), live=get_db())
+
+@api.route("/api/reports/matrix", methods=["GET"])
+def matrix_report():
+    """
+    Term-level analytics over a students x sessions matrix of closed sessions (current
+    roster x sessions in start order). Optional query params:
+      - room, date_from, date_to (YYYY-MM-DD, by session start), last=N: which sessions
+      - chronic_below: rate under which a student counts as chronically absent
+        (default CHRONIC_ABSENCE_RATE)
+      - window: sessions in the rolling turnout average (default 5)
+      - students: all (default), chronic (flagged students only) or none
+    Per student: attended, rate, longest and current absence streak (consecutive
+    sessions missed), chronic; worst rate first. Per session: present, turnout rate and
+    its rolling average; plus the turnout trend (least-squares slope per session).
+    The matrix is cached per session, roster and snapshot version.
+    """
+    import attendance_matrix  # loads NumPy
+    room = normalize_room(request.args.get("room")) if "room" in request.args else None
+    date_from = request.args.get("date_from", "").strip()
+    date_to = request.args.get("date_to", "").strip()
+    listing = request.args.get("students", "all")
+    try:
+        last = int(request.args.get("last", "0"))
+        window = int(request.args.get("window", "5"))
+        chronic_below = float(request.args.get("chronic_below", CHRONIC_ABSENCE_RATE))
+    except ValueError:
+        return jsonify({"error": "last and window must be integers, chronic_below a number"}), 400
+    if last < 0 or window < 1:
+        return jsonify({"error": "last must not be negative and window must be at least 1"}), 400
+    if listing not in ("all", "chronic", "none"):
+        return jsonify({"error": "students must be all, chronic or none"}), 400
+
+    with get_report_db() as con:
+        _, students = snapshot_store.roster(con, schema.read_version(con, "roster"))
+        ordinals = sorted(students)
+        matrix = get_attendance_matrix(con)
+
+    np = attendance_matrix.np
+    rows = matrix.select(room, date_from, date_to, last)
+    present = matrix.present(rows, np.array(ordinals, dtype=np.intp))
+    m = attendance_matrix.term_metrics(present, window)
+    chronic = m["rate"] < chronic_below if len(rows) else np.zeros(len(ordinals), dtype=bool)
+
+    listed = []
+    if listing != "none":
+        order = np.lexsort((np.arange(len(ordinals)), m["rate"]))
+        if listing == "chronic":
+            order = order[chronic[order]]
+        rate = np.round(m["rate"], 4).tolist()
+        attended, longest = m["attended"].tolist(), m["longest_absence_streak"].tolist()
+        current, flags = m["current_absence_streak"].tolist(), chronic.tolist()
+        for k in order.tolist():
+            student_id, name = students[ordinals[k]]
+            listed.append({
+                "student_id": student_id, "name": name, "attended": attended[k], "rate": rate[k],
+                "longest_absence_streak": longest[k], "current_absence_streak": current[k],
+                "chronic": flags[k],
+            })
+    turnout, turnout_rate = m["turnout"].tolist(), np.round(m["turnout_rate"], 4).tolist()
+    rolling = np.round(m["rolling_turnout_rate"], 4).tolist()
+    sessions = []
+    for j, i in enumerate(rows.tolist()):
+        sessions.append({**matrix.sessions[i], "present": turnout[j], "rate": turnout_rate[j],
+                         "rolling_rate": rolling[j]})
+    return jsonify({
+        "sessions": len(rows),
+        "students": len(ordinals),
+        "summary": {
+            "mean_rate": round(float(m["rate"].mean()), 4) if len(ordinals) and len(rows) else None,
+            "median_rate": round(float(np.median(m["rate"])), 4) if len(ordinals) and len(rows) else None,
+            "chronic_below": chronic_below,
+            "chronic_count": int(chronic.sum()),
+            "turnout_slope": round(m["turnout_slope"], 6),
+            "window": window,
+        },
+        "turnout": sessions,
+        "student_metrics": listed,
     }), 200
 
+# ---- Pending name matches ----
+@api.route("/api/matches", methods=["GET"])
+def list_matches():
+    """Scans queued for confirmation, oldest first.
+    Optional query params: status (pending (default), confirmed, rejected or all), room, limit (default 100)."""
+    status = request.args.get("status", "pending").strip()
+    if status not in ("pending", "confirmed", "rejected", "all"):
+        return jsonify({"error": "status must be pending, confirmed, rejected or all"}), 400
+    try:
+        limit = min(max(int(request.args.get("limit", "100")), 1), 1000)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    where, params = [], []
+    if status != "all":
+        where.append("status = ?")
+        params.append(status)
+    if "room" in request.args:
+        where.append("room = ?")
+        params.append(normalize_room(request.args.get("room")))
+    where_sql = (" WHERE " + " AND ".join(where)) if where else ""
+    with get_db() as con:
+        rows = con.execute(
+            f"SELECT {PENDING_MATCH_COLUMNS} FROM pending_matches{where_sql} ORDER BY id LIMIT ?", params + [limit]
+        ).fetchall()
+    return jsonify({"matches": [pending_match_dict(r) for r in rows]}), 200
+
+@api.route("/api/matches/<int:match_id>/confirm", methods=["POST"])
+def confirm_match(match_id):
+    """Log a queued scan for the top candidate, or for body {"student_id": ...}.
+    The row goes into the scope and time of the original scan; a closed session's
+    snapshot is refrozen. 409 if the match was already resolved."""
+    data = request.get_json(silent=True) or {}
+    now = datetime.now().isoformat(timespec="seconds")
+    with direct_writes() as claim, get_db() as con:
+        row = con.execute(f"SELECT {PENDING_MATCH_COLUMNS} FROM pending_matches WHERE id = ?", (match_id,)).fetchone()
+        if not row:
+            return jsonify({"error": "Match not found"}), 404
+        match = pending_match_dict(row)
+        if match["status"] != "pending":
+            return jsonify({"error": f"Match already {match['status']}"}), 409
+        student_id = (data.get("student_id") or "").strip() or match["candidates"][0]["student_id"]
+        student = get_class_list().get_by_id(student_id)
+        if not student:
+            return jsonify({"error": "Student not found"}), 404
+
+        if not con.execute(
+            "UPDATE pending_matches SET status = 'confirmed', student_id = ?, resolved_ts = ? "
+            "WHERE id = ? AND status = 'pending'", (student_id, now, match_id)
+        ).rowcount:
+            return jsonify({"error": "Match already resolved"}), 409
+        session_id = match["session_id"]
+        mac = match["mac"] or normalize_mac(student.get("MAC"))
+        scope = ("session", session_id) if session_id else ("day", match["day"])
+        logged = claim(scope, student_id) and log_attendance(con, student, mac, match["ts"], session_id)
+        if logged and session_id is not None and con.execute(
+                "SELECT end_ts FROM sessions WHERE id = ?", (session_id,)).fetchone()[0] is not None:
+            snapshots.refreeze_session(con, session_id)
+    if logged:
+        publish_committed([attendance_event(student, mac, match["ts"], session_id, match["room"])])
+    match.update(status="confirmed", student_id=student_id, resolved_ts=now)
+    return jsonify({"message": "Match confirmed", "match": match, "student": student, "logged": logged}), 200
+
+@api.route("/api/matches/<int:match_id>/reject", methods=["POST"])
+def reject_match(match_id):
+    """Close a queued scan without logging anyone. 409 if it was already resolved."""
+    now = datetime.now().isoformat(timespec="seconds")
+    with get_db() as con:
+        if not con.execute(
+            "UPDATE pending_matches SET status = 'rejected', resolved_ts = ? WHERE id = ? AND status = 'pending'",
+            (now, match_id)
+        ).rowcount:
+            row = con.execute("SELECT status FROM pending_matches WHERE id = ?", (match_id,)).fetchone()
+            if not row:
+                return jsonify({"error": "Match not found"}), 404
+            return jsonify({"error": f"Match already {row[0]}"}), 409
+        row = con.execute(f"SELECT {PENDING_MATCH_COLUMNS} FROM pending_matches WHERE id = ?", (match_id,)).fetchone()
+    return jsonify({"message": "Match rejected", "match": pending_match_dict(row)}), 200
+
 # ---------------- Helpful 404 for API paths ----------------
-@app.errorhandler(404)
+@api.app_errorhandler(404)
 def not_found(e):
     if request.path.startswith("/api/"):
         return jsonify({
             "error": "Not Found",
-            "hint": "Try POST /api/validate, GET /api/attendance, GET/POST /api/session*, GET/POST /api/students*, POST /api/students/upload, POST /api/attendance, GET /api/reports/summary, GET /api/sessions"
+            "hint": "Try POST /api/validate, POST /api/validate/batch, GET /api/attendance, GET/POST /api/session*, GET/POST /api/students*, GET /api/students/search, GET /api/students/export, POST /api/sync, GET /api/sync/<scanner>, POST /api/students/upload, POST /api/attendance, GET /api/reports/summary, GET /api/reports/students, GET /api/reports/sets, GET /api/reports/matrix, GET /api/sessions, GET /api/sessions/active, GET /api/matches, POST /api/matches/<id>/confirm|reject, POST /api/exports, GET /api/exports/<id>, GET /api/stream, GET /metrics"
         }), 404
     return "Not Found", 404
 
+def static_response(asset):
+    """An asset from the table in the encoding the client prefers, or 304 if its
+    If-None-Match holds that variant's ETag."""
+    encoding = asset.negotiate(lambda name: request.accept_encodings[name])
+    body, etag = asset.variants[encoding]
+    headers = {"ETag": f'"{etag}"', "Cache-Control": asset.cache_control}
+    if asset.compressed:
+        headers["Vary"] = "Accept-Encoding"
+    if etag in request.if_none_match:
+        return "", 304, headers
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(body, content_type=asset.content_type, headers=headers)
+
 # Serve static files for non-API paths. This handler is placed after API route definitions
 # so API endpoints are matched first. It only serves files that exist in WEB_DIR and
-# falls back to index.html for client-side routes (SPA behavior).
-@app.route('/<path:filename>')
+# falls back to index.html for client-side routes (SPA behavior). With the asset table
+# (STATIC_ASSET_TABLE) that is a lookup in memory; files too large for it are sent from disk.
+@api.route('/<path:filename>')
 def serve_frontend_file(filename):
     if filename.startswith('api/') or filename == 'api':
         return not_found(None)
+    if static_assets is not None:
+        asset = static_assets.get(filename)
+        if asset is not None:
+            return static_response(asset)
+        if filename in static_assets.skipped:
+            return send_from_directory(WEB_DIR, filename)
+        if static_assets.index is not None:
+            return static_response(static_assets.index)
+        return not_found(None)
     file_path = os.path.join(WEB_DIR, filename)
     if os.path.exists(file_path) and os.path.isfile(file_path):
         return send_from_directory(WEB_DIR, filename)
@@ -641,5 +2067,6 @@ def serve_frontend_file(filename):
 # ---------------- Entrypoint ----------------
 if __name__ == "__main__":
     port = int(os.environ.get('PORT', 5000))
-    # Explicitly disable debug mode for production
+    app = create_app()
+    # Development server; see wsgi.py for the multi-worker production entry point
     app.run(debug=False, use_reloader=False, host='0.0.0.0', port=port)
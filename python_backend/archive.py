@@ -0,0 +1,149 @@
+"""Move raw attendance rows of old closed sessions into a per-term database file.
+
+Closed sessions keep their snapshots (see snapshots.py) and their trigger-maintained
+counters in the main database, so set queries, summaries and the student report still
+cover them (a late row for an archived session is added to its snapshot, see
+snapshots.refreeze_session); only the per-scan rows (lists and exports) and presence intervals move to
+the term file, which has the same attendance, sessions and presence_intervals tables. Run it as a retention job, e.g. at term end:
+
+    python python_backend/archive.py --before 2025-03-01 --term 2025-spring [--db path] [--dry-run]
+
+The term file defaults to <data dir>/archive/attendance-<term>.db; running again with
+the same term appends to it. Day-mode rows (no session) are never archived.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+import schema
+import snapshots
+
+ARCHIVE_COLUMNS = "id, student_id, name, mac, ts, session_id, day, dwell_seconds"
+
+
+def archive_path(data_dir: str, term: str) -> str:
+    return os.path.join(data_dir, "archive", f"attendance-{term}.db")
+
+
+def archive_sessions(con: sqlite3.Connection, before: str, path: str, dry_run: bool = False) -> dict:
+    """Archive rows of sessions that ended before `before` (YYYY-MM-DD) into `path`.
+
+    One transaction under the write lock: snapshots are frozen for any session missing
+    one, rows are copied and then deleted, and the counters the delete trigger lowers
+    are restored. The sessions are recorded in session_archives, and the "data" meta
+    version is bumped so workers drop list ETags and cached exports that still show the
+    rows. Returns {"sessions", "rows", "archive", "dry_run"}.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    con.execute("ATTACH DATABASE ? AS term", (path,))  # not allowed inside a transaction
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            con.execute(
+                "CREATE TEMP TABLE archived_sessions AS SELECT id FROM main.sessions "
+                "WHERE end_ts IS NOT NULL AND end_ts < ? "
+                "AND id IN (SELECT session_id FROM main.attendance WHERE session_id IS NOT NULL)",
+                (before,),
+            )
+            n_sessions = con.execute("SELECT COUNT(*) FROM temp.archived_sessions").fetchone()[0]
+            n_rows = con.execute(
+                "SELECT COUNT(*) FROM main.attendance WHERE session_id IN (SELECT id FROM temp.archived_sessions)"
+            ).fetchone()[0]
+            if dry_run or not n_rows:
+                con.execute("ROLLBACK")
+                return {"sessions": n_sessions, "rows": n_rows, "archive": path, "dry_run": dry_run}
+
+            for (session_id,) in con.execute(
+                "SELECT id FROM temp.archived_sessions WHERE id NOT IN (SELECT session_id FROM main.session_snapshots)"
+            ).fetchall():
+                snapshots.freeze_session(con, session_id)
+
+            con.execute("CREATE TABLE IF NOT EXISTS term.sessions AS SELECT * FROM main.sessions WHERE 0")
+            con.execute(f"CREATE TABLE IF NOT EXISTS term.attendance AS SELECT {ARCHIVE_COLUMNS} FROM main.attendance WHERE 0")
+            if not any(r[1] == "dwell_seconds" for r in con.execute("PRAGMA term.table_info(attendance)")):
+                con.execute("ALTER TABLE term.attendance ADD COLUMN dwell_seconds INTEGER")  # term files from before v5
+            con.execute("CREATE TABLE IF NOT EXISTS term.presence_intervals AS SELECT * FROM main.presence_intervals WHERE 0")
+            con.execute("CREATE UNIQUE INDEX IF NOT EXISTS term.ux_sessions_id ON sessions(id)")
+            con.execute("CREATE UNIQUE INDEX IF NOT EXISTS term.ux_attendance_id ON attendance(id)")
+            con.execute("CREATE INDEX IF NOT EXISTS term.idx_attendance_session ON attendance(session_id)")
+            con.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS term.ux_presence_intervals "
+                "ON presence_intervals(session_id, student_id, start_ts)"
+            )
+            con.execute(
+                "INSERT OR REPLACE INTO term.sessions SELECT * FROM main.sessions "
+                "WHERE id IN (SELECT id FROM temp.archived_sessions)"
+            )
+            con.execute(
+                f"INSERT OR IGNORE INTO term.attendance SELECT {ARCHIVE_COLUMNS} FROM main.attendance "
+                "WHERE session_id IN (SELECT id FROM temp.archived_sessions)"
+            )
+            con.execute(
+                "INSERT OR IGNORE INTO term.presence_intervals SELECT * FROM main.presence_intervals "
+                "WHERE session_id IN (SELECT id FROM temp.archived_sessions)"
+            )
+            con.execute("DELETE FROM main.presence_intervals WHERE session_id IN (SELECT id FROM temp.archived_sessions)")
+
+            # The delete trigger lowers the counters as if the attendance never happened;
+            # put back what it takes away
+            con.execute(
+                "CREATE TEMP TABLE archived_students AS SELECT student_id, COUNT(*) AS n FROM main.attendance "
+                "WHERE session_id IN (SELECT id FROM temp.archived_sessions) GROUP BY student_id"
+            )
+            con.execute(
+                "CREATE TEMP TABLE archived_counts AS SELECT session_id, present FROM main.session_stats "
+                "WHERE session_id IN (SELECT id FROM temp.archived_sessions)"
+            )
+            con.execute("DELETE FROM main.attendance WHERE session_id IN (SELECT id FROM temp.archived_sessions)")
+            con.execute(
+                "UPDATE main.session_stats SET present = "
+                "(SELECT present FROM temp.archived_counts c WHERE c.session_id = session_stats.session_id) "
+                "WHERE session_id IN (SELECT session_id FROM temp.archived_counts)"
+            )
+            con.execute(
+                "UPDATE main.student_stats SET sessions_attended = sessions_attended + "
+                "(SELECT n FROM temp.archived_students a WHERE a.student_id = student_stats.student_id) "
+                "WHERE student_id IN (SELECT student_id FROM temp.archived_students)"
+            )
+            con.execute(
+                "INSERT OR REPLACE INTO main.session_archives (session_id, archive) "
+                "SELECT id, ? FROM temp.archived_sessions", (os.path.abspath(path),)
+            )
+            schema.bump_version(con, "data")
+            con.execute("COMMIT")
+        except BaseException:
+            if con.in_transaction:
+                con.execute("ROLLBACK")
+            raise
+        finally:
+            for table in ("archived_sessions", "archived_students", "archived_counts"):
+                con.execute(f"DROP TABLE IF EXISTS temp.{table}")
+    finally:
+        con.execute("DETACH DATABASE term")
+    return {"sessions": n_sessions, "rows": n_rows, "archive": path, "dry_run": False}
+
+
+def main(argv=None):
+    data_dir = os.environ.get("ATTENDANCE_DATA_DIR") or os.path.join(schema.BASE_DIR, "data")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--before", required=True, help="archive sessions that ended before this day (YYYY-MM-DD)")
+    parser.add_argument("--term", required=True, help="term name, used in the archive file name")
+    parser.add_argument("--db", default=os.path.join(data_dir, "attendance.db"))
+    parser.add_argument("--out", help="archive database file (default: archive/attendance-<term>.db next to --db)")
+    parser.add_argument("--dry-run", action="store_true", help="only count what would move")
+    args = parser.parse_args(argv)
+
+    con = sqlite3.connect(args.db, timeout=30, isolation_level=None)
+    try:
+        schema.ensure_schema(con)
+        path = args.out or archive_path(os.path.dirname(os.path.abspath(args.db)), args.term)
+        report = archive_sessions(con, args.before, path, dry_run=args.dry_run)
+    finally:
+        con.close()
+    verb = "Would archive" if report["dry_run"] else "Archived"
+    print(f"[INFO] {verb} {report['rows']} rows from {report['sessions']} sessions into {report['archive']}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""Students x sessions attendance matrix for term-level analytics (GET /api/reports/matrix).
+
+Closed sessions are already frozen as bitmaps over roster ordinals (see snapshots.py),
+so the matrix is built in one query: each session's bitmap becomes one row of a packed
+uint8 array, in start order. Requests unpack the rows and ordinals they need into a
+boolean (sessions x students) array and compute every metric with NumPy operations
+over whole rows and columns; nothing loops over students or sessions in Python.
+
+NumPy is imported by this module only, which app.py loads on the first matrix request.
+"""
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import snapshots
+
+MISSING_SNAPSHOTS_SQL = (
+    "SELECT 1 FROM sessions WHERE end_ts IS NOT NULL "
+    "AND id NOT IN (SELECT session_id FROM session_snapshots) LIMIT 1"
+)
+
+
+class AttendanceMatrix:
+    """Packed presence bits of every closed session: packed[i] is the bitmap (little-endian
+    bit order, one bit per ordinal) of sessions[i]."""
+
+    def __init__(self, sessions: List[Dict[str, Any]], packed: np.ndarray):
+        self.sessions = sessions
+        self.packed = packed
+        self.days = np.array([s["start_ts"][:10] for s in sessions], dtype=object)
+        self.rooms = np.array([s["room"] for s in sessions], dtype=object)
+
+    @classmethod
+    def build(cls, con, max_ordinal: int, live=None) -> "AttendanceMatrix":
+        """Read the matrix from `con`, which may be the read-only reporting copy. Sessions
+        closed by an older version of the app have no snapshot yet: they are frozen on
+        `live` (the live database), which is then read instead."""
+        if live is not None and con.execute(MISSING_SNAPSHOTS_SQL).fetchone():
+            with live:
+                snapshots.freeze_closed_sessions(live)
+            con = live
+        rows = con.execute(
+            "SELECT s.id, s.name, s.start_ts, s.room, p.bitmap FROM sessions s "
+            "JOIN session_snapshots p ON p.session_id = s.id "
+            "WHERE s.end_ts IS NOT NULL ORDER BY s.start_ts, s.id"
+        ).fetchall()
+        width = max([(max_ordinal >> 3) + 1] + [len(r[4]) for r in rows])
+        packed = np.zeros((len(rows), width), dtype=np.uint8)
+        for i, r in enumerate(rows):
+            packed[i, :len(r[4])] = np.frombuffer(r[4], dtype=np.uint8)
+        sessions = [{"id": r[0], "name": r[1], "start_ts": r[2], "room": r[3]} for r in rows]
+        return cls(sessions, packed)
+
+    def select(self, room: Optional[str] = None, date_from: str = "", date_to: str = "",
+               last: int = 0) -> np.ndarray:
+        """Row indexes of the sessions matching the filters, in start order."""
+        keep = np.ones(len(self.sessions), dtype=bool)
+        if room is not None:
+            keep &= self.rooms == room
+        if date_from:
+            keep &= self.days >= date_from
+        if date_to:
+            keep &= self.days <= date_to
+        rows = np.flatnonzero(keep)
+        return rows[-last:] if last else rows
+
+    def present(self, rows: np.ndarray, ordinals: np.ndarray) -> np.ndarray:
+        """Boolean (len(rows) x len(ordinals)) presence."""
+        bits = np.unpackbits(self.packed[rows], axis=1, bitorder="little")
+        return bits[:, ordinals].astype(bool)
+
+
+def term_metrics(present: np.ndarray, window: int = 5) -> Dict[str, np.ndarray]:
+    """Per-student and per-session metrics of a (sessions x students) presence matrix.
+
+    Absence streaks: at each session, the run of consecutive absences ending there is
+    the session's position minus the position of the student's last attendance so far
+    (a running maximum down each column).
+    """
+    n_sessions, n_students = present.shape
+    attended = present.sum(axis=0)
+    rate = attended / n_sessions if n_sessions else np.zeros(n_students)
+    if n_sessions:
+        position = np.arange(1, n_sessions + 1, dtype=np.int32)[:, None]
+        last_seen = np.maximum.accumulate(np.where(present, position, 0), axis=0)
+        run = position - last_seen
+        longest, current = run.max(axis=0), run[-1]
+    else:
+        longest = current = np.zeros(n_students, dtype=np.int32)
+
+    turnout = present.sum(axis=1)
+    turnout_rate = turnout / n_students if n_students else np.zeros(n_sessions)
+    sums = np.concatenate(([0.0], np.cumsum(turnout_rate)))
+    ends = np.arange(1, n_sessions + 1)
+    starts = np.maximum(ends - window, 0)
+    rolling = (sums[ends] - sums[starts]) / (ends - starts) if n_sessions else turnout_rate
+    slope = float(np.polyfit(np.arange(n_sessions), turnout_rate, 1)[0]) if n_sessions >= 2 else 0.0
+    return {
+        "attended": attended, "rate": rate, "longest_absence_streak": longest,
+        "current_absence_streak": current, "turnout": turnout, "turnout_rate": turnout_rate,
+        "rolling_turnout_rate": rolling, "turnout_slope": slope,
+    }
+
+
+def student_totals(matrix: AttendanceMatrix, rows: np.ndarray, ordinals: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Per student: sessions attended among `rows`, and how many of `rows` were held in
+    the rooms the student attended at least once (their rate's denominator). Ordinals
+    beyond every bitmap belong to students never present."""
+    inside = ordinals < matrix.packed.shape[1] * 8
+    present = np.zeros((len(rows), len(ordinals)), dtype=bool)
+    present[:, inside] = matrix.present(rows, ordinals[inside])
+    rooms, room_of = np.unique(matrix.rooms[rows].astype(str), return_inverse=True)
+    held = np.bincount(room_of, minlength=len(rooms))
+    attended_in_room = np.zeros((len(rooms), len(ordinals)), dtype=np.int64)
+    np.add.at(attended_in_room, room_of, present)
+    return present.sum(axis=0), held @ (attended_in_room > 0)
+
+
+class MatrixCache:
+    """The latest AttendanceMatrix, rebuilt when the data version it was built at changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entry: Optional[Tuple[Tuple, AttendanceMatrix]] = None
+
+    def get(self, con, version: Tuple, max_ordinal: int, live=None) -> AttendanceMatrix:
+        with self._lock:
+            if self._entry and self._entry[0] == version:
+                return self._entry[1]
+            matrix = AttendanceMatrix.build(con, max_ordinal, live)
+            self._entry = (version, matrix)
+            return matrix
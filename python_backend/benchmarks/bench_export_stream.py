@@ -0,0 +1,102 @@
+"""Measure first-byte latency and peak Python memory of GET /api/attendance/export.
+
+Fills a throwaway database with synthetic attendance rows and streams each export
+format through Flask's test client:
+
+    python python_backend/benchmarks/bench_export_stream.py [--rows 1000000] [--formats csv xlsx]
+
+Memory is reported as growth of the process's peak RSS; --trace-memory reports the peak of
+Python allocations via tracemalloc instead (much slower, especially for xlsx).
+"""
+import argparse
+import contextlib
+import io
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app():
+    os.environ["ATTENDANCE_DATA_DIR"] = tempfile.mkdtemp(prefix="attendance-bench-")
+    sys.modules.pop("app", None)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as app_module
+        flask_app = app_module.create_app()
+    return app_module, flask_app
+
+
+def fill(app_module, n_rows, students=500):
+    """Insert n_rows session-scoped rows: `students` per session, one session per hour."""
+    start = datetime(2025, 1, 6, 8, 0, 0)
+    con = app_module.db_pool.connect()
+    with con:
+        sessions = (n_rows + students - 1) // students
+        con.executemany(
+            "INSERT INTO sessions (id, name, start_ts, end_ts) VALUES (?, ?, ?, ?)",
+            ((i + 1, f"Lecture {i + 1}", (start + timedelta(hours=i)).isoformat(),
+              (start + timedelta(hours=i, minutes=50)).isoformat()) for i in range(sessions)),
+        )
+
+        def rows():
+            for i in range(n_rows):
+                sess, k = divmod(i, students)
+                ts = (start + timedelta(hours=sess, seconds=k)).isoformat()
+                yield (f"S{k:07d}", f"Student {k}", "", ts, ts[:10], sess + 1)
+
+        con.executemany(app_module.INSERT_ATTENDANCE_SQL, rows())
+    con.close()
+
+
+def max_rss_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def measure(client, fmt, trace_memory=False):
+    rss_before = max_rss_mib()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    res = client.get(f"/api/attendance/export?format={fmt}", buffered=False)
+    body = iter(res.response)
+    first = next(body)
+    ttfb = time.perf_counter() - start
+    size = len(first)
+    for chunk in body:
+        size += len(chunk)
+    total = time.perf_counter() - start
+    res.close()
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    else:
+        peak = max_rss_mib() - rss_before
+    return {"format": fmt, "ttfb_ms": ttfb * 1000, "total_s": total, "bytes": size, "peak_mib": peak}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--formats", nargs="+", default=["csv", "xlsx"])
+    parser.add_argument("--trace-memory", action="store_true")
+    args = parser.parse_args(argv)
+
+    app_module, flask_app = load_app()
+    fill(app_module, args.rows)
+    client = flask_app.test_client()
+    print(f"{args.rows} rows")
+    print(f"{'format':>6} {'ttfb ms':>9} {'total s':>8} {'MiB out':>8} {'+peak MiB':>9}")
+    for fmt in args.formats:
+        r = measure(client, fmt, args.trace_memory)
+        print(f"{r['format']:>6} {r['ttfb_ms']:>9.1f} {r['total_s']:>8.2f} {r['bytes'] / 2**20:>8.1f} {r['peak_mib']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Throughput and p50/p95/p99 latency of the scan, manual, list, report and export paths.
+
+In-process (default): builds a synthetic data directory, creates the app and replays a
+deterministic workload from N concurrent simulated classrooms through the test client:
+
+    python python_backend/benchmarks/bench_hot_paths.py [--classrooms 8] [--scans 250] \
+        [--students 2000] [--days 60] [--out results.json] [--compare baseline.json]
+
+Against a running server, point --url at it and --data-dir at the directory it serves
+(built with datagen.py), which is where the roster and session ids are read from:
+
+    python python_backend/benchmarks/bench_hot_paths.py --url http://localhost:5000 \
+        --data-dir /tmp/attendance-bench
+
+Results are written as JSON (default: benchmarks/results/hot_paths-<commit>.json).
+--compare prints ratios against an earlier result and exits with status 1 when a
+scenario's p95 or throughput regressed by more than --threshold.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import datagen
+import replay
+
+BACKEND_DIR = datagen.BACKEND_DIR
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+EXPORT_FORMATS = ("csv", "xlsx", "pdf")
+
+
+def load_inputs(data_dir):
+    """Roster, closed session ids and history days from a data directory's database."""
+    con = sqlite3.connect(f"file:{os.path.join(data_dir, 'attendance.db')}?mode=ro", uri=True)
+    try:
+        students = [{"Name": r[0], "Student ID": r[1], "MAC": r[2]}
+                    for r in con.execute("SELECT name, student_id, mac FROM students ORDER BY rowid")]
+        sessions = [r[0] for r in con.execute("SELECT id FROM sessions WHERE end_ts IS NOT NULL ORDER BY id")]
+        days = [r[0] for r in con.execute("SELECT DISTINCT day FROM attendance ORDER BY day")]
+    finally:
+        con.close()
+    if not students or not sessions:
+        raise SystemExit(f"{data_dir} has no roster or closed sessions; build it with datagen.py")
+    return students, sessions, days
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def build_workloads(args, students, sessions, days):
+    n = args.classrooms
+    pick_session = lambda rng: rng.choice(sessions)  # noqa: E731
+
+    def list_request(rng, _):
+        kind = rng.randrange(3)
+        if kind == 0:
+            return ("GET", "/api/attendance?limit=100", None)
+        if kind == 1:
+            return ("GET", f"/api/attendance?limit=100&session_id={pick_session(rng)}", None)
+        i = rng.randrange(len(days))
+        return ("GET", f"/api/attendance?limit=100&date_from={days[i]}&date_to={days[min(i + 4, len(days) - 1)]}", None)
+
+    def summary_request(rng, _):
+        if rng.random() < 0.5:
+            return ("GET", f"/api/reports/summary?session_id={pick_session(rng)}", None)
+        return ("GET", f"/api/reports/summary?date={rng.choice(days)}", None)
+
+    def sets_request(rng, _):
+        if rng.random() < 0.5:
+            return ("GET", f"/api/reports/sets?sessions=last:{rng.choice((5, 10, 20))}&min_missed=3", None)
+        a, b = rng.sample(sessions, 2) if len(sessions) > 1 else (sessions[0], sessions[0])
+        return ("GET", f"/api/reports/sets?present={a}&absent={b}", None)
+
+    def matrix_request(rng, _):
+        if rng.random() < 0.5:
+            return ("GET", f"/api/reports/matrix?students=chronic&last={rng.choice((20, 100, 500))}", None)
+        i = rng.randrange(len(days))
+        return ("GET", f"/api/reports/matrix?students=none&date_from={days[i]}", None)
+
+    def static_request(rng, _):
+        return ("GET", rng.choice(("/", "/js/app.js", "/css/styles.css", "/sessions")), None)
+
+    def manual_request(rng, c):
+        student = rng.choice(students[c::n] or students)
+        return ("POST", "/api/attendance", {"student_id": student["Student ID"], "room": replay.classroom_room(c)})
+
+    workloads = {
+        "validate": (replay.classroom_scans(students, n, args.scans, seed=args.seed), True),
+        "manual": (replay.classroom_requests(n, args.manual, manual_request, args.seed, "manual"), True),
+        "list": (replay.classroom_requests(n, args.reads, list_request, args.seed, "list"), False),
+        "summary": (replay.classroom_requests(n, args.reads, summary_request, args.seed, "summary"), False),
+        "sets": (replay.classroom_requests(n, args.reads, sets_request, args.seed, "sets"), False),
+        "matrix": (replay.classroom_requests(n, args.reads, matrix_request, args.seed, "matrix"), False),
+        "static": (replay.classroom_requests(n, args.reads, static_request, args.seed, "static"), False),
+    }
+    for fmt in EXPORT_FORMATS:
+        def export_request(rng, _, fmt=fmt):
+            return ("GET", f"/api/attendance/export?format={fmt}&session_id={pick_session(rng)}", None)
+        workloads[f"export_{fmt}"] = (
+            replay.classroom_requests(args.export_clients, args.exports, export_request, args.seed, f"export-{fmt}"),
+            False,
+        )
+    return workloads
+
+
+def run(args):
+    data_dir = args.data_dir
+    if args.url:
+        if not data_dir:
+            raise SystemExit("--url needs --data-dir (the directory the server was started on)")
+        driver = replay.HttpDriver(args.url)
+    else:
+        if not data_dir:
+            data_dir = tempfile.mkdtemp(prefix="attendance-bench-")
+        if not os.path.exists(os.path.join(data_dir, "attendance.db")):
+            datagen.build_data_dir(data_dir, args.students, args.days, args.sessions_per_day, seed=args.seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            import app as app_module
+            flask_app = app_module.create_app({"DATA_DIR": data_dir, "SIMULATED_SCAN_SEED": args.seed})
+        driver = replay.TestClientDriver(flask_app)
+
+    students, sessions, days = load_inputs(data_dir)
+    workloads = build_workloads(args, students, sessions, days)
+    scenarios = {}
+    # The in-process app logs every scan; keep that out of the report (redirected once,
+    # around all threads)
+    quiet = contextlib.redirect_stdout(io.StringIO()) if not args.url else contextlib.nullcontext()
+    with quiet:
+        for name, (scripts, needs_session) in workloads.items():
+            if args.only and name not in args.only:
+                continue
+            # Write scenarios run one open session per classroom room
+            rooms = [replay.classroom_room(c) for c in range(len(scripts))] if needs_session else []
+            for room in rooms:
+                driver.request("POST", "/api/session/start", {"name": f"bench {name}", "room": room})
+            try:
+                scenarios[name] = replay.summarize(*replay.replay(driver, scripts))
+            finally:
+                for room in rooms:
+                    driver.request("POST", "/api/session/end", {"room": room})
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "target": args.url or "test-client",
+            "data_dir": data_dir,
+            "params": {k: getattr(args, k) for k in (
+                "classrooms", "scans", "manual", "reads", "exports", "export_clients",
+                "students", "days", "sessions_per_day", "seed")},
+            "dataset": {"students": len(students), "closed_sessions": len(sessions), "days": len(days)},
+        },
+        "scenarios": scenarios,
+    }
+
+
+def print_table(result):
+    print(f"{'scenario':>12} {'reqs':>6} {'err':>4} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, s in result["scenarios"].items():
+        print(f"{name:>12} {s['requests']:>6} {s['errors']:>4} {s['throughput_rps']:>9.1f} "
+              f"{s['p50_ms']:>8.2f} {s['p95_ms']:>8.2f} {s['p99_ms']:>8.2f}")
+
+
+def compare(result, baseline, threshold):
+    """Print current/baseline ratios; returns the names of regressed scenarios."""
+    regressed = []
+    print(f"\nvs {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')}):")
+    print(f"{'scenario':>12} {'p50 x':>7} {'p95 x':>7} {'p99 x':>7} {'req/s x':>8}")
+    for name, s in result["scenarios"].items():
+        b = baseline["scenarios"].get(name)
+        if not b:
+            continue
+        ratio = lambda k: s[k] / b[k] if b[k] else float("inf")  # noqa: E731
+        p95, rps = ratio("p95_ms"), ratio("throughput_rps")
+        flag = p95 > threshold or rps < 1 / threshold
+        if flag:
+            regressed.append(name)
+        print(f"{name:>12} {ratio('p50_ms'):>7.2f} {p95:>7.2f} {ratio('p99_ms'):>7.2f} {rps:>8.2f}"
+              f"{'  REGRESSED' if flag else ''}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="benchmark a running server instead of an in-process app")
+    parser.add_argument("--data-dir", help="data directory to use (built with datagen.py if empty)")
+    parser.add_argument("--classrooms", type=int, default=8, help="concurrent simulated classrooms")
+    parser.add_argument("--scans", type=int, default=250, help="validate scans per classroom")
+    parser.add_argument("--manual", type=int, default=50, help="manual marks per classroom")
+    parser.add_argument("--reads", type=int, default=100, help="list/summary requests per classroom")
+    parser.add_argument("--exports", type=int, default=3, help="exports per client and format")
+    parser.add_argument("--export-clients", type=int, default=2, help="concurrent export clients")
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--sessions-per-day", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", nargs="+", help="run only these scenarios")
+    parser.add_argument("--out", help="result JSON path")
+    parser.add_argument("--compare", help="earlier result JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="p95 or throughput ratio that counts as a regression")
+    args = parser.parse_args(argv)
+
+    result = run(args)
+    print_table(result)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"hot_paths-{result['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nWrote {out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressed = compare(result, json.load(f), args.threshold)
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
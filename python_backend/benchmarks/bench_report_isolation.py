@@ -0,0 +1,131 @@
+"""Scan latency while heavy exports run, reading the live database versus the reporting copy.
+
+Builds one synthetic data directory and copies it per mode. Each mode replays the start
+of a lecture in every classroom (each student scanned once, so every scan is a new row)
+twice through the test client: once on a quiet server, then while export workers stream
+full-history CSV exports back to back. The export workers are separate processes with
+their own app, as other gunicorn workers would be, so they compete for the database and
+the disk rather than for this process's GIL.
+
+    python python_backend/benchmarks/bench_report_isolation.py [--students 3000] [--days 60] \
+        [--classrooms 8] [--export-workers 2] [--interval 30]
+
+Mode "live" is REPORT_SNAPSHOT_SECONDS=0; mode "snapshot" sets it to --interval.
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import datagen
+import replay
+from bench_write_behind import lecture_start_scripts
+
+EXPORT_PATH = "/api/attendance/export?format=csv"
+
+
+def export_worker(data_dir, snapshot_seconds, ready, stop, done):
+    """Stream full exports until `stop` is set; counts them in `done`."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as app_module
+        flask_app = app_module.create_app({"DATA_DIR": data_dir, "REPORT_SNAPSHOT_SECONDS": snapshot_seconds,
+                                           "SEED_ROSTER_CSV": False, "LOG_LEVEL": "WARNING"})
+    client = flask_app.test_client()
+    ready.set()
+    while not stop.is_set():
+        res = client.get(EXPORT_PATH)
+        res.get_data()
+        res.close()
+        with done.get_lock():
+            done.value += 1
+    app_module.shutdown()
+
+
+def lecture(driver, students, classrooms):
+    """Open a session per room, scan every student once, close the sessions."""
+    rooms = [replay.classroom_room(c) for c in range(classrooms)]
+    for room in rooms:
+        driver.request("POST", "/api/session/start", {"name": "bench", "room": room})
+    try:
+        return replay.summarize(*replay.replay(driver, lecture_start_scripts(students, classrooms)))
+    finally:
+        for room in rooms:
+            driver.request("POST", "/api/session/end", {"room": room})
+
+
+def wal_bytes(data_dir):
+    try:
+        return os.path.getsize(os.path.join(data_dir, "attendance.db-wal"))
+    except OSError:
+        return 0
+
+
+def run_mode(mode, base_dir, students, args):
+    data_dir = tempfile.mkdtemp(prefix=f"attendance-bench-{mode}-")
+    shutil.copytree(base_dir, data_dir, dirs_exist_ok=True)
+    snapshot_seconds = args.interval if mode == "snapshot" else 0
+    import app as app_module
+    with contextlib.redirect_stdout(io.StringIO()):
+        flask_app = app_module.create_app({"DATA_DIR": data_dir, "REPORT_SNAPSHOT_SECONDS": snapshot_seconds,
+                                           "SEED_ROSTER_CSV": False, "LOG_LEVEL": "WARNING"})
+    driver = replay.TestClientDriver(flask_app)
+    if snapshot_seconds:
+        while app_module.report_snapshot.as_of() is None:
+            time.sleep(0.05)
+
+    quiet = lecture(driver, students, args.classrooms)
+
+    ctx = multiprocessing.get_context("spawn")
+    stop, done = ctx.Event(), ctx.Value("i", 0)
+    readies = [ctx.Event() for _ in range(args.export_workers)]
+    workers = [ctx.Process(target=export_worker, args=(data_dir, snapshot_seconds, r, stop, done))
+               for r in readies]
+    for w in workers:
+        w.start()
+    for r in readies:
+        r.wait()
+    time.sleep(args.warmup)  # let the first exports get going
+    loaded = lecture(driver, students, args.classrooms)
+    wal = wal_bytes(data_dir)
+    stop.set()
+    for w in workers:
+        w.join()
+    refreshes = app_module.report_snapshot.refreshes if app_module.report_snapshot is not None else 0
+    app_module.shutdown()
+    shutil.rmtree(data_dir, ignore_errors=True)
+    return quiet, loaded, done.value, wal, refreshes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=3000, help="roster size (split across classrooms)")
+    parser.add_argument("--days", type=int, default=60, help="days of history to export")
+    parser.add_argument("--classrooms", type=int, default=8, help="classrooms scanning at once")
+    parser.add_argument("--export-workers", type=int, default=2, help="processes streaming exports")
+    parser.add_argument("--interval", type=float, default=30, help="REPORT_SNAPSHOT_SECONDS in snapshot mode")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds of exports before the scans start")
+    args = parser.parse_args(argv)
+
+    base_dir = tempfile.mkdtemp(prefix="attendance-bench-base-")
+    built = datagen.build_data_dir(base_dir, args.students, args.days)
+    students = datagen.make_roster(args.students)
+    print(f"History: {built['attendance_rows']} rows in {built['sessions']} sessions; "
+          f"{args.export_workers} export workers, {args.classrooms} classrooms\n")
+    print(f"{'mode':>9} {'phase':>8} {'scans':>6} {'scans/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'exports':>8} {'WAL MiB':>8} {'copies':>7}")
+    for mode in ("live", "snapshot"):
+        quiet, loaded, exported, wal, refreshes = run_mode(mode, base_dir, students, args)
+        for phase, s in (("quiet", quiet), ("exports", loaded)):
+            extra = (f"{exported:>8} {wal / 2 ** 20:>8.1f} {refreshes:>7}" if phase == "exports"
+                     else f"{'':>8} {'':>8} {'':>7}")
+            print(f"{mode:>9} {phase:>8} {s['requests']:>6} {s['throughput_rps']:>9.1f} {s['p50_ms']:>8.2f} "
+                  f"{s['p95_ms']:>8.2f} {s['p99_ms']:>8.2f} {extra}")
+    shutil.rmtree(base_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Measure worker cold start: time to import and build the app, and resident memory.
+
+Each sample runs in a fresh interpreter against a temporary data directory seeded with
+the bundled class list, the way a newly spawned worker process starts:
+
+    python python_backend/benchmarks/bench_startup.py [--runs 5]
+
+Reports the median time to a ready app (import plus create_app()), the time to answer
+the first request, and RSS once the app is ready.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import contextlib, io, json, sys, time
+t0 = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as app_module
+    flask_app = app_module.create_app() if hasattr(app_module, "create_app") else app_module.app
+ready = time.perf_counter() - t0
+
+def rss_mib():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+
+rss = rss_mib()
+with contextlib.redirect_stdout(io.StringIO()):
+    flask_app.test_client().get("/health")
+first = time.perf_counter() - t0
+print(json.dumps({
+    "ready_ms": ready * 1000,
+    "first_request_ms": first * 1000,
+    "rss_mib": rss,
+    "export_libs_loaded": "reportlab" in sys.modules or "openpyxl" in sys.modules,
+}))
+"""
+
+
+def sample():
+    data_dir = tempfile.mkdtemp(prefix="attendance-bench-")
+    try:
+        shutil.copy(os.path.join(BACKEND_DIR, "data", "cleaned_class_list.csv"), data_dir)
+        env = dict(os.environ, ATTENDANCE_DATA_DIR=data_dir)
+        out = subprocess.run([sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=env,
+                             capture_output=True, text=True, check=True).stdout
+        return json.loads(out.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    samples = [sample() for _ in range(args.runs)]
+    for key in ("ready_ms", "first_request_ms", "rss_mib"):
+        print(f"{key:>17}: {statistics.median(s[key] for s in samples):8.1f}")
+    print(f"{'export libs':>17}: {'loaded' if samples[0]['export_libs_loaded'] else 'not loaded'} at startup")
+
+
+if __name__ == "__main__":
+    main()
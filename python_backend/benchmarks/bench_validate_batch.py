@@ -0,0 +1,70 @@
+"""Benchmark POST /api/validate/batch against the per-scan POST /api/validate path.
+
+Runs entirely against a throwaway data directory through Flask's test client:
+
+    python python_backend/benchmarks/bench_validate_batch.py [--sizes 1000 10000] [--roster 2000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import datagen
+
+
+def fresh_app(roster_size):
+    """Build the app against a new temp data dir and return (flask app, students)."""
+    data_dir = tempfile.mkdtemp(prefix="attendance-bench-")
+    students = datagen.make_roster(roster_size)
+    datagen.write_roster_csv(os.path.join(data_dir, "cleaned_class_list.csv"), students)
+    os.environ["ATTENDANCE_DATA_DIR"] = data_dir
+    sys.modules.pop("app", None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as app_module
+        flask_app = app_module.create_app()
+    return flask_app, students
+
+
+def run_per_scan(size, roster_size):
+    flask_app, students = fresh_app(roster_size)
+    client = flask_app.test_client()
+    client.post("/api/session/start", json={"name": "bench"})
+    sightings = datagen.make_sightings(students, size)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for s in sightings:
+            client.post("/api/validate", json=s)
+        elapsed = time.perf_counter() - start
+    return elapsed
+
+
+def run_batch(size, roster_size):
+    flask_app, students = fresh_app(roster_size)
+    client = flask_app.test_client()
+    client.post("/api/session/start", json={"name": "bench"})
+    sightings = datagen.make_sightings(students, size)
+    start = time.perf_counter()
+    res = client.post("/api/validate/batch", json={"sightings": sightings})
+    elapsed = time.perf_counter() - start
+    assert res.status_code == 200, res.get_data(as_text=True)
+    return elapsed, res.get_json()["counts"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--roster", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    print(f"{'sightings':>10} {'per-scan s':>11} {'batch s':>9} {'speedup':>8}  batch counts")
+    for size in args.sizes:
+        per_scan = run_per_scan(size, args.roster)
+        batch, counts = run_batch(size, args.roster)
+        print(f"{size:>10} {per_scan:>11.3f} {batch:>9.3f} {per_scan / batch:>7.1f}x  {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Sustained scans per second with direct commits versus WRITE_BEHIND=on.
+
+Replays the start of a lecture in every classroom at once: each classroom's scanner
+reports each of its students once, so every scan is a new attendance row. Runs through
+Flask's test client against a throwaway data directory per mode:
+
+    python python_backend/benchmarks/bench_write_behind.py [--classrooms 16] [--students 4000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import tempfile
+
+import datagen
+import replay
+
+
+def lecture_start_scripts(students, classrooms, seed=42):
+    """One script per classroom: each member scanned once, in random order."""
+    scripts = []
+    for c in range(classrooms):
+        members = list(students[c::classrooms])
+        random.Random(f"{seed}-arrive-{c}").shuffle(members)
+        room = replay.classroom_room(c)
+        scripts.append([("POST", "/api/validate", {"mac_address": s["MAC"], "room": room}) for s in members])
+    return scripts
+
+
+def run_mode(mode, args):
+    data_dir = tempfile.mkdtemp(prefix="attendance-bench-")
+    students = datagen.make_roster(args.students)
+    datagen.write_roster_csv(os.path.join(data_dir, "cleaned_class_list.csv"), students)
+    import app as app_module
+    with contextlib.redirect_stdout(io.StringIO()):
+        flask_app = app_module.create_app({"DATA_DIR": data_dir, "WRITE_BEHIND": mode, "LOG_LEVEL": "WARNING"})
+    driver = replay.TestClientDriver(flask_app)
+    for c in range(args.classrooms):
+        driver.request("POST", "/api/session/start", {"name": "bench", "room": replay.classroom_room(c)})
+
+    summary = replay.summarize(*replay.replay(driver, lecture_start_scripts(students, args.classrooms)))
+    batches = app_module.write_behind.batches if app_module.write_behind is not None else summary["requests"]
+    app_module.shutdown()  # durable before counting
+
+    con = sqlite3.connect(os.path.join(data_dir, "attendance.db"))
+    stored = con.execute("SELECT COUNT(*) FROM attendance").fetchone()[0]
+    con.close()
+    return summary, batches, stored
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--classrooms", type=int, default=16, help="classrooms scanning at once")
+    parser.add_argument("--students", type=int, default=4000, help="students (split across classrooms)")
+    args = parser.parse_args(argv)
+
+    print(f"{'mode':>6} {'scans':>6} {'scans/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'commits':>8} {'stored':>7}")
+    for mode in ("off", "on"):
+        s, batches, stored = run_mode(mode, args)
+        print(f"{mode:>6} {s['requests']:>6} {s['throughput_rps']:>9.1f} {s['p50_ms']:>8.2f} "
+              f"{s['p95_ms']:>8.2f} {s['p99_ms']:>8.2f} {batches:>8} {stored:>7}")
+
+
+if __name__ == "__main__":
+    main()
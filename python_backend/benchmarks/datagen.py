@@ -0,0 +1,134 @@
+"""Synthetic, reproducible data for benchmarks: rosters, sightings and attendance history.
+
+Everything is derived from a seed, so two runs with the same arguments produce the same
+data. Build a data directory for a server under test with:
+
+    python python_backend/benchmarks/datagen.py --data-dir /tmp/attendance-bench \
+        [--students 2000] [--days 90] [--sessions-per-day 4] [--seed 42]
+
+then start the backend with ATTENDANCE_DATA_DIR=/tmp/attendance-bench.
+"""
+import argparse
+import csv
+import os
+import random
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import schema  # noqa: E402
+import snapshots  # noqa: E402
+from roster_import import import_roster  # noqa: E402
+
+HISTORY_START = datetime(2025, 1, 6, 8, 0, 0)  # a Monday
+INSERT_SQL = "INSERT INTO attendance (student_id, name, mac, ts, day, session_id) VALUES (?, ?, ?, ?, ?, ?)"
+
+
+def student_mac(i):
+    """Locally administered MAC address unique to student i."""
+    return ":".join(f"{b:02X}" for b in (0x02, 0, (i >> 16) & 0xFF, (i >> 8) & 0xFF, i & 0xFF, 0x01))
+
+
+def make_roster(n):
+    return [{"Name": f"Student {i:05d}", "Student ID": f"S{i:07d}", "MAC": student_mac(i)} for i in range(n)]
+
+
+def write_roster_csv(path, students):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Name", "Student ID", "MAC"])
+        for s in students:
+            writer.writerow([s["Name"], s["Student ID"], s["MAC"]])
+
+
+def make_sightings(students, n, seed=42, unknown_ratio=0.02):
+    """Scanner sightings: known devices picked at random (so repeats occur) plus unknown ones."""
+    rng = random.Random(seed)
+    sightings = []
+    for _ in range(n):
+        if rng.random() < unknown_ratio:
+            sightings.append({"mac_address": "FE:ED:00:00:%02X:%02X" % (rng.randrange(256), rng.randrange(256))})
+        else:
+            s = rng.choice(students)
+            sightings.append({"mac_address": s["MAC"], "name": s["Name"]})
+    return sightings
+
+
+def fill_history(con, students, days=90, sessions_per_day=4, attendance_rate=0.85,
+                 day_mode_per_day=20, seed=42, start=HISTORY_START):
+    """Insert closed sessions on weekdays and the attendance logged in them.
+
+    Each session lasts 50 minutes, two hours apart; each student attends with probability
+    attendance_rate and is seen within the first ten minutes. day_mode_per_day students
+    per day are also logged without a session. Closed sessions are frozen into snapshots
+    as end_active_session would. Returns (sessions, attendance rows).
+    """
+    rng = random.Random(seed)
+    n_sessions = n_rows = 0
+    with con:
+        for d in range(days):
+            day_start = start + timedelta(days=d)
+            if day_start.weekday() >= 5:
+                continue
+            for k in range(sessions_per_day):
+                opened = day_start + timedelta(hours=2 * k)
+                session_id = con.execute(
+                    "INSERT INTO sessions (name, start_ts, end_ts) VALUES (?, ?, ?)",
+                    (f"Lecture {day_start:%Y-%m-%d} #{k + 1}", opened.isoformat(),
+                     (opened + timedelta(minutes=50)).isoformat()),
+                ).lastrowid
+                rows = []
+                for s in students:
+                    if rng.random() < attendance_rate:
+                        ts = (opened + timedelta(seconds=rng.randrange(600))).isoformat()
+                        rows.append((s["Student ID"], s["Name"], s["MAC"], ts, ts[:10], session_id))
+                con.executemany(INSERT_SQL, rows)
+                n_sessions += 1
+                n_rows += len(rows)
+            noon = (day_start + timedelta(hours=4)).isoformat()
+            rows = [(s["Student ID"], s["Name"], s["MAC"], noon, noon[:10], None)
+                    for s in rng.sample(students, min(day_mode_per_day, len(students)))]
+            con.executemany(INSERT_SQL, rows)
+            n_rows += len(rows)
+        snapshots.freeze_closed_sessions(con)
+    return n_sessions, n_rows
+
+
+def build_data_dir(data_dir, students=2000, days=90, sessions_per_day=4, attendance_rate=0.85, seed=42):
+    """Write the class-list CSV and a migrated attendance.db with roster and history."""
+    os.makedirs(data_dir, exist_ok=True)
+    roster = make_roster(students)
+    write_roster_csv(os.path.join(data_dir, "cleaned_class_list.csv"), roster)
+    con = sqlite3.connect(os.path.join(data_dir, "attendance.db"))
+    try:
+        con.execute("PRAGMA journal_mode=WAL")
+        schema.ensure_schema(con)
+        import_roster(con, roster)
+        n_sessions, n_rows = fill_history(con, roster, days, sessions_per_day, attendance_rate, seed=seed)
+    finally:
+        con.close()
+    return {"students": students, "sessions": n_sessions, "attendance_rows": n_rows}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", required=True)
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--sessions-per-day", type=int, default=4)
+    parser.add_argument("--attendance-rate", type=float, default=0.85)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+    if os.path.exists(os.path.join(args.data_dir, "attendance.db")):
+        parser.error(f"{args.data_dir} already has an attendance.db")
+    info = build_data_dir(args.data_dir, args.students, args.days, args.sessions_per_day,
+                          args.attendance_rate, args.seed)
+    print(f"[INFO] Built {args.data_dir}: {info}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Deterministic request replay against the backend, in-process or over HTTP.
+
+A workload is a list of request scripts, one per simulated classroom. Each script is
+replayed on its own thread, so N classrooms put N concurrent clients on the server.
+Scripts are built from a seed, so a run sends exactly the same requests every time.
+"""
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+
+class TestClientDriver:
+    """Drives a Flask app in-process through its test client (one client per thread)."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.flask_app.test_client()
+        res = client.open(path, method=method, json=body)
+        size = len(res.get_data())  # drains streamed responses (exports)
+        res.close()
+        return res.status_code, size
+
+
+class HttpDriver:
+    """Drives a running server, e.g. gunicorn started on a datagen data directory."""
+
+    def __init__(self, base_url, timeout=300):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={"Content-Type": "application/json"} if data else {})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as res:
+                return res.status, len(res.read())
+        except urllib.error.HTTPError as e:
+            return e.code, len(e.read())
+
+
+def classroom_room(c):
+    """Room name used by simulated classroom c."""
+    return f"room-{c:03d}"
+
+
+def classroom_scans(students, classrooms, scans_per_classroom, seed=42, unknown_ratio=0.02):
+    """Scan scripts for POST /api/validate, one per classroom.
+
+    Classroom c holds every classrooms-th student and scans from classroom_room(c). Its
+    scanner reports devices in random order with repeats, as a real scanner re-reports
+    devices that keep advertising, plus a share of unknown devices.
+    """
+    scripts = []
+    for c in range(classrooms):
+        rng = random.Random(f"{seed}-scan-{c}")
+        members = students[c::classrooms] or students
+        script = []
+        for _ in range(scans_per_classroom):
+            if rng.random() < unknown_ratio:
+                mac = "FE:ED:%02X:%02X:%02X:%02X" % (c & 0xFF, rng.randrange(256), rng.randrange(256), rng.randrange(256))
+            else:
+                mac = rng.choice(members)["MAC"]
+            script.append(("POST", "/api/validate", {"mac_address": mac, "room": classroom_room(c)}))
+        scripts.append(script)
+    return scripts
+
+
+def classroom_requests(classrooms, per_classroom, make_request, seed=42, name="req"):
+    """Scripts of per_classroom requests each, built by make_request(rng, classroom)."""
+    scripts = []
+    for c in range(classrooms):
+        rng = random.Random(f"{seed}-{name}-{c}")
+        scripts.append([make_request(rng, c) for _ in range(per_classroom)])
+    return scripts
+
+
+def replay(driver, scripts):
+    """Replay each script on its own thread. Returns (latencies in seconds, statuses, elapsed)."""
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    start_gate = threading.Event()
+
+    def run(script):
+        mine = []
+        codes = Counter()
+        start_gate.wait()
+        for method, path, body in script:
+            t = time.perf_counter()
+            try:
+                status, _ = driver.request(method, path, body)
+            except Exception as e:  # connection errors count against the scenario
+                status = type(e).__name__
+            mine.append(time.perf_counter() - t)
+            codes[status] += 1
+        with lock:
+            latencies.extend(mine)
+            statuses.update(codes)
+
+    threads = [threading.Thread(target=run, args=(s,), daemon=True) for s in scripts]
+    for t in threads:
+        t.start()
+    began = time.perf_counter()
+    start_gate.set()
+    for t in threads:
+        t.join()
+    return latencies, statuses, time.perf_counter() - began
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(latencies, statuses, elapsed):
+    ordered = sorted(latencies)
+    ms = lambda s: round(s * 1000, 3)  # noqa: E731
+    return {
+        "requests": len(ordered),
+        "errors": sum(n for code, n in statuses.items() if not (isinstance(code, int) and code < 500)),
+        "statuses": {str(code): n for code, n in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+        "p50_ms": ms(percentile(ordered, 50)),
+        "p95_ms": ms(percentile(ordered, 95)),
+        "p99_ms": ms(percentile(ordered, 99)),
+        "max_ms": ms(ordered[-1]) if ordered else 0.0,
+    }
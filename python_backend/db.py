@@ -0,0 +1,88 @@
+"""SQLite connection pool: long-lived connections opened once with WAL and tuned pragmas."""
+import os
+import queue
+import sqlite3
+import threading
+from typing import Optional
+
+
+class ConnectionPool:
+    """Small LIFO pool of configured connections for one database file.
+
+    Connections are handed out one holder at a time (a request or a thread) and returned
+    with release(), so the per-connection prepared-statement cache survives across
+    requests. WAL lets report/export readers run alongside scan writers, and the busy
+    timeout makes a blocked writer wait instead of failing with "database is locked".
+
+    The pool never makes a holder wait: acquire() opens a new connection when none is
+    idle, so as many are open as there are concurrent holders (at most the server's
+    request threads). max_idle only caps how many are kept for reuse afterwards.
+    """
+
+    def __init__(self, path: str, max_idle: int = 8, busy_timeout_ms: int = 5000,
+                 cache_size_kib: int = 16384, mmap_size: int = 64 * 1024 * 1024,
+                 cached_statements: int = 256):
+        self.path = path
+        self.max_idle = max_idle
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._local = threading.local()
+        self._wal_ready = False
+        self._wal_lock = threading.Lock()
+
+    def connect(self) -> sqlite3.Connection:
+        """Open a new configured connection (not tracked by the pool)."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        conn.row_factory = sqlite3.Row
+        if not self._wal_ready:
+            # journal_mode is persistent in the file; only needs to be set once per process
+            with self._wal_lock:
+                conn.execute("PRAGMA journal_mode=WAL")
+                self._wal_ready = True
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self.connect()
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            conn.rollback()
+        if self._idle.qsize() < self.max_idle:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    def thread_connection(self) -> sqlite3.Connection:
+        """Connection pinned to the calling thread, for work outside a request (startup, CLI)."""
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self.connect()
+        return conn
+
+    def close_all(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,120 @@
+"""Live-feed events read back from the database, so every worker process streams every write.
+
+EventBus is per process: with several gunicorn workers, a viewer of GET /api/stream only
+saw the scans, sessions and matches handled by the worker it happened to connect to.
+With STREAM_POLL_SECONDS set, each worker runs an EventRelay instead. Its thread polls
+the tables the events describe and publishes what is new to the worker's own EventBus:
+
+  - attendance rows with an id above the last one seen ("attendance-logged"). Ids are
+    handed out under SQLite's write lock, so rows become visible in id order;
+  - sessions, when the "session" meta version moved: new ids ("session-started") and
+    sessions that were open and no longer are ("session-ended");
+  - pending_matches rows with an id above the last one seen ("match-pending").
+
+Handlers then skip their own publish (app.publish_event), so a worker never sends an
+event twice. Events reach viewers up to poll_seconds after the commit. Polling starts
+from the state at startup; earlier rows are not replayed.
+"""
+import json
+import logging
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import schema
+
+log = logging.getLogger("attendance.events")
+
+SESSION_COLUMNS = "id, name, start_ts, end_ts, room"
+MATCH_COLUMNS = "id, device_name, mac, room, session_id, day, ts, candidates, status, student_id, resolved_ts"
+ATTENDANCE_SQL = (
+    "SELECT a.id, a.student_id, a.name, a.mac, a.ts, a.session_id, IFNULL(s.room, '') AS room "
+    "FROM attendance a LEFT JOIN sessions s ON s.id = a.session_id WHERE a.id > ? ORDER BY a.id"
+)
+
+
+class EventRelay:
+    """Publishes rows committed by any process on the database `connect()` opens, every
+    `poll_seconds`, through publish(event_type, data)."""
+
+    def __init__(self, connect: Callable, publish: Callable[[str, Dict[str, Any]], Any], poll_seconds: float):
+        self.connect = connect
+        self.publish = publish
+        self.poll_seconds = poll_seconds
+        self.polls = 0
+        self.events = 0
+        self._con = connect()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._attendance_id, self._match_id, self._session_id = self._con.execute(
+            "SELECT (SELECT IFNULL(MAX(id), 0) FROM attendance), (SELECT IFNULL(MAX(id), 0) FROM pending_matches), "
+            "(SELECT IFNULL(MAX(id), 0) FROM sessions)"
+        ).fetchone()
+        self._session_version = schema.read_version(self._con, "session")
+        self._open = {r[0] for r in self._con.execute("SELECT id FROM sessions WHERE end_ts IS NULL")}
+        self._thread: Optional[threading.Thread] = threading.Thread(target=self._run, name="event-relay", daemon=True)
+        self._thread.start()
+
+    def poll(self) -> int:
+        """Publish everything committed since the last poll; returns the number of events."""
+        with self._lock:
+            con = self._con
+            con.execute("BEGIN")  # one read snapshot for all three tables
+            try:
+                started, ended = self._session_changes(con)
+                rows = con.execute(ATTENDANCE_SQL, (self._attendance_id,)).fetchall()
+                matches = con.execute(f"SELECT {MATCH_COLUMNS} FROM pending_matches WHERE id > ? ORDER BY id",
+                                      (self._match_id,)).fetchall()
+            finally:
+                con.rollback()
+            for row in started:
+                self.publish("session-started", row)
+            for row in rows:
+                event = dict(row)
+                self._attendance_id = event.pop("id")
+                self.publish("attendance-logged", event)
+            for row in matches:
+                match = dict(row)
+                match["candidates"] = json.loads(match["candidates"])
+                self._match_id = match["id"]
+                self.publish("match-pending", match)
+            for row in ended:
+                self.publish("session-ended", row)
+            self.polls += 1
+            count = len(started) + len(rows) + len(matches) + len(ended)
+            self.events += count
+            return count
+
+    def _session_changes(self, con):
+        version = schema.read_version(con, "session")
+        if version == self._session_version:
+            return [], []
+        self._session_version = version
+        started = [dict(r) for r in con.execute(
+            f"SELECT {SESSION_COLUMNS} FROM sessions WHERE id > ? ORDER BY id", (self._session_id,))]
+        if started:
+            self._session_id = started[-1]["id"]
+        # A session opened and closed between two polls is reported as started, then ended
+        watched = self._open | {s["id"] for s in started}
+        marks = ",".join("?" * len(watched))
+        rows = [dict(r) for r in con.execute(
+            f"SELECT {SESSION_COLUMNS} FROM sessions WHERE id IN ({marks}) ORDER BY id", tuple(watched))
+        ] if watched else []
+        ended = [r for r in rows if r["end_ts"] is not None]
+        self._open = {r["id"] for r in rows if r["end_ts"] is None}
+        return started, ended
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            self._con.close()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.poll()
+            except sqlite3.Error as e:
+                log.error(f"Live-feed relay poll failed, retrying: {e}")
@@ -0,0 +1,83 @@
+"""In-process publish/subscribe for the live attendance feed (GET /api/stream).
+
+Every event gets an id of the form "<epoch>-<n>". The last `history` events are kept,
+so a reconnecting EventSource that sends Last-Event-ID receives what it missed. An id
+from another process lifetime, or one older than the history, is answered with a
+"resync" event telling the client to refetch state instead.
+"""
+import json
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+
+class Subscription:
+    """One listener's bounded queue. A listener that falls behind is flagged as lagged."""
+
+    def __init__(self, maxsize: int):
+        self.queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=maxsize)
+        self.lagged = False
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.lagged = True
+
+    def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    def __init__(self, history: int = 1000, queue_size: int = 256):
+        self.epoch = str(int(time.time()))
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._history: deque = deque(maxlen=history)
+        self._subscribers: set = set()
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self._seq += 1
+            event = {"id": f"{self.epoch}-{self._seq}", "seq": self._seq, "type": event_type, "data": data}
+            self._history.append(event)
+            for sub in self._subscribers:
+                sub.offer(event)
+        return event
+
+    def subscribe(self, last_event_id: Optional[str] = None, limit: int = 0):
+        """Register a listener. Returns (subscription, missed events, needs_resync); the
+        subscription is None when `limit` (if set) listeners are already registered."""
+        sub = Subscription(self.queue_size)
+        missed: List[Dict[str, Any]] = []
+        resync = False
+        with self._lock:
+            if limit and len(self._subscribers) >= limit:
+                return None, missed, resync
+            if last_event_id:
+                epoch, _, seq = last_event_id.partition("-")
+                oldest = self._history[0]["seq"] if self._history else self._seq + 1
+                if epoch != self.epoch or not seq.isdigit() or int(seq) + 1 < oldest:
+                    resync = True
+                else:
+                    missed = [e for e in self._history if e["seq"] > int(seq)]
+            self._subscribers.add(sub)
+        return sub, missed, resync
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
@@ -0,0 +1,175 @@
+"""Background export jobs with artifacts cached on disk.
+
+A job is identified by a hash of its format, filters and a data-version stamp of the
+rows it covers, so asking twice for the same report joins the running job, and once the
+file exists any worker process serves it again without re-rendering. A closed session's
+stamp never changes, so its report is rendered once.
+
+The stamp a request computes only finds an existing job or file. The job reads the
+stamp again in the read transaction of its export query and names the file after that
+one, so a file always holds the rows its name says, even when rows were logged between
+the request and the job.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import exports
+
+log = logging.getLogger("attendance.exports")
+
+
+class ExportJob:
+    def __init__(self, job_id: str, fmt: str, filters: Dict[str, Any], total: int, path: str):
+        self.id = job_id
+        self.format = fmt
+        self.filters = filters
+        self.total = total
+        self.path = path
+        self.status = "queued"  # queued -> running -> done | failed
+        self.rows_done = 0
+        self.error: Optional[str] = None
+        self.cached = False
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "format": self.format,
+            "filters": self.filters,
+            "status": self.status,
+            "rows_done": self.rows_done,
+            "total_rows": self.total,
+            "progress": round(self.rows_done / self.total, 3) if self.total else (1.0 if self.status == "done" else 0.0),
+            "cached": self.cached,
+            "error": self.error,
+        }
+
+
+class ExportJobManager:
+    """Runs export jobs on a small thread pool and keeps finished files in `directory`."""
+
+    def __init__(self, directory: str, connect: Callable, max_workers: int = 2,
+                 max_age: float = 7 * 24 * 3600):
+        self.directory = directory
+        self.connect = connect
+        self.max_age = max_age
+        self._jobs: Dict[str, ExportJob] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export")
+
+    @staticmethod
+    def cache_key(fmt: str, filters: Dict[str, Any], stamp) -> str:
+        raw = json.dumps({"format": fmt, "filters": filters, "stamp": stamp}, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def artifact_path(self, job_id: str, fmt: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.{fmt}")
+
+    def submit(self, fmt: str, sql: str, params, filters: Dict[str, Any], stamp, total: int,
+               connect: Optional[Callable] = None,
+               read_stamp: Optional[Callable[[Any], Tuple[Any, int]]] = None) -> ExportJob:
+        """Queue an export, or return the running/finished job for the same query and data.
+        `connect` opens the job's connection (default: the manager's). read_stamp(con)
+        returns (stamp, total) of the data the job reads; without it `stamp` is trusted."""
+        job_id = self.cache_key(fmt, filters, stamp)
+        path = self.artifact_path(job_id, fmt)
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job and job.status != "failed":
+                return job
+            job = ExportJob(job_id, fmt, filters, total, path)
+            self._jobs[job_id] = job
+            if os.path.exists(path):
+                self._mark_cached(job)
+                return job
+        self.prune()
+        self._executor.submit(self._run, job, sql, list(params), connect or self.connect, read_stamp)
+        return job
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        with self._lock:
+            if job := self._jobs.get(job_id):
+                return job
+        # Finished by another worker process: the artifact on disk is all we need
+        for fmt in exports.EXPORT_FORMATS:
+            path = self.artifact_path(job_id, fmt)
+            if os.path.exists(path):
+                job = ExportJob(job_id, fmt, {}, 0, path)
+                self._mark_cached(job)
+                return job
+        return None
+
+    def prune(self) -> None:
+        """Forget jobs and delete artifacts older than max_age."""
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if job.finished_at and job.finished_at < cutoff:
+                    del self._jobs[job_id]
+        try:
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+        except OSError:
+            pass
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+    @staticmethod
+    def _mark_cached(job: ExportJob) -> None:
+        job.status = "done"
+        job.cached = True
+        job.rows_done = job.total
+        job.finished_at = time.time()
+
+    def _run(self, job: ExportJob, sql: str, params, connect: Callable, read_stamp: Optional[Callable]) -> None:
+        job.status = "running"
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = None
+        con = connect()
+        try:
+            con.execute("BEGIN")  # one read snapshot for the stamp and the rows
+            if read_stamp is not None and self._restamp(job, *read_stamp(con)):
+                return
+            tmp_path = f"{job.path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as f:
+                exports.WRITERS[job.format](
+                    con.execute(sql, params), f, progress=lambda n: setattr(job, "rows_done", n)
+                )
+            os.replace(tmp_path, job.path)
+            job.status = "done"
+        except Exception as e:
+            log.error(f"Export job {job.id} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        finally:
+            con.rollback()
+            con.close()
+            job.finished_at = time.time()
+
+    def _restamp(self, job: ExportJob, stamp, total: int) -> bool:
+        """Name the job's file after the stamp read with its rows. Returns True when that
+        file already exists (the job is then done)."""
+        job.total = total
+        key = self.cache_key(job.format, job.filters, stamp)
+        if key == job.id:
+            return False
+        job.path = self.artifact_path(key, job.format)
+        with self._lock:
+            self._jobs.setdefault(key, job)
+        if os.path.exists(job.path):
+            self._mark_cached(job)
+            return True
+        return False
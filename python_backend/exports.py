@@ -0,0 +1,166 @@
+"""Attendance export writers that stream rows from a cursor in fixed-size chunks.
+
+openpyxl and reportlab are imported inside the writers that need them, so workers that
+never render an XLSX or PDF export do not pay for loading them.
+"""
+import csv
+from io import StringIO
+from tempfile import SpooledTemporaryFile
+from typing import Callable, Iterator, Optional
+
+EXPORT_HEADER = ["Student ID", "Name", "MAC", "Timestamp", "Session ID", "Dwell (min)"]
+EXPORT_SQL = "SELECT student_id, name, mac, ts, session_id, dwell_seconds FROM attendance"
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf",
+}
+
+FETCH_SIZE = 1000                     # rows pulled from SQLite per fetchmany()
+FILE_CHUNK_SIZE = 64 * 1024           # bytes per chunk when streaming a finished file
+SPOOL_MAX_SIZE = 8 * 1024 * 1024      # XLSX/PDF stay in memory below this, then move to disk
+PDF_ROWS_PER_TABLE = 500              # rows per LongTable chunk in PDF reports
+
+PDF_TABLE_STYLE = [
+    ('BACKGROUND', (0, 0), (-1, 0), '#f0f0f0'),
+    ('TEXTCOLOR', (0, 0), (-1, 0), '#000000'),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), '#ffffff'),
+    ('GRID', (0, 0), (-1, -1), 1, '#000000'),
+]
+
+Progress = Optional[Callable[[int], None]]  # called with the number of rows written so far
+
+
+def export_row(r):
+    dwell = r["dwell_seconds"]
+    return [r["student_id"], r["name"], r["mac"], r["ts"], r["session_id"] or "",
+            "" if dwell is None else round(dwell / 60, 1)]
+
+
+def iter_chunks(cursor, fetch_size: int = FETCH_SIZE, progress: Progress = None):
+    """Yield lists of up to fetch_size rows, reporting progress after each one is consumed."""
+    done = 0
+    while rows := cursor.fetchmany(fetch_size):
+        yield rows
+        done += len(rows)
+        if progress:
+            progress(done)
+
+
+def iter_csv(cursor_factory, fetch_size: int = FETCH_SIZE, progress: Progress = None) -> Iterator[str]:
+    """Yield the CSV export in chunks of fetch_size rows.
+
+    The header is yielded before cursor_factory() runs the query, so the client gets its
+    first byte immediately; only one chunk of rows is held in memory at a time.
+    """
+    buf = StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_HEADER)
+    yield buf.getvalue()
+
+    for rows in iter_chunks(cursor_factory(), fetch_size, progress):
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(export_row(r) for r in rows)
+        yield buf.getvalue()
+
+
+def write_csv(cursor, out, fetch_size: int = FETCH_SIZE, progress: Progress = None) -> None:
+    """Write the CSV export to a binary file object."""
+    for text in iter_csv(lambda: cursor, fetch_size, progress):
+        out.write(text.encode("utf-8"))
+
+
+def write_xlsx(cursor, out=None, fetch_size: int = FETCH_SIZE, progress: Progress = None):
+    """Write the export with openpyxl's write-only mode.
+
+    Write-only worksheets flush rows to disk as they are appended, so memory does not
+    grow with the row count. Without `out`, a spooled temp file is created and returned
+    positioned at the start.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Attendance")
+    ws.append(EXPORT_HEADER)
+    for rows in iter_chunks(cursor, fetch_size, progress):
+        for r in rows:
+            ws.append(export_row(r))
+
+    if out is None:
+        out = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        wb.save(out)
+        out.seek(0)
+        return out
+    wb.save(out)
+    return out
+
+
+def write_pdf(cursor, out=None, fetch_size: int = FETCH_SIZE, progress: Progress = None,
+              rows_per_table: int = PDF_ROWS_PER_TABLE):
+    """Write the export as a PDF report.
+
+    Rows are laid out as a series of LongTables of rows_per_table rows (header repeated on
+    every page) rather than one huge Table, which keeps reportlab's split/layout work per
+    page chunk instead of over the whole dataset. Progress counts rows as they are laid out
+    on pages, which is where the time goes. Without `out`, a spooled temp file is created
+    and returned positioned at the start.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import LongTable, Paragraph, SimpleDocTemplate
+
+    target = out if out is not None else SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    doc = SimpleDocTemplate(target, pagesize=letter)
+    styles = getSampleStyleSheet()
+    elements = [Paragraph("Attendance Report", styles['Title'])]
+
+    pending = []
+    for rows in iter_chunks(cursor, fetch_size):
+        for r in rows:
+            pending.append([str(v) for v in export_row(r)])
+            if len(pending) == rows_per_table:
+                elements.append(pdf_table(pending))
+                pending = []
+    if pending or len(elements) == 1:
+        elements.append(pdf_table(pending))
+
+    if progress:
+        laid_out = 0
+
+        def after_flowable(flowable):
+            nonlocal laid_out
+            if isinstance(flowable, LongTable):  # page-sized pieces of a split table are LongTables too
+                laid_out += flowable._nrows - 1
+                progress(laid_out)
+
+        doc.afterFlowable = after_flowable
+
+    doc.build(elements)
+    if out is None:
+        target.seek(0)
+    return target
+
+
+def pdf_table(rows):
+    from reportlab.platypus import LongTable, TableStyle
+
+    table = LongTable([EXPORT_HEADER] + rows, repeatRows=1)
+    table.setStyle(TableStyle(PDF_TABLE_STYLE))
+    return table
+
+
+WRITERS = {"csv": write_csv, "xlsx": write_xlsx, "pdf": write_pdf}
+
+
+def iter_file(f, chunk_size: int = FILE_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield a file's contents in chunks and close it afterwards."""
+    try:
+        while chunk := f.read(chunk_size):
+            yield chunk
+    finally:
+        f.close()
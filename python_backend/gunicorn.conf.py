@@ -0,0 +1,29 @@
+"""Gunicorn settings for the attendance backend: `gunicorn -c gunicorn.conf.py wsgi:app`."""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+
+# GET /api/stream holds a request thread for as long as a viewer stays connected. The
+# threads mostly sleep, so there are plenty of them, and each worker accepts at most
+# STREAM_MAX_CONNECTIONS streams: the rest of its threads always serve the API. A viewer
+# over the limit is told to reconnect later (see stream_events).
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "64"))
+API_THREADS = int(os.environ.get("GUNICORN_API_THREADS", "16"))   # never taken by streams
+os.environ.setdefault("STREAM_MAX_CONNECTIONS", str(max(threads - API_THREADS, 1)))
+
+# Each worker's live feed is read back from the database, so a viewer sees scans and
+# sessions handled by every worker, whichever one it is connected to
+if workers > 1:
+    os.environ.setdefault("STREAM_POLL_SECONDS", "0.5")
+
+# SQLite connections must not be shared across fork(): every worker builds its own app
+# after forking. Concurrent first starts are safe because schema.ensure_schema migrates once.
+preload_app = False
+
+
+def worker_exit(server, worker):
+    # Commit inserts still queued in write-behind mode (WRITE_BEHIND=on) before the worker exits
+    import app
+    app.shutdown()
@@ -0,0 +1,226 @@
+"""Request and SQLite instrumentation, exposed in Prometheus text format at GET /metrics.
+
+Counters live in this process only: with several workers, each one reports its own
+requests, the way Prometheus client libraries behave without multiprocess mode.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Callable, Dict, Optional, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Bucketed histogram per label set.
+
+    observe() increments only the value's own bucket (found by bisection); the cumulative
+    counts Prometheus expects are summed up at render time.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.series: Dict[Labels, list] = {}  # labels -> [per-bucket counts..., over last bucket, sum]
+
+    def observe(self, labels: Labels, value: float) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+
+class Metrics:
+    """Registry of the app's counters, gauges and histograms. All updates hold one lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[Labels, int] = defaultdict(int)
+        self.in_flight: Dict[Labels, int] = defaultdict(int)
+        self.request_latency = Histogram(LATENCY_BUCKETS)
+        self.request_queries: Dict[Labels, int] = defaultdict(int)
+        self.request_sql_seconds: Dict[Labels, float] = defaultdict(float)
+        self.query_latency = Histogram(QUERY_BUCKETS)
+        self.slow_queries = 0
+
+    def request_started(self, route: str) -> None:
+        with self._lock:
+            self.in_flight[(("route", route),)] += 1
+
+    def request_finished(self, route: str) -> None:
+        with self._lock:
+            self.in_flight[(("route", route),)] -= 1
+
+    def observe_request(self, route: str, method: str, status: int, seconds: float,
+                        queries: int = 0, sql_seconds: float = 0.0) -> None:
+        labels = (("route", route), ("method", method))
+        with self._lock:
+            self.requests[labels + (("status", str(status)),)] += 1
+            self.request_latency.observe(labels, seconds)
+            self.request_queries[labels] += queries
+            self.request_sql_seconds[labels] += sql_seconds
+
+    def observe_query(self, statement: str, seconds: float, slow: bool = False) -> None:
+        with self._lock:
+            self.query_latency.observe((("statement", statement),), seconds)
+            if slow:
+                self.slow_queries += 1
+
+    def render(self, gauges: Optional[Dict[str, Tuple[str, float]]] = None,
+               counters: Optional[Dict[str, Tuple[str, float]]] = None) -> str:
+        """Prometheus text exposition (format 0.0.4). `gauges` and `counters` add
+        name -> (help, value) series kept elsewhere in the app."""
+        out = []
+        with self._lock:
+            counter(out, "attendance_http_requests_total", "HTTP requests by route, method and status.", self.requests)
+            gauge(out, "attendance_http_requests_in_flight", "Requests being handled right now.", self.in_flight)
+            histogram(out, "attendance_http_request_duration_seconds",
+                      "Time to produce the response (streamed bodies excluded).", self.request_latency)
+            counter(out, "attendance_sqlite_queries_total", "SQLite statements run per route.", self.request_queries)
+            counter(out, "attendance_sqlite_seconds_total", "Time spent in SQLite per route.", self.request_sql_seconds)
+            histogram(out, "attendance_sqlite_query_duration_seconds",
+                      "Duration of execute/executemany calls by statement type.", self.query_latency)
+            counter(out, "attendance_sqlite_slow_queries_total", "Statements over the slow-query threshold.",
+                    {(): self.slow_queries})
+        for name, (help_text, value) in (gauges or {}).items():
+            gauge(out, name, help_text, {(): value})
+        for name, (help_text, value) in (counters or {}).items():
+            counter(out, name, help_text, {(): value})
+        return "\n".join(out) + "\n"
+
+
+def format_labels(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def counter(out, name, help_text, values) -> None:
+    out.append(f"# HELP {name} {help_text}")
+    out.append(f"# TYPE {name} counter")
+    for labels, value in sorted(values.items()):
+        out.append(f"{name}{format_labels(labels)} {value}")
+
+
+def gauge(out, name, help_text, values) -> None:
+    out.append(f"# HELP {name} {help_text}")
+    out.append(f"# TYPE {name} gauge")
+    for labels, value in sorted(values.items()):
+        out.append(f"{name}{format_labels(labels)} {value}")
+
+
+def histogram(out, name, help_text, hist: Histogram) -> None:
+    out.append(f"# HELP {name} {help_text}")
+    out.append(f"# TYPE {name} histogram")
+    for labels, series in sorted(hist.series.items()):
+        cumulative = 0
+        for bound, count in zip(hist.buckets, series):
+            cumulative += count
+            out.append(f"{name}_bucket{format_labels(labels, (('le', repr(bound)),))} {cumulative}")
+        total = cumulative + series[-2]
+        out.append(f"{name}_bucket{format_labels(labels, (('le', '+Inf'),))} {total}")
+        out.append(f"{name}_sum{format_labels(labels)} {series[-1]}")
+        out.append(f"{name}_count{format_labels(labels)} {total}")
+
+
+def statement_type(sql: str) -> str:
+    """First keyword of a statement (SELECT, INSERT, ...), used as a low-cardinality label."""
+    head = sql.lstrip().split(None, 1)
+    return head[0].upper() if head else ""
+
+
+class InstrumentedConnection:
+    """Wraps a sqlite3 connection to count statements and time spent in SQLite.
+
+    Each execute/executemany call is observed in the per-statement histogram and checked
+    against slow_query_seconds (if set; slow ones go to on_slow(sql, seconds)). Rows
+    fetched later from the returned cursor add to the connection's total time as well,
+    since SQLite steps a SELECT lazily.
+    """
+
+    def __init__(self, conn, metrics: Metrics, slow_query_seconds: float = 0.0,
+                 on_slow: Optional[Callable[[str, float], None]] = None):
+        self.raw = conn
+        self.metrics = metrics
+        self.slow_query_seconds = slow_query_seconds
+        self.on_slow = on_slow
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def __enter__(self):
+        self.raw.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self.raw.__exit__(*exc)
+
+    def record(self, sql: str, seconds: float) -> None:
+        """Account for one execute/executemany call."""
+        self.queries += 1
+        self.seconds += seconds
+        slow = bool(self.slow_query_seconds) and seconds >= self.slow_query_seconds
+        self.metrics.observe_query(statement_type(sql), seconds, slow)
+        if slow and self.on_slow:
+            self.on_slow(sql, seconds)
+
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        cur = self.raw.execute(sql, params)
+        self.record(sql, time.perf_counter() - start)
+        return TimedCursor(cur, self)
+
+    def executemany(self, sql, seq_of_params):
+        start = time.perf_counter()
+        cur = self.raw.executemany(sql, seq_of_params)
+        self.record(sql, time.perf_counter() - start)
+        return TimedCursor(cur, self)
+
+
+class TimedCursor:
+    """Cursor proxy that adds fetch time to its connection's totals."""
+
+    def __init__(self, cursor, owner: InstrumentedConnection):
+        self.cursor = cursor
+        self.owner = owner
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def _timed(self, fetch, *args):
+        start = time.perf_counter()
+        result = fetch(*args)
+        self.owner.seconds += time.perf_counter() - start
+        return result
+
+    def fetchone(self):
+        return self._timed(self.cursor.fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed(self.cursor.fetchmany, size if size is not None else self.cursor.arraysize)
+
+    def fetchall(self):
+        return self._timed(self.cursor.fetchall)
+
+    def __iter__(self):
+        # Times each step, not the caller's loop body
+        cursor = self.cursor
+        while True:
+            start = time.perf_counter()
+            row = next(cursor, None)
+            self.owner.seconds += time.perf_counter() - start
+            if row is None:
+                return
+            yield row
@@ -0,0 +1,204 @@
+"""Ranked fuzzy matching of scanned device names ("John's iPhone") against roster names.
+
+NameIndex keeps, for the roster it was built from:
+
+  - the word tokens of every student's name and an inverted index token -> students;
+  - a trigram index over the distinct tokens (the vocabulary, far smaller than the
+    roster), so a misspelt or shortened token finds its near neighbours without
+    comparing against every name.
+
+A query drops possessives and device words ("iphone", "galaxy", model suffixes after
+them) and finds similar vocabulary tokens per query token (trigram Dice coefficient).
+A student's score is a soft Dice over tokens: query and name tokens are paired
+one-to-one, most similar first, and twice the summed similarity is divided by the total
+number of tokens. An exact full-name match scores 1.0; "john" against "John Smith"
+scores about 0.67. Only enough students to be sure of the top few are scored (see
+NameIndex._rank).
+"""
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+Student = Dict[str, Any]
+
+# Device and brand words removed from queries
+DEVICE_WORDS = frozenset("""
+    iphone ipad ipod macbook imac airpods watch phone smartphone laptop tablet android
+    galaxy pixel samsung huawei xiaomi redmi tecno infinix itel oppo vivo nokia oneplus
+    motorola moto lenovo dell hp asus acer realme honor sony buds headphones bluetooth
+""".split())
+# Model words that are also names ("Max"); removed only right after a device word
+MODEL_WORDS = frozenset("pro max mini plus ultra air lite note se fe".split())
+
+TOKEN_MIN_SIMILARITY = 0.5   # vocabulary tokens less similar than this are not candidates
+TOKEN_NEIGHBOURS = 20        # most similar vocabulary tokens kept per query token
+
+_WORD = re.compile(r"[^\W_]+")
+_POSSESSIVE = re.compile(r"['’]s\b")
+
+
+def name_tokens(value: Optional[str]) -> List[str]:
+    """Casefolded words of a name: possessive 's removed, words with digits ("S23") dropped."""
+    words = _WORD.findall(_POSSESSIVE.sub("", (value or "").casefold()))
+    return [w for w in words if w.isalpha()]
+
+
+def query_tokens(value: Optional[str]) -> List[str]:
+    """Tokens of a device name with device and model words removed (all tokens if that
+    would leave nothing)."""
+    tokens = name_tokens(value)
+    kept, after_device = [], False
+    for t in tokens:
+        if t in DEVICE_WORDS or (after_device and t in MODEL_WORDS):
+            after_device = True
+            continue
+        after_device = False
+        kept.append(t)
+    return kept or tokens
+
+
+def trigrams(token: str) -> FrozenSet[str]:
+    padded = f"  {token} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def match_score(similar: List[Dict[str, float]], tokens: Tuple[str, ...]) -> float:
+    """Soft Dice between query tokens (as their similarity maps) and a name's tokens:
+    pairs are matched one-to-one, most similar first."""
+    pairs = sorted(((sims[t], i, t) for i, sims in enumerate(similar) for t in tokens if t in sims), reverse=True)
+    used_q, used_t, total = set(), set(), 0.0
+    for sim, i, t in pairs:
+        if i not in used_q and t not in used_t:
+            used_q.add(i)
+            used_t.add(t)
+            total += sim
+    return 2 * total / (len(similar) + len(tokens))
+
+
+class NameIndex:
+    """Token and trigram indexes over roster names; see the module docstring.
+
+    Caches (neighbours and holders per query token, results per query) are dropped
+    whenever a student is added, so they always reflect the indexed roster.
+    """
+
+    def __init__(self, students=(), cache_size: int = 10000):
+        self.cache_size = cache_size
+        self.students: List[Student] = []
+        self.tokens: List[Tuple[str, ...]] = []
+        self.postings: Dict[str, List[int]] = defaultdict(list)  # sorted by name length at search time
+        self.grams: Dict[str, FrozenSet[str]] = {}
+        self.gram_postings: Dict[str, List[str]] = defaultdict(list)
+        self._sorted = True
+        self._neighbours: Dict[str, Dict[str, float]] = {}
+        self._holders: Dict[str, FrozenSet[int]] = {}
+        self._results: Dict[Tuple, List[Tuple[float, int]]] = {}
+        for s in students:
+            self.add(s)
+
+    def __len__(self) -> int:
+        return len(self.students)
+
+    def add(self, student: Student) -> None:
+        tokens = tuple(dict.fromkeys(name_tokens(student.get("Name"))))
+        n = len(self.students)
+        self.students.append(student)
+        self.tokens.append(tokens)
+        for t in tokens:
+            self.postings[t].append(n)
+            if t not in self.grams:
+                self.grams[t] = grams = trigrams(t)
+                for g in grams:
+                    self.gram_postings[g].append(t)
+        self._sorted = False
+        self._neighbours, self._holders, self._results = {}, {}, {}
+
+    def _remember(self, cache: dict, key, value):
+        if len(cache) >= self.cache_size:
+            cache.clear()
+        cache[key] = value
+        return value
+
+    def neighbours(self, token: str) -> Dict[str, float]:
+        """Vocabulary tokens similar to `token` -> Dice similarity, most similar first."""
+        cached = self._neighbours.get(token)
+        if cached is not None:
+            return cached
+        grams = trigrams(token)
+        shared = Counter()
+        for g in grams:
+            shared.update(self.gram_postings.get(g, ()))
+        scored = {}
+        for t, n in shared.items():
+            sim = 2 * n / (len(grams) + len(self.grams[t]))
+            if sim >= TOKEN_MIN_SIMILARITY:
+                scored[t] = sim
+        best = dict(sorted(scored.items(), key=lambda kv: (-kv[1], kv[0]))[:TOKEN_NEIGHBOURS])
+        return self._remember(self._neighbours, token, best)
+
+    def holders(self, token: str) -> FrozenSet[int]:
+        """Students holding any neighbour of the query token."""
+        cached = self._holders.get(token)
+        if cached is None:
+            cached = self._remember(self._holders, token, frozenset().union(
+                *(self.postings[t] for t in self.neighbours(token))))
+        return cached
+
+    def search(self, query: Optional[str], limit: int = 5, min_score: float = 0.0) -> List[Tuple[float, Student]]:
+        """Best-scoring students for a device or typed name, highest score first."""
+        q_tokens = tuple(dict.fromkeys(query_tokens(query)))
+        if not q_tokens:
+            return []
+        key = (q_tokens, limit, min_score)
+        ranked = self._results.get(key)
+        if ranked is None:
+            ranked = self._remember(self._results, key, self._rank(q_tokens, limit, min_score))
+        return [(score, self.students[c]) for score, c in ranked]
+
+    def _rank(self, q_tokens: Tuple[str, ...], limit: int, min_score: float) -> List[Tuple[float, int]]:
+        """Exact top `limit` without scoring every candidate.
+
+        Students holding a neighbour of every query token are found by intersecting
+        holder sets and scored. The rest can only miss at least one query token, which
+        caps their score at 2 * (s + best of the other tokens but one) / (query tokens +
+        name tokens). Posting lists are sorted by name length, so walking one in order
+        lowers that cap monotonically and the walk stops once the cap cannot beat the
+        current top `limit` (or min_score).
+        """
+        if not self._sorted:
+            for plist in self.postings.values():
+                plist.sort(key=lambda c: (len(self.tokens[c]), c))
+            self._sorted = True
+        similar = [self.neighbours(q) for q in q_tokens]
+        n_q = len(similar)
+        best = [max(sims.values(), default=0.0) for sims in similar]
+        scores: Dict[int, float] = {}
+
+        def floor() -> float:
+            if len(scores) < limit:
+                return min_score
+            return max(min_score, sorted(scores.values(), reverse=True)[limit - 1])
+
+        if n_q > 1:
+            full = frozenset.intersection(*(self.holders(q) for q in q_tokens))
+            for c in full:
+                scores[c] = match_score(similar, self.tokens[c])
+        else:
+            full = frozenset()
+
+        for i, sims in enumerate(similar):
+            others = best[:i] + best[i + 1:]
+            partial = sum(others) - (min(others) if others else 0.0)
+            threshold = floor()
+            for t, s in sims.items():
+                for c in self.postings[t]:
+                    cap = 2 * (s + partial) / (n_q + len(self.tokens[c]))
+                    if cap < threshold or (cap <= threshold and len(scores) >= limit):
+                        break
+                    if c in scores or c in full:
+                        continue
+                    scores[c] = match_score(similar, self.tokens[c])
+                    threshold = floor() if len(scores) >= limit else threshold
+
+        ranked = sorted(((round(v, 4), c) for c, v in scores.items() if v >= min_score), key=lambda r: (-r[0], r[1]))
+        return ranked[:limit]
@@ -0,0 +1,197 @@
+"""Presence intervals folded from repeated scanner sightings.
+
+Scanners re-report every device that keeps advertising. Instead of storing each
+sighting, PresenceTracker keeps, per (session, student), a short list of merged
+[first seen, last seen] intervals: a sighting within gap_seconds of the last interval
+extends it, a later one opens a new interval. Memory is O(students x intervals) and
+independent of the number of sightings.
+
+A background thread writes the intervals of changed keys to presence_intervals every
+flush_interval seconds and sets attendance.dwell_seconds (the summed interval length)
+on the student's row. Each flush merges with what is already stored, so several worker
+processes tracking the same session converge on one set of intervals. A session's
+intervals are flushed one last time, in the closing transaction, when it ends.
+"""
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger("attendance.presence")
+
+Key = Tuple[int, str]          # (session id, student ID)
+Interval = List[float]         # [start, end] in epoch seconds
+
+FLUSH_MAX_KEYS = 2000          # keys written per flush transaction
+
+
+def to_epoch(ts: str) -> float:
+    return datetime.fromisoformat(ts).timestamp()
+
+
+def to_ts(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds).isoformat(timespec="seconds")
+
+
+def merge_intervals(intervals: List[Interval], gap_seconds: float) -> List[Interval]:
+    """Sort and merge intervals that overlap or are at most gap_seconds apart."""
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start - merged[-1][1] <= gap_seconds:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def dwell_seconds(intervals: List[Interval]) -> int:
+    return int(sum(end - start for start, end in intervals))
+
+
+class PresenceTracker:
+    """Per-worker map of (session, student) -> merged presence intervals.
+
+    observe() only touches memory. flush() and flush_session() write to the database;
+    with flush_interval > 0 a daemon thread calls flush() on its own connection.
+    """
+
+    def __init__(self, connect: Callable, gap_seconds: float = 300.0, flush_interval: float = 15.0):
+        self.connect = connect
+        self.gap_seconds = gap_seconds
+        self.flush_interval = flush_interval
+        self.flushes = 0
+        self._lock = threading.Lock()
+        self._intervals: Dict[Key, List[Interval]] = {}
+        self._dirty: set = set()
+        self._stop = threading.Event()
+        self._con = None
+        self._thread: Optional[threading.Thread] = None
+        if flush_interval > 0:
+            self._thread = threading.Thread(target=self._run, name="presence-flush", daemon=True)
+            self._thread.start()
+
+    @property
+    def tracked(self) -> int:
+        return len(self._intervals)
+
+    def observe(self, session_id: int, student_id: str, ts: str) -> int:
+        """Fold one sighting in; returns the student's dwell in the session so far (seconds)."""
+        t = to_epoch(ts)
+        key = (session_id, student_id)
+        with self._lock:
+            intervals = self._intervals.setdefault(key, [])
+            if intervals and 0 <= t - intervals[-1][1] <= self.gap_seconds:
+                intervals[-1][1] = t
+            elif intervals and t <= intervals[-1][1]:
+                # Out of order (batch uploads): re-merge
+                intervals.append([t, t])
+                intervals[:] = merge_intervals(intervals, self.gap_seconds)
+            else:
+                intervals.append([t, t])
+            self._dirty.add(key)
+            return dwell_seconds(intervals)
+
+    def first_seen(self, session_id: int, student_id: str) -> Optional[str]:
+        with self._lock:
+            intervals = self._intervals.get((session_id, student_id))
+            return to_ts(intervals[0][0]) if intervals else None
+
+    def flush(self, con=None) -> int:
+        """Write changed keys (all sessions). Opens its own transaction; returns keys written."""
+        with self._lock:
+            keys = list(self._dirty)
+        written = 0
+        for i in range(0, len(keys), FLUSH_MAX_KEYS):
+            chunk = keys[i:i + FLUSH_MAX_KEYS]
+            con = con or self._connection()
+            with con:
+                con.execute("BEGIN IMMEDIATE")
+                written += self._write(con, chunk)
+                con.execute(
+                    "INSERT INTO meta (key, value) VALUES ('presence', 1) "
+                    "ON CONFLICT(key) DO UPDATE SET value = value + 1"
+                )
+        if written:
+            self.flushes += 1
+        self._prune(con or self._connection())
+        return written
+
+    def flush_session(self, con, session_id: int) -> int:
+        """Write and forget a closing session's intervals, in the caller's transaction."""
+        with self._lock:
+            keys = [k for k in self._intervals if k[0] == session_id]
+        written = self._write(con, keys)
+        with self._lock:
+            for key in keys:
+                self._intervals.pop(key, None)
+                self._dirty.discard(key)
+        return written
+
+    def close(self) -> None:
+        """Stop the flush thread after a last flush."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            log.error(f"Final presence flush failed: {e}")
+        if self._con is not None:
+            self._con.close()
+            self._con = None
+
+    def _connection(self):
+        if self._con is None:
+            self._con = self.connect()
+        return self._con
+
+    def _write(self, con, keys: List[Key]) -> int:
+        """Merge memory with the stored intervals of each key and store the result."""
+        for key in keys:
+            with self._lock:
+                self._dirty.discard(key)
+                mine = [list(iv) for iv in self._intervals.get(key, ())]
+            stored = [[to_epoch(s), to_epoch(e)] for s, e in con.execute(
+                "SELECT start_ts, end_ts FROM presence_intervals WHERE session_id = ? AND student_id = ?", key
+            )]
+            merged = merge_intervals(stored + mine, self.gap_seconds)
+            con.execute("DELETE FROM presence_intervals WHERE session_id = ? AND student_id = ?", key)
+            con.executemany(
+                "INSERT INTO presence_intervals (session_id, student_id, start_ts, end_ts) VALUES (?, ?, ?, ?)",
+                [(key[0], key[1], to_ts(s), to_ts(e)) for s, e in merged],
+            )
+            con.execute(
+                "UPDATE attendance SET dwell_seconds = ? WHERE session_id = ? AND student_id = ?",
+                (dwell_seconds(merged), key[0], key[1]),
+            )
+            with self._lock:
+                if key in self._intervals:
+                    # Keep sightings that arrived meanwhile, plus what other workers stored
+                    self._intervals[key] = merge_intervals(self._intervals[key] + merged, self.gap_seconds)
+        return len(keys)
+
+    def _prune(self, con) -> None:
+        """Forget flushed keys of sessions that have ended (e.g. closed by another worker)."""
+        with self._lock:
+            session_ids = sorted({k[0] for k in self._intervals})
+        if not session_ids:
+            return
+        ended = {r[0] for r in con.execute(
+            f"SELECT id FROM sessions WHERE end_ts IS NOT NULL AND id IN ({','.join('?' * len(session_ids))})",
+            session_ids,
+        )}
+        if ended:
+            with self._lock:
+                for key in [k for k in self._intervals if k[0] in ended and k not in self._dirty]:
+                    del self._intervals[key]
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                log.error(f"Presence flush failed, retrying next interval: {e}")
+                with self._lock:
+                    self._dirty.update(self._intervals)
@@ -0,0 +1,145 @@
+"""Read-only copy of the attendance database for reports and exports (reporting mode).
+
+Reports and exports scan many rows; on the live database a semester export shares the
+disk, page cache and WAL with the scan bursts at the start of a lecture (a long read
+also holds back WAL checkpoints, so the log grows while it runs). With
+REPORT_SNAPSHOT_SECONDS set, ReportSnapshot keeps a copy next to the database instead:
+
+  - a daemon thread copies the live database with the SQLite online backup API into a
+    temporary file, switches it to rollback journaling and renames it over the copy,
+    so readers always see a whole, consistent snapshot;
+  - it refreshes when the copy is older than the interval, or sooner once a session has
+    closed (or a closed one was refrozen by a late sync) since the copy was made, so
+    reports on finished lectures are current. Session starts do not trigger a copy:
+    they come with a burst of scans;
+  - readers open the copy read-only and immutable: no locks, no journal, and a refresh
+    never waits for them (open connections keep the file they opened).
+
+The copy's mtime is set to the moment the backup started, which is how old its data
+can be at most; every worker process reads the same file and the same timestamp, and a
+worker skips a refresh another one has just made.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+log = logging.getLogger("attendance.reports")
+
+POLL_SECONDS = 2.0   # how often the refresh thread compares versions
+
+
+def closed_sessions_mark(con) -> tuple:
+    """Changes whenever a session is frozen on close or refrozen (see snapshots.py)."""
+    return tuple(con.execute(
+        "SELECT (SELECT COUNT(*) FROM session_snapshots), "
+        "(SELECT value FROM meta WHERE key = 'snapshot')"
+    ).fetchone())
+
+
+class ReportSnapshot:
+    """The reporting copy at `path` of the database `connect()` opens, refreshed every
+    `interval` seconds (and after sessions close) by a daemon thread."""
+
+    def __init__(self, connect: Callable, path: str, interval: float, poll_seconds: float = POLL_SECONDS):
+        self.live_connect = connect
+        self.path = path
+        self.interval = interval
+        self.poll_seconds = poll_seconds
+        self.refreshes = 0
+        self.last_refresh_seconds: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._live: Optional[sqlite3.Connection] = None
+        self._thread: Optional[threading.Thread] = None
+        if interval > 0:
+            self._thread = threading.Thread(target=self._run, name="report-snapshot", daemon=True)
+            self._thread.start()
+
+    def as_of(self) -> Optional[float]:
+        """Epoch seconds the copy's data dates from; None before the first refresh."""
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def connect(self) -> Optional[sqlite3.Connection]:
+        """Read-only connection to the copy, or None if there is none yet."""
+        if self.as_of() is None:
+            return None
+        con = sqlite3.connect(f"file:{self.path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+        con.row_factory = sqlite3.Row
+        return con
+
+    def refresh(self) -> float:
+        """Copy the live database now; returns the seconds the copy took."""
+        with self._lock:
+            started = time.time()
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            dest = sqlite3.connect(tmp)
+            try:
+                # One step (pages=-1): the whole copy is read in a single read
+                # transaction, which WAL lets run beside the writers. Stepped
+                # copies restart whenever another connection writes.
+                self._connection().backup(dest)
+                dest.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                dest.close()
+            os.utime(tmp, (started, started))
+            os.replace(tmp, self.path)
+            self.refreshes += 1
+            self.last_refresh_seconds = time.time() - started
+            return self.last_refresh_seconds
+
+    def due(self) -> bool:
+        """Whether the copy is missing, older than the interval, or behind on closed sessions."""
+        as_of = self.as_of()
+        if as_of is None or time.time() - as_of >= self.interval:
+            return True
+        copy = self.connect()
+        if copy is None:
+            return True
+        try:
+            with self._lock:
+                live_mark = closed_sessions_mark(self._connection())
+            return live_mark != closed_sessions_mark(copy)
+        finally:
+            copy.close()
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        if self._live is not None:
+            self._live.close()
+            self._live = None
+
+    def status(self) -> dict:
+        as_of = self.as_of()
+        return {
+            "interval_seconds": self.interval,
+            "as_of": datetime.fromtimestamp(as_of).isoformat(timespec="seconds") if as_of else None,
+            "age_seconds": round(time.time() - as_of, 1) if as_of else None,
+            "refreshes": self.refreshes,
+            "last_refresh_seconds": round(self.last_refresh_seconds, 3) if self.last_refresh_seconds else None,
+        }
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._live is None:
+            self._live = self.live_connect()
+        return self._live
+
+    def _run(self) -> None:
+        while True:
+            try:
+                if self.due():
+                    seconds = self.refresh()
+                    log.debug(f"Reporting snapshot refreshed in {seconds * 1000:.0f} ms")
+            except (sqlite3.Error, OSError) as e:
+                log.error(f"Reporting snapshot refresh failed, retrying: {e}")
+            if self._stop.wait(self.poll_seconds):
+                return
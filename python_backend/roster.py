@@ -0,0 +1,171 @@
+"""In-memory roster with O(1) lookups by student ID, MAC/device id and name."""
+import re
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from name_match import NameIndex
+
+Student = Dict[str, Any]  # {"Name": ..., "Student ID": ..., "MAC": ...}
+
+_MAC_SEPARATORS = re.compile(r"[\s:\-.]")
+_HEX12 = re.compile(r"^[0-9A-Fa-f]{12}$")
+
+
+def normalize_mac(value: Optional[str]) -> str:
+    """Canonical form of a MAC address or Web Bluetooth device id.
+
+    Hardware addresses in any common notation (AA:BB:CC:DD:EE:FF, aa-bb-cc-dd-ee-ff,
+    aabb.ccdd.eeff, AABBCCDDEEFF) become upper-case colon-separated. Anything else is
+    treated as an opaque Web Bluetooth device id, which is case-sensitive base64, so only
+    surrounding whitespace is removed.
+    """
+    raw = (value or "").strip()
+    if not raw:
+        return ""
+    compact = _MAC_SEPARATORS.sub("", raw)
+    if _HEX12.match(compact):
+        compact = compact.upper()
+        return ":".join(compact[i:i + 2] for i in range(0, 12, 2))
+    return raw
+
+
+def normalize_name(value: Optional[str]) -> str:
+    """Casefolded name with runs of whitespace collapsed."""
+    return " ".join((value or "").split()).casefold()
+
+
+class RosterSnapshot:
+    """One roster version: the ordered students and their ID, MAC and name maps, built
+    once and never changed afterwards. The fuzzy name index is built on first use."""
+
+    __slots__ = ("students", "by_id", "by_mac", "by_name", "version", "_names", "_names_lock")
+
+    def __init__(self, students: Iterable[Student] = (), version: Optional[int] = None):
+        self.students: Tuple[Student, ...] = tuple(students)
+        self.by_id: Dict[str, Student] = {}
+        self.by_mac: Dict[str, Student] = {}
+        self.by_name: Dict[str, Student] = {}
+        self.version = version
+        self._names: Optional[NameIndex] = None
+        self._names_lock = threading.Lock()
+        for student in self.students:
+            self.by_id.setdefault(student["Student ID"], student)
+            if mac := normalize_mac(student.get("MAC")):
+                self.by_mac.setdefault(mac, student)
+            if name := normalize_name(student.get("Name")):
+                self.by_name.setdefault(name, student)
+
+    @property
+    def names(self) -> NameIndex:
+        names = self._names
+        if names is None:
+            with self._names_lock:
+                if self._names is None:
+                    self._names = NameIndex(self.students)
+                names = self._names
+        return names
+
+    def search_name(self, name: Optional[str], limit: int = 5,
+                    min_score: float = 0.0) -> List[Tuple[float, Student]]:
+        names = self.names
+        with self._names_lock:
+            return names.search(name, limit=limit, min_score=min_score)
+
+
+class RosterIndex:
+    """The current RosterSnapshot behind one attribute, with lookups by ID, normalized
+    MAC and name.
+
+    Iterates, indexes and sizes like the plain list it replaces. When several students
+    share a MAC or name, lookups return the first one loaded (the old linear-scan result).
+    `version` records which roster version (meta counter) the contents reflect.
+    rebuild() and add() build a new snapshot and swap it in with a single assignment, so
+    a reader sees the students, maps and version of one roster, never a mix. Code that
+    reads several of them together takes `snapshot` once.
+    The fuzzy name index (name_match.NameIndex) is built on the first search_name() of
+    each snapshot.
+    """
+
+    def __init__(self, students: Iterable[Student] = (), version: Optional[int] = None):
+        self._snapshot = RosterSnapshot(students, version)
+
+    @property
+    def snapshot(self) -> RosterSnapshot:
+        return self._snapshot
+
+    @property
+    def students(self) -> Tuple[Student, ...]:
+        return self._snapshot.students
+
+    @property
+    def by_id(self) -> Dict[str, Student]:
+        return self._snapshot.by_id
+
+    @property
+    def by_mac(self) -> Dict[str, Student]:
+        return self._snapshot.by_mac
+
+    @property
+    def by_name(self) -> Dict[str, Student]:
+        return self._snapshot.by_name
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._snapshot.version
+
+    def __len__(self) -> int:
+        return len(self._snapshot.students)
+
+    def __iter__(self) -> Iterator[Student]:
+        return iter(self._snapshot.students)
+
+    def __getitem__(self, item):
+        return self._snapshot.students[item]
+
+    def __bool__(self) -> bool:
+        return bool(self._snapshot.students)
+
+    def clear(self) -> None:
+        self._snapshot = RosterSnapshot()
+
+    def rebuild(self, students: Iterable[Student], version: Optional[int] = None) -> None:
+        """Replace the whole roster; it reflects roster `version`."""
+        self._snapshot = RosterSnapshot(students, version)
+
+    def add(self, student: Student, version: Optional[int] = None) -> None:
+        """Append one student (the roster is then at `version`). Copies the maps, which is
+        cheap next to a reload; the fuzzy index is rebuilt on the next search."""
+        current = self._snapshot
+        self._snapshot = RosterSnapshot(current.students + (student,), version)
+
+    def get_by_id(self, student_id: Optional[str]) -> Optional[Student]:
+        return self._snapshot.by_id.get((student_id or "").strip())
+
+    def get_by_mac(self, mac: Optional[str]) -> Optional[Student]:
+        key = normalize_mac(mac)
+        return self._snapshot.by_mac.get(key) if key else None
+
+    def get_by_name(self, name: Optional[str]) -> Optional[Student]:
+        key = normalize_name(name)
+        return self._snapshot.by_name.get(key) if key else None
+
+    def match(self, mac: Optional[str] = None, name: Optional[str] = None,
+              student_id: Optional[str] = None) -> Optional[Student]:
+        """Resolve a scan or manual entry: student ID first, then MAC/device id, then name."""
+        snap = self._snapshot  # one roster for all three lookups
+        if student_id and (student := snap.by_id.get(student_id.strip())):
+            return student
+        if mac and (key := normalize_mac(mac)) and (student := snap.by_mac.get(key)):
+            return student
+        if name and (key := normalize_name(name)):
+            return snap.by_name.get(key)
+        return None
+
+    @property
+    def names(self) -> NameIndex:
+        return self._snapshot.names
+
+    def search_name(self, name: Optional[str], limit: int = 5,
+                    min_score: float = 0.0) -> List[Tuple[float, Student]]:
+        """Ranked fuzzy matches for a device or typed name ("John's iPhone")."""
+        return self._snapshot.search_name(name, limit=limit, min_score=min_score)
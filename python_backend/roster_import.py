@@ -0,0 +1,151 @@
+"""Class-list CSV parsing and diff-based roster imports.
+
+The header layout (Name + Student ID, first/last name + Student ID, or loose
+alternatives) is worked out once per file, so each row costs a few dict lookups.
+Rows are read one at a time from any text stream, and an import writes only the rows
+that differ from the students table.
+"""
+import csv
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+import schema
+
+Row = Dict[str, str]
+Student = Dict[str, str]  # {"Name": ..., "Student ID": ..., "MAC": ...}
+
+IMPORT_CHUNK_SIZE = 1000   # rows per executemany() while applying an import
+REPORT_SAMPLE_SIZE = 20    # student IDs listed per change type in an import report
+
+
+class EmptyImportError(ValueError):
+    """A replacing import read no students (empty file or unrecognized header layout)."""
+
+
+def row_reader(fieldnames: Iterable[str]) -> Callable[[Row], Tuple[str, str, str]]:
+    """Detect the header layout once and return row -> (name, student_id, mac)."""
+    columns = {}
+    for fn in fieldnames or ():
+        if fn:
+            columns.setdefault(fn.strip().lower(), fn)
+
+    def column(*keys: str) -> Optional[str]:
+        for k in keys:
+            if k in columns:
+                return columns[k]
+        return None
+
+    sid_keys = ("student id", "student_id", "studentid")
+    has_name = "name" in columns
+    has_student_id = column(*sid_keys) is not None
+    has_first_last = column("first_name", "first name") and column("last_name", "last name")
+
+    first_col = last_col = None
+    if has_name and has_student_id:
+        name_col, sid_col = column("name"), column(*sid_keys)
+    elif has_first_last and has_student_id:
+        name_col, sid_col = None, column(*sid_keys)
+        first_col, last_col = column("first_name", "first name"), column("last_name", "last name")
+    else:
+        # Fallback: try common alternatives
+        name_col = column("name", "full_name", "full name")
+        sid_col = column("student_id", "student id", "id")
+    mac_col = column("mac", "mac address", "mac_address") if any("mac" in k for k in columns) else None
+
+    def value(row: Row, col: Optional[str]) -> str:
+        return (row.get(col) or "").strip() if col else ""
+
+    def read(row: Row) -> Tuple[str, str, str]:
+        if name_col or not first_col:
+            name = value(row, name_col)
+        else:
+            name = (value(row, first_col) + " " + value(row, last_col)).strip()
+        return name, value(row, sid_col), value(row, mac_col)
+
+    return read
+
+
+def iter_class_list(f: TextIO) -> Iterator[Student]:
+    """Yield students from a class-list CSV stream, skipping rows without a name or ID."""
+    reader = csv.DictReader(f)
+    read = row_reader(reader.fieldnames or [])
+    for row in reader:
+        name, sid, mac = read(row)
+        if name and sid:
+            yield {"Name": name, "Student ID": sid, "MAC": mac}
+
+
+def import_roster(con, students: Iterable[Student], delete_missing: bool = True,
+                  dry_run: bool = False, chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """Diff an uploaded roster against the students table and apply only the changes.
+
+    Runs as one write transaction: new IDs are inserted, IDs whose name or MAC changed
+    are upserted, and (with delete_missing) IDs absent from the upload are deleted.
+    Writes go out in chunks as the upload is read, so memory holds the current
+    roster's keys plus one chunk. The "roster" version is bumped only when something
+    changed. With dry_run the changes are counted and rolled back. With delete_missing,
+    an upload without a single student raises EmptyImportError and changes nothing,
+    rather than deleting the whole roster.
+    """
+    report = {
+        "inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0, "duplicates": 0,
+        "samples": {"inserted": [], "updated": [], "deleted": []},
+        "dry_run": dry_run, "version": None,
+    }
+
+    def note(kind: str, sid: str) -> None:
+        report[kind] += 1
+        if len(report["samples"][kind]) < REPORT_SAMPLE_SIZE:
+            report["samples"][kind].append(sid)
+
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        current = {r[0]: (r[1], r[2]) for r in con.execute("SELECT student_id, name, mac FROM students")}
+        seen = set()
+        pending: List[Tuple[str, str, str]] = []
+
+        def flush() -> None:
+            if pending and not dry_run:
+                con.executemany(
+                    "INSERT INTO students (student_id, name, mac) VALUES (?, ?, ?) "
+                    "ON CONFLICT(student_id) DO UPDATE SET name = excluded.name, mac = excluded.mac",
+                    pending,
+                )
+            pending.clear()
+
+        for s in students:
+            sid, name, mac = s["Student ID"], s["Name"], s.get("MAC") or ""
+            if sid in seen:
+                # First row wins, as in the in-memory index
+                report["duplicates"] += 1
+                continue
+            seen.add(sid)
+            existing = current.get(sid)
+            if existing == (name, mac):
+                report["unchanged"] += 1
+                continue
+            note("inserted" if existing is None else "updated", sid)
+            pending.append((sid, name, mac))
+            if len(pending) >= chunk_size:
+                flush()
+        flush()
+
+        if delete_missing and not seen and current:
+            raise EmptyImportError("No students found in the upload")
+        if delete_missing:
+            missing = [(sid,) for sid in current if sid not in seen]
+            for sid, in missing:
+                note("deleted", sid)
+            if not dry_run:
+                con.executemany("DELETE FROM students WHERE student_id = ?", missing)
+
+        changed = report["inserted"] or report["updated"] or report["deleted"]
+        if dry_run:
+            con.rollback()
+            report["version"] = schema.read_version(con, "roster")
+            return report
+        report["version"] = schema.bump_version(con, "roster") if changed else schema.read_version(con, "roster")
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    return report
@@ -0,0 +1,243 @@
+"""Spool scanner sightings to a local file and sync them to the server when it is reachable.
+
+For scanner laptops in halls without connectivity. Every sighting gets an event id, a
+per-scanner sequence number and its capture time when it is spooled; `sync` asks the
+server for the scanner's high-watermark and uploads everything after it through
+POST /api/sync in chunks. The spool's own watermark (state file) is the last seq the
+server has answered; a sync sends everything after it and then drops what was answered,
+so a sync that breaks off resumes where it stopped. The server applies each event id
+once, so resending an event is a no-op.
+
+    python python_backend/scan_spool.py add --mac AA:BB:CC:DD:EE:FF [--room "Hall B"]
+    some-scanner | python python_backend/scan_spool.py capture --room "Hall B"   # one MAC[,name] per line
+    python python_backend/scan_spool.py sync --server http://localhost:5000 [--batch 2000]
+    python python_backend/scan_spool.py status
+
+The spool is a JSON-lines file (--spool, default $ATTENDANCE_SPOOL or ./scan-spool.jsonl)
+with its state (scanner id, next seq, last watermark) in <spool>.state. Events the
+server has taken are dropped from the spool after a sync. A capture and a sync can run
+at the same time: appends, the compaction after a sync and state updates take turns on
+an exclusive lock on <spool>.lock (flock; msvcrt on Windows).
+"""
+import argparse
+import contextlib
+import json
+import os
+import socket
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Iterator, List, Optional
+from urllib import error, request
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_BATCH = 2000      # events per POST /api/sync
+RETRIES = 3               # attempts per request before giving up
+
+
+class Spool:
+    """Append-only event file plus a small JSON state file next to it."""
+
+    def __init__(self, path: str, scanner: Optional[str] = None):
+        self.path = path
+        self.state_path = path + ".state"
+        self.lock_path = path + ".lock"
+        self.state = {"scanner": scanner or socket.gethostname(), "next_seq": 1, "watermark": 0}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, encoding="utf-8") as f:
+                self.state.update(json.load(f))
+        else:
+            # State lost: keep numbering after the events still in the spool
+            self.state["next_seq"] = max((e["seq"] for e in self.events()), default=0) + 1
+        if scanner:
+            self.state["scanner"] = scanner
+
+    def reload_counters(self) -> None:
+        """Re-read next_seq and watermark, which other processes on the spool advance.
+        Call with the lock held."""
+        if os.path.exists(self.state_path):
+            with open(self.state_path, encoding="utf-8") as f:
+                saved = json.load(f)
+            self.state.update({k: saved[k] for k in ("next_seq", "watermark") if k in saved})
+
+    @contextlib.contextmanager
+    def locked(self):
+        """Hold the spool's exclusive lock (not reentrant)."""
+        with open(self.lock_path, "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @property
+    def scanner(self) -> str:
+        return self.state["scanner"]
+
+    def save_state(self) -> None:
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.state_path)
+
+    def append(self, sightings: List[dict], room: str = "") -> int:
+        """Spool sightings ({"mac_address", "name"}), stamped with the current time."""
+        with self.locked():
+            self.reload_counters()
+            seq = self.state["next_seq"]
+            with open(self.path, "a", encoding="utf-8") as f:
+                for s in sightings:
+                    event = {
+                        "event_id": str(uuid.uuid4()),
+                        "seq": seq,
+                        "captured_at": s.get("captured_at") or datetime.now().isoformat(timespec="seconds"),
+                        "room": room,
+                        **{k: v for k, v in s.items() if k in ("mac_address", "name") and v},
+                    }
+                    f.write(json.dumps(event) + "\n")
+                    seq += 1
+                f.flush()
+                os.fsync(f.fileno())
+            self.state["next_seq"] = seq
+            self.save_state()
+        return len(sightings)
+
+    def set_watermark(self, watermark: int) -> None:
+        with self.locked():
+            self.reload_counters()
+            self.state["watermark"] = watermark
+            self.save_state()
+
+    def events(self, after: int = 0) -> Iterator[dict]:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    event = json.loads(line)
+                    if event["seq"] > after:
+                        yield event
+
+    def compact(self, watermark: int) -> None:
+        """Drop events at or below the server's watermark. Runs under the spool lock, so
+        a capture running meanwhile waits to append until the new file is in place."""
+        with self.locked():
+            if not os.path.exists(self.path):
+                return
+            tmp = self.path + ".tmp"
+            with open(self.path, "rb") as src, open(tmp, "wb") as dst:
+                for line in src:
+                    if line.strip() and json.loads(line)["seq"] > watermark:
+                        dst.write(line if line.endswith(b"\n") else line + b"\n")
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.replace(tmp, self.path)
+
+
+def call(method: str, url: str, body: Optional[dict] = None, timeout: float = 60) -> dict:
+    """JSON request with retries on connection errors and 5xx replies."""
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    for attempt in range(1, RETRIES + 1):
+        req = request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+        try:
+            with request.urlopen(req, timeout=timeout) as resp:
+                return json.loads(resp.read().decode("utf-8"))
+        except error.HTTPError as e:
+            if e.code < 500 or attempt == RETRIES:
+                raise
+        except error.URLError:
+            if attempt == RETRIES:
+                raise
+        time.sleep(2 ** attempt)
+
+
+def sync(spool: Spool, server: str, batch: int = DEFAULT_BATCH) -> dict:
+    """Upload every event after the spool's watermark, then drop the events the server
+    answered. Returns summed counts.
+
+    The server's watermark for the scanner id is not used to skip or drop events: a
+    spool that lost its state file, or one in another directory, shares the id but not
+    the numbering, and its events would be deleted unsent."""
+    base = server.rstrip("/")
+    acked = spool.state["watermark"]
+    totals = {"requests": 0, "sent": 0}
+    pending = list(spool.events(after=acked))
+    for i in range(0, len(pending), batch):
+        chunk = pending[i:i + batch]
+        reply = call("POST", f"{base}/api/sync", {"scanner": spool.scanner, "events": chunk})
+        if len(reply.get("results") or ()) != len(chunk):
+            raise OSError(f"server answered {len(reply.get('results') or ())} of {len(chunk)} events")
+        totals["requests"] += 1
+        totals["sent"] += len(chunk)
+        for status, n in reply["counts"].items():
+            totals[status] = totals.get(status, 0) + n
+        acked = chunk[-1]["seq"]
+        spool.set_watermark(acked)
+    spool.compact(acked)
+    totals["watermark"] = acked
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spool", default=os.environ.get("ATTENDANCE_SPOOL", "scan-spool.jsonl"))
+    parser.add_argument("--scanner", help="scanner id (default: saved in the state file, else the host name)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    add = sub.add_parser("add", help="spool one sighting")
+    add.add_argument("--mac", default="")
+    add.add_argument("--name", default="")
+    add.add_argument("--room", default="")
+    capture = sub.add_parser("capture", help="spool MAC[,name] lines from stdin")
+    capture.add_argument("--room", default="")
+    push = sub.add_parser("sync", help="upload spooled events")
+    push.add_argument("--server", default=os.environ.get("ATTENDANCE_SERVER", "http://localhost:5000"))
+    push.add_argument("--batch", type=int, default=DEFAULT_BATCH, help="events per request")
+    sub.add_parser("status", help="show spooled events and the last watermark")
+    args = parser.parse_args(argv)
+
+    spool = Spool(args.spool, args.scanner)
+    if args.command == "add":
+        if not (args.mac or args.name):
+            parser.error("add needs --mac or --name")
+        spool.append([{"mac_address": args.mac, "name": args.name}], args.room)
+        print(f"[INFO] Spooled 1 event for {spool.scanner}")
+    elif args.command == "capture":
+        sightings = []
+        for line in sys.stdin:
+            mac, _, name = line.strip().partition(",")
+            if mac or name:
+                sightings.append({"mac_address": mac.strip(), "name": name.strip()})
+        spool.append(sightings, args.room)
+        print(f"[INFO] Spooled {len(sightings)} events for {spool.scanner}")
+    elif args.command == "sync":
+        try:
+            totals = sync(spool, args.server, args.batch)
+        except (error.URLError, OSError) as e:
+            print(f"[ERROR] Sync failed, events stay spooled: {e}")
+            return 1
+        print(f"[INFO] Synced {totals['sent']} events in {totals['requests']} requests "
+              f"(watermark {totals['watermark']}): " + json.dumps({k: v for k, v in totals.items()
+                                                                   if k not in ("sent", "requests", "watermark")}))
+    else:
+        pending = sum(1 for _ in spool.events(after=spool.state["watermark"]))
+        print(f"[INFO] Scanner {spool.scanner}: {pending} events spooled, next seq "
+              f"{spool.state['next_seq']}, last watermark {spool.state['watermark']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,415 @@
+"""Attendance database schema and in-place migrations.
+
+Run directly to migrate existing database files in place:
+
+    python python_backend/schema.py [path/to/attendance.db ...]
+
+With no arguments it migrates the main database and the stray copy under
+python_backend/python_backend/data/ if it exists.
+
+Workers call ensure_schema() at startup instead: it compares PRAGMA user_version with
+SCHEMA_VERSION and only migrates when the file is behind. Bump SCHEMA_VERSION whenever
+migrate() changes.
+"""
+import os
+import sqlite3
+import sys
+from typing import Optional
+
+import snapshots
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+KNOWN_DB_PATHS = [
+    os.path.join(BASE_DIR, "data", "attendance.db"),
+    os.path.join(BASE_DIR, "python_backend", "data", "attendance.db"),  # stray copy from running with a relative path
+]
+
+SCHEMA_VERSION = 7  # stored in PRAGMA user_version once migrate() has run
+
+
+def column_exists(con, table, column):
+    rows = con.execute(f"PRAGMA table_info({table})").fetchall()
+    return any(r[1] == column for r in rows)
+
+
+def table_exists(con, name):
+    return con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def index_exists(con, name):
+    return con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def read_version(con, key: str) -> int:
+    """Current value of a meta version counter (0 if never bumped)."""
+    row = con.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else 0
+
+
+def bump_version(con, key: str) -> int:
+    """Increment a meta version counter inside the caller's transaction and return it."""
+    con.execute(
+        "INSERT INTO meta (key, value) VALUES (?, 1) ON CONFLICT(key) DO UPDATE SET value = value + 1",
+        (key,),
+    )
+    return read_version(con, key)
+
+
+def ensure_schema(con: sqlite3.Connection, force: bool = False) -> Optional[dict]:
+    """Migrate once per schema version, even with several workers starting together.
+
+    Up-to-date files cost one PRAGMA read. Otherwise the migration runs in one
+    transaction under the database write lock (BEGIN IMMEDIATE); workers that were
+    waiting on the lock re-check user_version and skip. Returns the migration report,
+    or None if nothing ran. force=True migrates regardless of user_version.
+    """
+    if not force and user_version(con) >= SCHEMA_VERSION:
+        return None
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        if not force and user_version(con) >= SCHEMA_VERSION:
+            con.rollback()
+            return None
+        report = migrate_in_transaction(con)
+        con.execute(f"PRAGMA user_version = {int(SCHEMA_VERSION)}")
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    return report
+
+
+def user_version(con) -> int:
+    return con.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(con: sqlite3.Connection) -> dict:
+    """Create or upgrade the schema on an open connection. Safe to run repeatedly.
+
+    Returns a small report: {"backfilled_days": n, "quarantined_duplicates": n}.
+    """
+    return ensure_schema(con, force=True)
+
+
+def migrate_in_transaction(con) -> dict:
+    """The migration steps; the caller owns the transaction."""
+    report = {"backfilled_days": 0, "quarantined_duplicates": 0, "frozen_sessions": 0}
+    # sessions: track lectures; room is the scanner's room ('' = the default room)
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sessions (
+            id       INTEGER PRIMARY KEY AUTOINCREMENT,
+            name     TEXT,
+            start_ts TEXT NOT NULL,
+            end_ts   TEXT,
+            room     TEXT NOT NULL DEFAULT ''
+        )
+        """
+    )
+    if not column_exists(con, "sessions", "room"):
+        con.execute("ALTER TABLE sessions ADD COLUMN room TEXT NOT NULL DEFAULT ''")
+    # At most one open session per room. Older databases could only have one open
+    # session in total; close any stray extras at the start of the next one first.
+    if not index_exists(con, "ux_sessions_open_room"):
+        con.execute(
+            """
+            UPDATE sessions SET end_ts = COALESCE(
+                (SELECT MIN(later.start_ts) FROM sessions later WHERE later.room = sessions.room AND later.id > sessions.id),
+                start_ts
+            )
+            WHERE end_ts IS NULL
+              AND id NOT IN (SELECT MAX(id) FROM sessions WHERE end_ts IS NULL GROUP BY room)
+            """
+        )
+    con.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_sessions_open_room ON sessions(room) WHERE end_ts IS NULL")
+    # Room filters on lists, reports and exports
+    con.execute("CREATE INDEX IF NOT EXISTS idx_sessions_room ON sessions(room, id)")
+
+    # attendance: session_id is nullable (for "no active session" -> day mode)
+    # day is the YYYY-MM-DD part of ts, stored so filters and dedup can use indexes
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS attendance (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id  TEXT NOT NULL,
+            name        TEXT NOT NULL,
+            mac         TEXT,
+            ts          TEXT NOT NULL,
+            session_id  INTEGER,
+            day         TEXT,
+            FOREIGN KEY(session_id) REFERENCES sessions(id)
+        )
+        """
+    )
+
+    # Ensure session_id / day columns exist (migrate older DBs)
+    if not column_exists(con, "attendance", "session_id"):
+        con.execute("ALTER TABLE attendance ADD COLUMN session_id INTEGER")
+    if not column_exists(con, "attendance", "day"):
+        con.execute("ALTER TABLE attendance ADD COLUMN day TEXT")
+    report["backfilled_days"] = con.execute(
+        "UPDATE attendance SET day = substr(ts, 1, 10) WHERE day IS NULL"
+    ).rowcount
+
+    # Rows that break the dedup rules would block the UNIQUE indexes below.
+    # Keep the first log of each student per session/day and move the rest aside.
+    con.execute("CREATE TABLE IF NOT EXISTS attendance_duplicates AS SELECT * FROM attendance WHERE 0")
+    dup_where = """
+        id NOT IN (
+            SELECT MIN(id) FROM attendance WHERE session_id IS NOT NULL GROUP BY session_id, student_id
+            UNION ALL
+            SELECT MIN(id) FROM attendance WHERE session_id IS NULL GROUP BY day, student_id
+        )
+    """
+    if not index_exists(con, "ux_attendance_session_student") or not index_exists(con, "ux_attendance_day_student"):
+        con.execute(f"INSERT INTO attendance_duplicates SELECT * FROM attendance WHERE {dup_where}")
+        report["quarantined_duplicates"] = con.execute(f"DELETE FROM attendance WHERE {dup_where}").rowcount
+
+    # Dedup rules enforced by the database:
+    #   - active session: one log per student per session
+    #   - no session (day mode): one log per student per day
+    # The session index also serves session_id = ? lookups.
+    con.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_attendance_session_student "
+        "ON attendance(session_id, student_id) WHERE session_id IS NOT NULL"
+    )
+    con.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_attendance_day_student "
+        "ON attendance(day, student_id) WHERE session_id IS NULL"
+    )
+    # Date-range filters across both modes (lists, exports, reports)
+    con.execute("CREATE INDEX IF NOT EXISTS idx_attendance_day_student ON attendance(day, student_id)")
+    # Newest-first listings and exports (ORDER BY ts DESC, id DESC) without a sort step
+    con.execute("CREATE INDEX IF NOT EXISTS idx_attendance_ts_id ON attendance(ts, id)")
+
+    migrate_stats(con)
+
+    # students: the roster (source of truth; the class-list CSV is import/export only)
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS students (
+            student_id TEXT PRIMARY KEY,
+            name       TEXT NOT NULL,
+            mac        TEXT NOT NULL DEFAULT ''
+        )
+        """
+    )
+
+    # meta: named version counters that let worker processes detect each other's writes
+    # (session, roster, presence, snapshot; data: attendance rows removed, e.g. archived)
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS meta (
+            key   TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+        """
+    )
+
+    # Closed sessions frozen as bitmaps of present students (see snapshots.py).
+    # student_ordinals numbers each student ID once (roster order first) and never reuses
+    # a number, so a student keeps their bit position in every snapshot.
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS student_ordinals (
+            ordinal    INTEGER PRIMARY KEY,
+            student_id TEXT NOT NULL UNIQUE
+        )
+        """
+    )
+    con.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_students_ordinal AFTER INSERT ON students
+        BEGIN
+            INSERT OR IGNORE INTO student_ordinals (student_id) VALUES (NEW.student_id);
+        END
+        """
+    )
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS session_snapshots (
+            session_id INTEGER PRIMARY KEY,
+            present    INTEGER NOT NULL,
+            bitmap     BLOB NOT NULL,
+            first_seen BLOB NOT NULL
+        )
+        """
+    )
+    con.execute(snapshots.ORDINALS_SQL + "SELECT student_id FROM students ORDER BY rowid")
+    report["frozen_sessions"] = snapshots.freeze_closed_sessions(con)
+
+    # Scans matched only fuzzily by device name, waiting for a lecturer to confirm
+    # (POST /api/matches/<id>/confirm) or reject them. candidates is JSON
+    # [{"student_id", "name", "score"}, ...], best first. One row per device name and
+    # scope, so a phone advertising every few seconds is queued once and later scans
+    # follow the lecturer's decision.
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pending_matches (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_name TEXT NOT NULL,
+            mac         TEXT NOT NULL DEFAULT '',
+            room        TEXT NOT NULL DEFAULT '',
+            session_id  INTEGER,
+            day         TEXT NOT NULL,
+            ts          TEXT NOT NULL,
+            candidates  TEXT NOT NULL,
+            status      TEXT NOT NULL DEFAULT 'pending',
+            student_id  TEXT,
+            resolved_ts TEXT
+        )
+        """
+    )
+    con.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_pending_matches_scope "
+        "ON pending_matches(device_name, room, day, IFNULL(session_id, 0))"
+    )
+    con.execute("CREATE INDEX IF NOT EXISTS idx_pending_matches_status ON pending_matches(status, id)")
+
+    # Merged presence intervals per session and student, folded from repeated sightings
+    # (see presence.py); dwell_seconds on the attendance row is their summed length
+    # (NULL when untracked: day mode, manual marks, rows from before tracking).
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS presence_intervals (
+            session_id INTEGER NOT NULL,
+            student_id TEXT NOT NULL,
+            start_ts   TEXT NOT NULL,
+            end_ts     TEXT NOT NULL,
+            PRIMARY KEY (session_id, student_id, start_ts)
+        ) WITHOUT ROWID
+        """
+    )
+    if not column_exists(con, "attendance", "dwell_seconds"):
+        con.execute("ALTER TABLE attendance ADD COLUMN dwell_seconds INTEGER")
+
+    # Offline sync (POST /api/sync): one row per client event id, so a replayed event is
+    # answered from its stored outcome instead of being applied again. sync_cursors holds
+    # each scanner's high-watermark: every event up to that sequence number is stored.
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS scan_events (
+            event_id    TEXT PRIMARY KEY,
+            scanner     TEXT NOT NULL DEFAULT '',
+            captured_ts TEXT NOT NULL,
+            received_ts TEXT NOT NULL,
+            status      TEXT NOT NULL,
+            student_id  TEXT,
+            session_id  INTEGER
+        ) WITHOUT ROWID
+        """
+    )
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sync_cursors (
+            scanner    TEXT PRIMARY KEY,
+            watermark  INTEGER NOT NULL,
+            updated_ts TEXT NOT NULL
+        )
+        """
+    )
+    # Sessions containing a capture time
+    con.execute("CREATE INDEX IF NOT EXISTS idx_sessions_room_start ON sessions(room, start_ts)")
+
+    # Sessions whose rows archive.py moved to a term file (archive: its path; NULL for
+    # sessions archived before this table existed, found by their counters outliving
+    # their rows). Their snapshots can no longer be rebuilt from the main database.
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS session_archives (
+            session_id INTEGER PRIMARY KEY,
+            archive    TEXT
+        )
+        """
+    )
+    con.execute(
+        "INSERT OR IGNORE INTO session_archives (session_id) "
+        "SELECT s.session_id FROM session_stats s JOIN sessions ON sessions.id = s.session_id "
+        "WHERE sessions.end_ts IS NOT NULL "
+        "AND s.present > (SELECT COUNT(*) FROM attendance a WHERE a.session_id = s.session_id)"
+    )
+    return report
+
+
+def migrate_stats(con) -> None:
+    """Attendance counters kept current by triggers on every insert/delete path.
+
+    session_stats / day_stats hold the number of students present per session and per
+    day-mode day; student_stats holds how many sessions and day-mode days each student
+    attended. The dedup indexes guarantee one row per student per session/day, so row
+    counts are distinct-student counts.
+    """
+    created = not table_exists(con, "session_stats")
+    con.execute("CREATE TABLE IF NOT EXISTS session_stats (session_id INTEGER PRIMARY KEY, present INTEGER NOT NULL)")
+    con.execute("CREATE TABLE IF NOT EXISTS day_stats (day TEXT PRIMARY KEY, present INTEGER NOT NULL)")
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS student_stats (
+            student_id        TEXT PRIMARY KEY,
+            sessions_attended INTEGER NOT NULL,
+            days_attended     INTEGER NOT NULL
+        )
+        """
+    )
+    con.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_attendance_stats_insert AFTER INSERT ON attendance
+        BEGIN
+            INSERT INTO session_stats (session_id, present) SELECT NEW.session_id, 1 WHERE NEW.session_id IS NOT NULL
+                ON CONFLICT(session_id) DO UPDATE SET present = present + 1;
+            INSERT INTO day_stats (day, present) SELECT NEW.day, 1 WHERE NEW.session_id IS NULL
+                ON CONFLICT(day) DO UPDATE SET present = present + 1;
+            INSERT INTO student_stats (student_id, sessions_attended, days_attended)
+                SELECT NEW.student_id, NEW.session_id IS NOT NULL, NEW.session_id IS NULL WHERE 1
+                ON CONFLICT(student_id) DO UPDATE SET
+                    sessions_attended = sessions_attended + excluded.sessions_attended,
+                    days_attended = days_attended + excluded.days_attended;
+        END
+        """
+    )
+    con.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_attendance_stats_delete AFTER DELETE ON attendance
+        BEGIN
+            UPDATE session_stats SET present = present - 1 WHERE session_id = OLD.session_id;
+            UPDATE day_stats SET present = present - 1 WHERE OLD.session_id IS NULL AND day = OLD.day;
+            UPDATE student_stats SET
+                sessions_attended = sessions_attended - (OLD.session_id IS NOT NULL),
+                days_attended = days_attended - (OLD.session_id IS NULL)
+            WHERE student_id = OLD.student_id;
+        END
+        """
+    )
+    if created:
+        # Backfill from rows logged before the counters existed
+        con.execute(
+            "INSERT INTO session_stats (session_id, present) "
+            "SELECT session_id, COUNT(*) FROM attendance WHERE session_id IS NOT NULL GROUP BY session_id"
+        )
+        con.execute(
+            "INSERT INTO day_stats (day, present) "
+            "SELECT day, COUNT(*) FROM attendance WHERE session_id IS NULL GROUP BY day"
+        )
+        con.execute(
+            "INSERT INTO student_stats (student_id, sessions_attended, days_attended) "
+            "SELECT student_id, SUM(session_id IS NOT NULL), SUM(session_id IS NULL) FROM attendance GROUP BY student_id"
+        )
+
+
+def main(argv=None):
+    paths = (argv if argv is not None else sys.argv[1:]) or [p for p in KNOWN_DB_PATHS if os.path.exists(p)]
+    for path in paths:
+        con = sqlite3.connect(path)
+        try:
+            report = migrate(con)
+        finally:
+            con.close()
+        print(f"[INFO] Migrated {path}: {report}")
+
+
+if __name__ == "__main__":
+    main()
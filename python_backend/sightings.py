@@ -0,0 +1,110 @@
+"""Debounce cache for repeated scanner sightings of students already logged.
+
+Scanners re-report every device that keeps advertising, so during a lecture most scans
+are repeats. SightingCache remembers which students are already logged in each room's
+current scope (the room's open session, or the day when it has none) so a repeat can be
+answered without touching the database.
+
+Entries only ever claim "already logged", and they are dropped when the room's session
+starts or ends, when the day rolls over and after ttl_seconds. The TTL bounds how long
+a worker can miss a session change made by another worker process.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+Session = Optional[Dict[str, Any]]  # open session row, or None for day scope
+
+
+def scope_of(session: Session, day: str) -> Tuple[str, Any]:
+    return ("session", session["id"]) if session else ("day", day)
+
+
+class SightingCache:
+    """Bounded LRU of (room, student ID) -> scope the student is logged in, with a TTL.
+
+    get() returns the session the student is logged in (None for day scope) wrapped in a
+    1-tuple on a hit, or None on a miss. All methods hold one lock; none touch SQLite.
+    """
+
+    def __init__(self, max_entries: int = 50000, ttl_seconds: float = 120.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Session]]" = OrderedDict()
+        self._seeded: Dict[str, Tuple[str, Any]] = {}  # room -> scope loaded from the DB
+        self._day: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def _roll_day(self, day: str) -> None:
+        if day != self._day:
+            self._entries.clear()
+            self._seeded.clear()
+            self._day = day
+
+    def get(self, room: str, student_id: str, day: str) -> Optional[Tuple[Session]]:
+        with self._lock:
+            self._roll_day(day)
+            key = (room, student_id)
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self.clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return (entry[1],)
+
+    def add(self, room: str, student_ids: Iterable[str], day: str, session: Session) -> None:
+        """Record students logged (or found already logged) in the room's current scope."""
+        with self._lock:
+            self._roll_day(day)
+            expires = self.clock() + self.ttl_seconds
+            for student_id in student_ids:
+                key = (room, student_id)
+                self._entries[key] = (expires, session)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def needs_seed(self, room: str, day: str, session: Session) -> bool:
+        with self._lock:
+            self._roll_day(day)
+            return self._seeded.get(room) != scope_of(session, day)
+
+    def seed(self, room: str, student_ids: Iterable[str], day: str, session: Session) -> None:
+        """Load everyone the database already has in the room's scope (once per scope)."""
+        self.forget_rooms([room])
+        self.add(room, student_ids, day, session)
+        with self._lock:
+            self._seeded[room] = scope_of(session, day)
+
+    def forget_rooms(self, rooms: Iterable[str]) -> None:
+        """Drop the rooms' entries, e.g. when their session starts or ends."""
+        rooms = set(rooms)
+        if not rooms:
+            return
+        with self._lock:
+            for key in [k for k in self._entries if k[0] in rooms]:
+                del self._entries[key]
+            for room in rooms:
+                self._seeded.pop(room, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._seeded.clear()
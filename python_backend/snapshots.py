@@ -0,0 +1,206 @@
+"""Closed sessions frozen as bitmaps of present students, for set queries across sessions.
+
+A session's attendance never changes once it has ended, so end_active_session (and
+start_session, when it closes a room's previous session) freezes it into a
+session_snapshots row:
+
+  - bitmap: bit n is set when the student with ordinal n was present. Ordinals come
+    from student_ordinals, which numbers every student ID once and never reuses a number,
+    so bitmaps written at different times line up. Stored little-endian, one bit per ordinal.
+  - first_seen: for each set bit in ordinal order, seconds from the session start to the
+    student's log, as little-endian uint32.
+
+Questions like "who missed 3 of the last 5 sessions" then become bitwise operations on
+Python integers instead of joins over attendance rows, and still work after archive.py
+has moved the raw rows of old sessions out of the main database.
+"""
+import struct
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import schema
+
+ORDINALS_SQL = "INSERT OR IGNORE INTO student_ordinals (student_id) "
+
+
+def encode_bitmap(ordinals: Iterable[int]) -> bytes:
+    ordinals = list(ordinals)
+    buf = bytearray((max(ordinals) >> 3) + 1 if ordinals else 0)
+    for o in ordinals:
+        buf[o >> 3] |= 1 << (o & 7)
+    return bytes(buf)
+
+
+def decode_bitmap(blob: Optional[bytes]) -> int:
+    return int.from_bytes(blob or b"", "little")
+
+
+def iter_ordinals(bits: int) -> Iterator[int]:
+    """Set bit positions of bits, ascending."""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for i, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield (i << 3) + low.bit_length() - 1
+            byte ^= low
+
+
+def decode_first_seen(bits: int, blob: Optional[bytes]) -> Dict[int, int]:
+    """Ordinal -> seconds from session start to the student's log."""
+    offsets = struct.unpack(f"<{len(blob or b'') // 4}I", blob or b"")
+    return dict(zip(iter_ordinals(bits), offsets))
+
+
+def session_first_seen(con, session_id: int) -> Optional[Dict[int, int]]:
+    """Ordinal -> first-seen offset of the session's rows in the main database (numbering
+    students seen for the first time), or None if the session does not exist."""
+    row = con.execute("SELECT start_ts FROM sessions WHERE id = ?", (session_id,)).fetchone()
+    if not row:
+        return None
+    start = datetime.fromisoformat(row[0])
+    con.execute(ORDINALS_SQL + "SELECT student_id FROM attendance WHERE session_id = ? ORDER BY id", (session_id,))
+    first_seen = {}
+    for ordinal, ts in con.execute(
+        "SELECT o.ordinal, a.ts FROM attendance a JOIN student_ordinals o ON o.student_id = a.student_id "
+        "WHERE a.session_id = ?",
+        (session_id,),
+    ):
+        seconds = (datetime.fromisoformat(ts) - start).total_seconds()
+        first_seen[ordinal] = min(max(int(seconds), 0), 0xFFFFFFFF)
+    return first_seen
+
+
+def write_snapshot(con, session_id: int, first_seen: Dict[int, int]) -> int:
+    ordinals = sorted(first_seen)
+    con.execute(
+        "INSERT INTO session_snapshots (session_id, present, bitmap, first_seen) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(session_id) DO UPDATE SET present = excluded.present, bitmap = excluded.bitmap, "
+        "first_seen = excluded.first_seen",
+        (session_id, len(ordinals), encode_bitmap(ordinals),
+         struct.pack(f"<{len(ordinals)}I", *(first_seen[o] for o in ordinals))),
+    )
+    return len(ordinals)
+
+
+def freeze_session(con, session_id: int) -> Optional[int]:
+    """Write the snapshot of one session in the caller's transaction. Returns the number
+    of students present, or None if the session does not exist."""
+    first_seen = session_first_seen(con, session_id)
+    if first_seen is None:
+        return None
+    return write_snapshot(con, session_id, first_seen)
+
+
+def refreeze_session(con, session_id: int) -> Optional[int]:
+    """Rewrite the snapshot of a closed session that gained rows late (a confirmed match,
+    an offline sync) and bump the "snapshot" meta counter so cached bitmaps are dropped.
+
+    An archived session (see archive.py) has most of its rows in a term file, so its
+    snapshot is not rebuilt: the rows now in the main database are added to it."""
+    if con.execute("SELECT 1 FROM session_archives WHERE session_id = ?", (session_id,)).fetchone():
+        first_seen = session_first_seen(con, session_id)
+        row = con.execute("SELECT bitmap, first_seen FROM session_snapshots WHERE session_id = ?",
+                          (session_id,)).fetchone()
+        if first_seen is not None and row:
+            first_seen = {**first_seen, **decode_first_seen(decode_bitmap(row[0]), row[1])}
+        present = None if first_seen is None else write_snapshot(con, session_id, first_seen)
+    else:
+        present = freeze_session(con, session_id)
+    schema.bump_version(con, "snapshot")
+    return present
+
+
+def freeze_closed_sessions(con) -> int:
+    """Freeze every closed session that has no snapshot yet (caller's transaction)."""
+    ids = [r[0] for r in con.execute(
+        "SELECT id FROM sessions WHERE end_ts IS NOT NULL "
+        "AND id NOT IN (SELECT session_id FROM session_snapshots) ORDER BY id"
+    )]
+    for session_id in ids:
+        freeze_session(con, session_id)
+    return len(ids)
+
+
+def missed_at_least(universe: int, presents: List[int], k: int) -> int:
+    """Bits of universe absent from at least k of the present-bitmaps.
+
+    at_least[j] holds the students absent j or more times so far; each session moves
+    its absentees up one level, so the cost is len(presents) * k big-integer operations.
+    """
+    at_least = [universe] + [0] * k
+    for n, present in enumerate(presents, 1):
+        absent = universe & ~present
+        for j in range(min(k, n), 0, -1):
+            at_least[j] |= at_least[j - 1] & absent
+    return at_least[k]
+
+
+class SnapshotStore:
+    """Per-worker cache of decoded session bitmaps and of the roster's ordinals.
+
+    Cached bitmaps are dropped when the "snapshot" version changes (refreeze_session);
+    the roster bitmap is rebuilt when the "roster" version it was read at changes.
+    """
+
+    def __init__(self, max_sessions: int = 4096):
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._bitmaps: "OrderedDict[int, int]" = OrderedDict()
+        self._version: Optional[int] = None
+        self._roster: Optional[Tuple[int, int, Dict[int, Tuple[str, str]]]] = None
+
+    def bitmaps(self, con, session_ids: Iterable[int], live=None) -> Dict[int, int]:
+        """Present-bitmaps of closed sessions, read from `con` (which may be the read-only
+        reporting copy). Sessions closed without a snapshot (by an older version of the
+        app) are frozen on `live`, the live database, and read back from it; without
+        `live` they are left out."""
+        version = schema.read_version(con, "snapshot")
+        found, missing = {}, []
+        with self._lock:
+            if version != self._version:
+                self._bitmaps.clear()
+                self._version = version
+            for sid in session_ids:
+                if sid in self._bitmaps:
+                    self._bitmaps.move_to_end(sid)
+                    found[sid] = self._bitmaps[sid]
+                else:
+                    missing.append(sid)
+        if not missing:
+            return found
+        marks = ",".join("?" * len(missing))
+        loaded = {r[0]: decode_bitmap(r[1]) for r in con.execute(
+            f"SELECT session_id, bitmap FROM session_snapshots WHERE session_id IN ({marks})", missing
+        )}
+        if len(loaded) < len(missing) and live is not None:
+            unfrozen = [sid for sid in missing if sid not in loaded]
+            with live:
+                for sid in unfrozen:
+                    freeze_session(live, sid)
+            marks = ",".join("?" * len(unfrozen))
+            loaded.update((r[0], decode_bitmap(r[1])) for r in live.execute(
+                f"SELECT session_id, bitmap FROM session_snapshots WHERE session_id IN ({marks})", unfrozen
+            ))
+        with self._lock:
+            for sid, bits in loaded.items():
+                self._bitmaps[sid] = bits
+            while len(self._bitmaps) > self.max_sessions:
+                self._bitmaps.popitem(last=False)
+        found.update(loaded)
+        return found
+
+    def roster(self, con, version: int) -> Tuple[int, Dict[int, Tuple[str, str]]]:
+        """(bitmap of roster students, ordinal -> (student ID, name)) at roster `version`."""
+        with self._lock:
+            if self._roster and self._roster[0] == version:
+                return self._roster[1], self._roster[2]
+        students = {r[0]: (r[1], r[2]) for r in con.execute(
+            "SELECT o.ordinal, s.student_id, s.name FROM students s "
+            "JOIN student_ordinals o ON o.student_id = s.student_id"
+        )}
+        bits = decode_bitmap(encode_bitmap(students))
+        with self._lock:
+            self._roster = (version, bits, students)
+        return bits, students
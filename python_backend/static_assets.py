@@ -0,0 +1,161 @@
+"""In-memory table of the frontend's static files, built once per worker at startup.
+
+serve_frontend_file used to stat the disk and re-send every file, uncompressed and
+without validators, on each request. AssetTable reads WEB_DIR (web/ or a React build/)
+once and keeps, per URL path:
+
+  - the file's bytes, content type and a strong ETag (a content hash);
+  - gzip and brotli variants, each with its own ETag (`Brotli` is in requirements.txt;
+    an install without it gets gzip only). Variants are compressed here unless the
+    build already wrote `<file>.gz` / `<file>.br` next to the file; a variant is
+    dropped when it is not smaller than the original;
+  - its Cache-Control: a year and `immutable` for content-hashed names
+    (`main.3f2a9c1b.js`), `no-cache` (revalidate with the ETag) for everything else,
+    index.html included.
+
+Serving a file is then a dict lookup and an Accept-Encoding choice. Files changed on
+disk are picked up on the next worker start.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Callable, Dict, Optional, Set, Tuple
+
+try:
+    import brotli
+except ImportError:  # installs without it (see requirements.txt) prepare gzip only
+    brotli = None
+
+COMPRESS_MIN_BYTES = 256           # smaller files are sent as they are
+MAX_ASSET_BYTES = 8 * 1024 * 1024  # larger files are left to send_from_directory
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# A run of 8+ hex digits (at least one a digit) between dots or after a dash, as
+# bundlers put in file names: main.3f2a9c1b.js, 787.a1b2c3d4.chunk.css, logo-9f8e7d6c.svg
+_HASHED_NAME = re.compile(r"[.-](?=[0-9a-f]*\d)[0-9a-f]{8,}\.")
+
+COMPRESSIBLE_TYPES = frozenset((
+    "application/javascript", "application/json", "application/manifest+json",
+    "application/xml", "application/wasm", "image/svg+xml", "image/x-icon",
+    "image/vnd.microsoft.icon",
+))
+
+# Preference when the client rates several encodings equally
+ENCODING_ORDER = ("br", "gzip", "identity")
+
+
+def is_hashed_name(path: str) -> bool:
+    return bool(_HASHED_NAME.search(os.path.basename(path)))
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.startswith("text/") or content_type in COMPRESSIBLE_TYPES
+
+
+class Asset:
+    """One static file: encoding -> (body, ETag) plus the headers shared by every variant."""
+
+    __slots__ = ("path", "content_type", "cache_control", "variants")
+
+    def __init__(self, path: str, content_type: str, cache_control: str, variants: Dict[str, Tuple[bytes, str]]):
+        self.path = path
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.variants = variants
+
+    @property
+    def compressed(self) -> bool:
+        return len(self.variants) > 1
+
+    def negotiate(self, quality: Callable[[str], float]) -> str:
+        """Encoding to send, given the client's quality for an encoding name (0 = not
+        accepted). The original is always the fallback; on equal quality the smaller
+        variant wins."""
+        best, best_q = "identity", 0.0
+        for encoding in ENCODING_ORDER:
+            if encoding in self.variants:
+                q = quality(encoding)
+                if q > best_q:
+                    best, best_q = encoding, q
+        return best
+
+
+def load_asset(root: str, rel_path: str) -> Optional[Asset]:
+    """Read and prepare one file; None when it is too large to keep in memory."""
+    full = os.path.join(root, rel_path)
+    if os.path.getsize(full) > MAX_ASSET_BYTES:
+        return None
+    with open(full, "rb") as f:
+        data = f.read()
+    content_type = mimetypes.guess_type(rel_path)[0] or "application/octet-stream"
+    if content_type.startswith("text/") or content_type == "application/javascript":
+        content_type += "; charset=utf-8"
+    digest = hashlib.sha256(data).hexdigest()[:24]
+    variants = {"identity": (data, digest)}
+    if len(data) >= COMPRESS_MIN_BYTES and is_compressible(content_type.split(";")[0]):
+        for encoding, suffix, compress in (
+            ("gzip", ".gz", lambda b: gzip.compress(b, compresslevel=9, mtime=0)),
+            ("br", ".br", brotli.compress if brotli is not None else None),
+        ):
+            body = _read_precompressed(full + suffix, full)
+            if body is None and compress is not None:
+                body = compress(data)
+            if body is not None and len(body) < len(data):
+                variants[encoding] = (body, f"{digest}-{suffix[1:]}")
+    cache_control = IMMUTABLE_CACHE_CONTROL if is_hashed_name(rel_path) else REVALIDATE_CACHE_CONTROL
+    return Asset("/" + rel_path.replace(os.sep, "/"), content_type, cache_control, variants)
+
+
+def _read_precompressed(path: str, original: str) -> Optional[bytes]:
+    """A build-time variant, if there is one at least as new as the original."""
+    try:
+        if os.path.getmtime(path) < os.path.getmtime(original):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+class AssetTable:
+    """URL path ("js/app.js") -> Asset for every file under `root`."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.assets: Dict[str, Asset] = {}
+        self.skipped: Set[str] = set()   # too large; served from disk
+        if not os.path.isdir(root):
+            return
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+            for name in sorted(filenames):
+                if name.startswith(".") or self._is_variant(dirpath, name):
+                    continue
+                rel_path = os.path.relpath(os.path.join(dirpath, name), root)
+                asset = load_asset(root, rel_path)
+                if asset is None:
+                    self.skipped.add(rel_path.replace(os.sep, "/"))
+                else:
+                    self.assets[asset.path[1:]] = asset
+
+    @staticmethod
+    def _is_variant(dirpath: str, name: str) -> bool:
+        base, ext = os.path.splitext(name)
+        return ext in (".gz", ".br") and os.path.isfile(os.path.join(dirpath, base))
+
+    def __len__(self) -> int:
+        return len(self.assets)
+
+    def get(self, path: str) -> Optional[Asset]:
+        return self.assets.get(path)
+
+    @property
+    def index(self) -> Optional[Asset]:
+        return self.assets.get("index.html")
+
+    def stats(self) -> Dict[str, int]:
+        identity = sum(len(a.variants["identity"][0]) for a in self.assets.values())
+        return {"files": len(self.assets), "bytes": identity, "compressed": sum(a.compressed for a in self.assets.values())}
@@ -0,0 +1,29 @@
+import csv
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import app as app_module  # noqa: E402
+
+STUDENTS = [{"Name": f"Student {i}", "Student ID": f"S{i:04d}", "MAC": f"02:00:00:00:00:{i:02X}"}
+            for i in range(1, 6)]
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """create_app(config) on a fresh data directory holding a five-student class list."""
+    with open(tmp_path / "cleaned_class_list.csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["Name", "Student ID", "MAC"])
+        writer.writeheader()
+        writer.writerows(STUDENTS)
+
+    def make(config=None):
+        return app_module.create_app({"DATA_DIR": str(tmp_path), "LOG_LEVEL": "WARNING", **(config or {})})
+
+    yield make
+    app_module.shutdown()
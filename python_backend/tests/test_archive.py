@@ -0,0 +1,36 @@
+import sqlite3
+from datetime import date, timedelta
+
+import app as app_module
+import archive
+import snapshots
+from conftest import STUDENTS
+
+
+def test_archive_changes_list_etag_and_keeps_snapshots_on_refreeze(make_app, tmp_path):
+    client = make_app().test_client()
+    session_id = client.post("/api/session/start", json={"name": "t"}).get_json()["active_session"]["id"]
+    for s in STUDENTS[:2]:
+        client.post("/api/validate", json={"mac_address": s["MAC"]})
+    client.post("/api/session/end", json={})
+    etag = client.get("/api/attendance").headers["ETag"]
+
+    con = sqlite3.connect(app_module.DB_PATH, isolation_level=None)
+    try:
+        tomorrow = (date.today() + timedelta(days=1)).isoformat()
+        report = archive.archive_sessions(con, tomorrow, str(tmp_path / "term.db"))
+        assert (report["sessions"], report["rows"]) == (1, 2)
+    finally:
+        con.close()
+
+    res = client.get("/api/attendance", headers={"If-None-Match": etag})
+    assert res.status_code == 200 and res.get_json() == []
+
+    # A late row for the archived session is added to its snapshot, not rebuilt from it
+    with app_module.get_db() as con:
+        student = STUDENTS[2]
+        con.execute(app_module.INSERT_ATTENDANCE_SQL, (student["Student ID"], student["Name"], student["MAC"],
+                                                       date.today().isoformat() + "T09:00:00",
+                                                       date.today().isoformat(), session_id))
+        assert snapshots.refreeze_session(con, session_id) == 3
+        con.commit()
@@ -0,0 +1,72 @@
+from urllib.parse import parse_qs, urlsplit
+
+from conftest import STUDENTS
+
+DAY_1, DAY_2 = "2024-03-01T09:00:00", "2024-03-02T09:00:00"
+
+
+def log_day(client, ts):
+    """All five students at the same time (one day-mode row each): five tied timestamps."""
+    sightings = [{"mac_address": s["MAC"], "timestamp": ts} for s in STUDENTS]
+    reply = client.post("/api/validate/batch", json={"sightings": sightings}).get_json()
+    assert reply["counts"]["logged"] == 5
+
+
+def ids(reply):
+    return [r["id"] for r in reply.get_json()]
+
+
+def test_pages_walk_tied_timestamps_without_gaps_or_repeats(make_app):
+    client = make_app().test_client()
+    log_day(client, DAY_1)   # ids 1-5
+    log_day(client, DAY_2)   # ids 6-10
+
+    pages, url = [], "/api/attendance?limit=3"
+    while url:
+        reply = client.get(url)
+        assert reply.status_code == 200
+        pages.append(ids(reply))
+        link = reply.headers.get("Link")
+        if link:
+            target = urlsplit(link[1:link.index(">")])
+            assert link.endswith('; rel="next"')
+            assert parse_qs(target.query) == {"limit": ["3"], "after": [reply.headers["X-Next-Cursor"]]}
+            url = f"{target.path}?{target.query}"
+        else:
+            assert "X-Next-Cursor" not in reply.headers
+            url = None
+    # Newest first, (ts, id) order within a tie
+    assert pages == [[10, 9, 8], [7, 6, 5], [4, 3, 2], [1]]
+
+    # X-Prev-Cursor of a page walks back towards newer rows
+    reply = client.get("/api/attendance?limit=3&after=" + f"{DAY_2},8")
+    assert ids(reply) == [7, 6, 5]
+    prev = reply.headers["X-Prev-Cursor"]
+    assert prev == f"{DAY_2},7"
+    assert ids(client.get(f"/api/attendance?limit=3&before={prev}")) == [10, 9, 8]
+    assert ids(client.get(f"/api/attendance?limit=3&before={DAY_1},4")) == [7, 6, 5]
+
+
+def test_cursor_errors(make_app):
+    client = make_app().test_client()
+    assert client.get("/api/attendance?after=nonsense").status_code == 400
+    assert client.get(f"/api/attendance?after={DAY_1},1&before={DAY_2},1").status_code == 400
+
+
+def test_unchanged_list_is_not_modified_until_a_row_is_logged(make_app):
+    client = make_app().test_client()
+    log_day(client, DAY_1)
+    first = client.get("/api/attendance?limit=2")
+    etag = first.headers["ETag"]
+
+    again = client.get("/api/attendance?limit=2", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    # Another query is another ETag
+    assert client.get("/api/attendance?limit=3", headers={"If-None-Match": etag}).status_code == 200
+
+    client.post("/api/validate/batch", json={"sightings": [{"mac_address": STUDENTS[0]["MAC"], "timestamp": DAY_2}]})
+    changed = client.get("/api/attendance?limit=2", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert ids(changed) == [6, 5]
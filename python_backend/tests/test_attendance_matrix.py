@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+import app as app_module
+from attendance_matrix import AttendanceMatrix, student_totals, term_metrics
+from conftest import STUDENTS
+
+# Sessions (rows) x students (columns):
+#   student 0 misses sessions 1-2, student 1 attends session 2 only, student 2 misses session 3
+PRESENT = np.array([
+    [1, 0, 1],
+    [0, 0, 1],
+    [0, 1, 1],
+    [1, 0, 0],
+], dtype=bool)
+
+
+def test_term_metrics_on_a_hand_computed_matrix():
+    m = term_metrics(PRESENT, window=2)
+    assert m["attended"].tolist() == [2, 1, 3]
+    assert m["rate"].tolist() == [0.5, 0.25, 0.75]
+    assert m["longest_absence_streak"].tolist() == [2, 2, 1]
+    assert m["current_absence_streak"].tolist() == [0, 1, 1]
+    assert m["turnout"].tolist() == [2, 1, 2, 1]
+    assert m["turnout_rate"] == pytest.approx([2 / 3, 1 / 3, 2 / 3, 1 / 3])
+    # Mean of the last (up to) two sessions' turnout rates
+    assert m["rolling_turnout_rate"] == pytest.approx([2 / 3, 1 / 2, 1 / 2, 1 / 2])
+    # Least-squares slope of [2, 1, 2, 1] / 3 over positions 0..3
+    assert m["turnout_slope"] == pytest.approx(-1 / 15)
+
+
+def test_term_metrics_without_sessions():
+    m = term_metrics(np.zeros((0, 2), dtype=bool))
+    assert m["attended"].tolist() == [0, 0]
+    assert m["longest_absence_streak"].tolist() == [0, 0]
+    assert m["turnout_slope"] == 0.0
+
+
+def test_student_totals_count_sessions_held_in_the_students_rooms():
+    # The matrix above over ordinals 1-3, sessions held in rooms A, A, B, A
+    sessions = [{"id": i + 1, "name": f"s{i}", "start_ts": f"2024-01-0{i + 1}T09:00:00", "room": room}
+                for i, room in enumerate("AABA")]
+    packed = np.array([[0b1010], [0b1000], [0b1100], [0b0010]], dtype=np.uint8)
+    matrix = AttendanceMatrix(sessions, packed)
+    ordinals = np.array([1, 2, 3, 100])  # 100: beyond every bitmap, never present
+
+    attended, totals = student_totals(matrix, np.arange(4), ordinals)
+    assert attended.tolist() == [2, 1, 3, 0]
+    # Ordinal 1 attended in A (3 sessions), 2 in B (1), 3 in both, 100 in none
+    assert totals.tolist() == [3, 1, 4, 0]
+
+    in_a = matrix.select(room="A")
+    assert in_a.tolist() == [0, 1, 3]
+    attended, totals = student_totals(matrix, in_a, ordinals)
+    assert attended.tolist() == [2, 0, 2, 0]
+    assert totals.tolist() == [3, 0, 3, 0]
+
+
+def test_matrix_report_freezes_a_missing_snapshot_on_the_live_database(make_app):
+    client = make_app({"REPORT_SNAPSHOT_SECONDS": 3600}).test_client()
+    client.post("/api/session/start", json={"name": "a", "room": "A"})
+    assert client.post("/api/validate", json={"mac_address": STUDENTS[0]["MAC"], "room": "A"}).get_json()["logged"]
+    client.post("/api/session/end", json={"room": "A"})
+    with app_module.db_pool.connect() as con:  # as if closed by an older version of the app
+        con.execute("DELETE FROM session_snapshots")
+    app_module.report_snapshot.refresh()
+
+    # The reporting copy is read-only: the snapshot is written to the live database instead
+    reply = client.get("/api/reports/matrix")
+    assert reply.status_code == 200
+    report = reply.get_json()
+    assert report["sessions"] == 1
+    assert {s["student_id"]: s["attended"] for s in report["student_metrics"]}["S0001"] == 1
+    with app_module.db_pool.connect() as con:
+        assert [r[0] for r in con.execute("SELECT session_id FROM session_snapshots")] == [1]
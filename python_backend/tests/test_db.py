@@ -0,0 +1,32 @@
+import sqlite3
+
+import pytest
+
+from db import ConnectionPool
+
+
+def test_pool_opens_what_holders_need_and_keeps_max_idle(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "a.db"), max_idle=2)
+    held = [pool.acquire() for _ in range(3)]   # never blocks: a connection per holder
+    assert len({id(c) for c in held}) == 3
+    for con in held:
+        pool.release(con)
+    # The third release found two idle connections and closed its own
+    with pytest.raises(sqlite3.ProgrammingError):
+        held[2].execute("SELECT 1")
+    assert pool.acquire() is held[1]   # most recently released first
+    assert pool.acquire() is held[0]
+    assert pool.acquire() not in held
+    pool.close_all()
+
+
+def test_release_rolls_back_an_open_transaction(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "a.db"))
+    con = pool.acquire()
+    con.execute("CREATE TABLE t (x)")
+    con.execute("BEGIN")
+    con.execute("INSERT INTO t VALUES (1)")
+    pool.release(con)
+    assert not con.in_transaction
+    assert pool.acquire().execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    pool.close_all()
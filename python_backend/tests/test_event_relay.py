@@ -0,0 +1,48 @@
+import app as app_module
+from conftest import STUDENTS
+from event_relay import EventRelay
+from events import EventBus
+
+
+def test_relay_publishes_other_workers_writes(make_app):
+    client = make_app({"STREAM_POLL_SECONDS": 60}).test_client()  # polled by hand below
+    bus = EventBus()
+    # A second worker's relay: it sees rows this app writes through the database only
+    relay = EventRelay(app_module.db_pool.connect, bus.publish, poll_seconds=60)
+    sub, _, _ = bus.subscribe()
+    try:
+        client.post("/api/session/start", json={"name": "t", "room": "A"})
+        for s in STUDENTS[:2]:
+            client.post("/api/validate", json={"mac_address": s["MAC"], "room": "A"})
+        client.post("/api/session/end", json={"room": "A"})
+        assert relay.poll() == 4
+        events = [sub.get(timeout=0) for _ in range(4)]
+        assert [e["type"] for e in events] == ["session-started", "attendance-logged", "attendance-logged",
+                                               "session-ended"]
+        assert events[1]["data"]["student_id"] == STUDENTS[0]["Student ID"]
+        assert events[1]["data"]["room"] == "A"
+        assert relay.poll() == 0
+    finally:
+        relay.close()
+
+
+def test_handlers_leave_publishing_to_the_relay(make_app):
+    client = make_app({"STREAM_POLL_SECONDS": 60}).test_client()
+    sub, _, _ = app_module.event_bus.subscribe()
+    try:
+        client.post("/api/session/start", json={"name": "t"})
+        assert sub.get(timeout=0) is None
+        app_module.event_relay.poll()
+        assert sub.get(timeout=0)["type"] == "session-started"
+        assert sub.get(timeout=0) is None
+    finally:
+        app_module.event_bus.unsubscribe(sub)
+
+
+def test_subscriber_limit():
+    bus = EventBus()
+    first, _, _ = bus.subscribe(limit=1)
+    assert first is not None
+    assert bus.subscribe(limit=1)[0] is None
+    bus.unsubscribe(first)
+    assert bus.subscribe(limit=1)[0] is not None
@@ -0,0 +1,108 @@
+import os
+import time
+
+import app as app_module
+from conftest import STUDENTS
+from export_jobs import ExportJobManager
+
+
+def scan(client, student):
+    assert client.post("/api/validate", json={"mac_address": student["MAC"]}).get_json()["logged"]
+
+
+def export(client):
+    reply = client.post("/api/exports", json={"format": "csv"})
+    assert reply.status_code == 202
+    return reply.get_json()
+
+
+def finished(client, job_id):
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        job = client.get(f"/api/exports/{job_id}").get_json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"export job {job_id} did not finish")
+
+
+def downloaded_ids(client, job_id):
+    lines = client.get(f"/api/exports/{job_id}?download=1").get_data(as_text=True).splitlines()
+    return sorted(line.split(",")[0] for line in lines[1:])
+
+
+def test_unchanged_export_is_served_from_the_cache(make_app):
+    client = make_app().test_client()
+    scan(client, STUDENTS[0])
+    job = export(client)
+    assert finished(client, job["job_id"])["cached"] is False
+
+    again = export(client)
+    assert (again["job_id"], again["status"]) == (job["job_id"], "done")
+    # Another worker process finds the file on disk
+    other = ExportJobManager(app_module.export_jobs.directory, app_module.db_pool.connect)
+    try:
+        assert other.get(job["job_id"]).to_dict()["cached"] is True
+    finally:
+        other.shutdown()
+
+
+def test_new_rows_invalidate_the_cached_export(make_app):
+    client = make_app().test_client()
+    scan(client, STUDENTS[0])
+    first = export(client)["job_id"]
+    finished(client, first)
+    scan(client, STUDENTS[1])
+    second = export(client)["job_id"]
+    assert second != first
+    assert finished(client, second)["total_rows"] == 2
+    assert downloaded_ids(client, first) == ["S0001"]
+    assert downloaded_ids(client, second) == ["S0001", "S0002"]
+
+
+def test_job_stamps_the_rows_it_reads_not_the_request(make_app, monkeypatch):
+    client = make_app().test_client()
+    scan(client, STUDENTS[0])
+    submit = app_module.export_jobs.submit
+
+    def submit_after_another_scan(*args, **kwargs):
+        # A row committed after the request read its stamp, before the job runs
+        with app_module.db_pool.connect() as con:
+            con.execute(app_module.INSERT_ATTENDANCE_SQL,
+                        app_module.attendance_params(STUDENTS[1], "", "2024-03-01T09:00:00", None))
+        return submit(*args, **kwargs)
+
+    monkeypatch.setattr(app_module.export_jobs, "submit", submit_after_another_scan)
+    job_id = export(client)["job_id"]
+    assert finished(client, job_id)["total_rows"] == 2
+    assert downloaded_ids(client, job_id) == ["S0001", "S0002"]
+    monkeypatch.setattr(app_module.export_jobs, "submit", submit)
+
+    # The file is named after the data it holds, so the same export now is a cache hit
+    path = app_module.export_jobs.get(job_id).path
+    assert os.path.basename(path) != f"{job_id}.csv"
+    again = export(client)
+    assert again["status"] == "done"
+    assert app_module.export_jobs.get(again["job_id"]).path == path
+    assert downloaded_ids(client, again["job_id"]) == ["S0001", "S0002"]
+
+
+def test_prune_forgets_old_jobs_and_deletes_old_files(make_app):
+    client = make_app().test_client()
+    scan(client, STUDENTS[0])
+    manager = app_module.export_jobs
+    job_id = export(client)["job_id"]
+    finished(client, job_id)
+    old = manager.get(job_id)
+    fresh = os.path.join(manager.directory, "fresh.csv")
+    with open(fresh, "w") as f:
+        f.write("student_id\n")
+
+    manager.max_age = 3600
+    stale = time.time() - 2 * 3600
+    os.utime(old.path, (stale, stale))
+    old.finished_at = stale
+    manager.prune()
+    assert not os.path.exists(old.path)
+    assert os.path.exists(fresh)
+    assert manager.get(job_id) is None
@@ -0,0 +1,92 @@
+from name_match import NameIndex, query_tokens
+
+NAMES = ["John Smith", "Jon Smithers", "Joan Smyth", "Mary Johnson", "Maria Johansson",
+         "Peter Parker", "Katherine Okafor", "Catherine O'Connor"]
+ROSTER_CSV = "Name,Student ID\n" + "".join(f"{n},T{i:03d}\n" for i, n in enumerate(NAMES))
+
+
+def ranked(index, query, limit=3, min_score=0.0):
+    return [(round(score, 3), s["Name"]) for score, s in index.search(query, limit=limit, min_score=min_score)]
+
+
+def test_device_words_are_dropped_from_queries():
+    assert query_tokens("John Smith's iPhone") == ["john", "smith"]
+    assert query_tokens("Katherine's Galaxy S23") == ["katherine"]
+    assert query_tokens("Max's iPhone Pro Max") == ["max"]   # "Max" kept as a name, dropped as a model
+    assert query_tokens("iPhone") == ["iphone"]              # nothing else left: keep it
+
+
+def test_near_miss_names_rank_the_closest_student_first():
+    index = NameIndex({"Name": n, "Student ID": f"T{i:03d}"} for i, n in enumerate(NAMES))
+    assert ranked(index, "John Smith's iPhone")[0] == (1.0, "John Smith")
+    assert ranked(index, "Kathrine Okafor") == [(0.868, "Katherine Okafor")]
+    # Trigram similarity: "smith" is closer to "smithers" than "jon" is to "john"
+    assert [n for _, n in ranked(index, "Jon Smith", limit=2)] == ["Jon Smithers", "John Smith"]
+    assert [n for _, n in ranked(index, "Maria Jonson", limit=2)] == ["Mary Johnson", "Maria Johansson"]
+    # A first name alone scores 2 * 1 / (1 + 2)
+    assert ranked(index, "Peter") == [(0.667, "Peter Parker")]
+    assert ranked(index, "Mary", min_score=0.5) == [(0.667, "Mary Johnson")]
+    assert ranked(index, "Zbigniew") == []
+
+
+def scan_name(client, name):
+    return client.post("/api/validate", json={"name": name, "room": "A"})
+
+
+def attendance(client):
+    return [(r["student_id"], r["ts"]) for r in client.get("/api/attendance").get_json()]
+
+
+def start(make_app):
+    client = make_app().test_client()
+    assert client.post("/api/students/upload?mode=merge", json={"csv": ROSTER_CSV}).status_code == 200
+    client.post("/api/session/start", json={"name": "a", "room": "A"})
+    return client
+
+
+def test_confident_fuzzy_match_is_logged(make_app):
+    client = start(make_app)
+    reply = scan_name(client, "Kathrine Okafor").get_json()
+    assert reply["logged"] is True
+    assert reply["match"]["method"] == "fuzzy"
+    assert round(reply["match"]["score"], 3) == 0.868
+    assert [sid for sid, _ in attendance(client)] == ["T006"]
+
+
+def test_doubtful_match_is_queued_and_logged_once_when_confirmed(make_app):
+    client = start(make_app)
+    reply = scan_name(client, "Katherine's Galaxy S23")
+    assert reply.status_code == 202
+    match = reply.get_json()["pending_match"]
+    assert reply.get_json()["status"] == "pending_confirmation"
+    assert match["candidates"][0]["student_id"] == "T006"
+    # Repeated scans of the same device name wait on the same match
+    assert scan_name(client, "Katherine's Galaxy S23").get_json()["pending_match"]["id"] == match["id"]
+    assert attendance(client) == []
+
+    confirmed = client.post(f"/api/matches/{match['id']}/confirm")
+    assert confirmed.status_code == 200
+    assert confirmed.get_json()["logged"] is True
+    assert attendance(client) == [("T006", match["ts"])]
+
+    again = client.post(f"/api/matches/{match['id']}/confirm")
+    assert again.status_code == 409
+    assert attendance(client) == [("T006", match["ts"])]
+    assert client.post(f"/api/matches/{match['id']}/reject").status_code == 409
+    # Later scans of the device name follow the decision, without a second row
+    later = scan_name(client, "Katherine's Galaxy S23").get_json()
+    assert later["logged"] is False
+    assert attendance(client) == [("T006", match["ts"])]
+
+
+def test_rejected_match_logs_nothing(make_app):
+    client = start(make_app)
+    match = scan_name(client, "Peter's Pixel").get_json()["pending_match"]
+    rejected = client.post(f"/api/matches/{match['id']}/reject")
+    assert rejected.status_code == 200
+    assert rejected.get_json()["match"]["status"] == "rejected"
+    assert client.post(f"/api/matches/{match['id']}/reject").status_code == 409
+    assert client.post(f"/api/matches/{match['id']}/confirm").status_code == 409
+    assert attendance(client) == []
+    assert client.get("/api/matches").get_json()["matches"] == []
+    assert [m["id"] for m in client.get("/api/matches?status=rejected").get_json()["matches"]] == [match["id"]]
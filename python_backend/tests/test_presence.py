@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+import app as app_module
+from conftest import STUDENTS
+from presence import PresenceTracker
+
+PRESENCE = {"PRESENCE_GAP_SECONDS": 60, "PRESENCE_FLUSH_SECONDS": 0}
+
+
+def at(start, seconds):
+    return (start + timedelta(seconds=seconds)).isoformat(timespec="seconds")
+
+
+def batch(client, student, start, offsets):
+    sightings = [{"mac_address": student["MAC"], "timestamp": at(start, s)} for s in offsets]
+    return client.post("/api/validate/batch", json={"room": "A", "sightings": sightings}).get_json()["results"]
+
+
+def test_tracking_is_off_by_default(make_app):
+    client = make_app().test_client()
+    client.post("/api/session/start", json={"name": "a", "room": "A"})
+    assert client.post("/api/validate", json={"mac_address": STUDENTS[0]["MAC"], "room": "A"}).get_json()["logged"]
+    assert app_module.presence is None
+    assert client.get("/api/attendance").get_json()[0]["dwell_seconds"] is None
+
+
+def test_tracker_merges_sightings_within_the_gap():
+    tracker = PresenceTracker(connect=None, gap_seconds=60, flush_interval=0)
+    start = datetime(2024, 3, 1, 9, 0, 0)
+    assert tracker.observe(1, "S0001", at(start, 0)) == 0
+    assert tracker.observe(1, "S0001", at(start, 50)) == 50
+    assert tracker.observe(1, "S0001", at(start, 150)) == 50      # 100 s later: a new interval
+    assert tracker.observe(1, "S0001", at(start, 180)) == 80
+    assert tracker.observe(1, "S0001", at(start, 100)) == 180     # out of order: bridges both
+    assert tracker.first_seen(1, "S0001") == at(start, 0)
+    assert tracker.observe(2, "S0001", at(start, 0)) == 0         # per session
+
+
+def test_intervals_and_dwell_seconds_are_stored_when_the_session_ends(make_app):
+    client = make_app(PRESENCE).test_client()
+    client.post("/api/session/start", json={"name": "a", "room": "A"})
+    start = datetime.now().replace(microsecond=0)
+    results = batch(client, STUDENTS[0], start, [0, 30, 50, 200, 220])
+    assert [r["status"] for r in results] == ["logged"] + ["duplicate"] * 4
+
+    assert client.post("/api/session/end", json={"room": "A"}).status_code == 200
+    with app_module.db_pool.connect() as con:
+        intervals = [tuple(r) for r in con.execute(
+            "SELECT start_ts, end_ts FROM presence_intervals WHERE student_id = ? ORDER BY start_ts", ("S0001",))]
+    assert intervals == [(at(start, 0), at(start, 50)), (at(start, 200), at(start, 220))]
+    assert client.get("/api/attendance").get_json()[0]["dwell_seconds"] == 70
+
+
+def test_min_dwell_defers_logging_until_the_student_was_seen_long_enough(make_app):
+    client = make_app({**PRESENCE, "PRESENCE_MIN_DWELL_SECONDS": 30}).test_client()
+    client.post("/api/session/start", json={"name": "a", "room": "A"})
+
+    reply = client.post("/api/validate", json={"mac_address": STUDENTS[1]["MAC"], "room": "A"}).get_json()
+    assert (reply["logged"], reply["reason"]) == (False, "dwell_pending")
+    assert (reply["dwell_seconds"], reply["min_dwell_seconds"]) == (0, 30)
+
+    start = datetime.now().replace(microsecond=0)
+    results = batch(client, STUDENTS[0], start, [0, 10, 40])
+    assert [r["status"] for r in results] == ["dwell_pending", "dwell_pending", "logged"]
+    assert results[1]["dwell_seconds"] == 10
+    # Logged at the time the student was first seen
+    assert results[2]["timestamp"] == at(start, 0)
+    assert [r["ts"] for r in client.get("/api/attendance").get_json()] == [at(start, 0)]
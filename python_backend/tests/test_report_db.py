@@ -0,0 +1,94 @@
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import pytest
+
+import app as app_module
+import schema
+import snapshots
+from conftest import STUDENTS
+from report_db import ReportSnapshot
+
+
+@pytest.fixture
+def live(tmp_path):
+    path = str(tmp_path / "live.db")
+    con = sqlite3.connect(path)
+    schema.ensure_schema(con)
+    yield con, lambda: sqlite3.connect(path, check_same_thread=False)
+    con.close()
+
+
+def test_copy_is_due_when_missing_old_or_behind_on_closed_sessions(live, tmp_path):
+    con, connect = live
+    snap = ReportSnapshot(connect, str(tmp_path / "reports.db"), interval=0)   # no refresh thread
+    snap.interval = 3600
+    try:
+        assert snap.as_of() is None and snap.connect() is None
+        assert snap.due()
+        snap.refresh()
+        assert not snap.due()
+
+        with con:  # a session starts: not worth a copy
+            con.execute("INSERT INTO sessions (name, start_ts, room) VALUES ('a', '2024-03-01T09:00:00', '')")
+        assert not snap.due()
+        with con:  # and closes
+            con.execute("UPDATE sessions SET end_ts = '2024-03-01T10:00:00' WHERE id = 1")
+            snapshots.freeze_session(con, 1)
+        assert snap.due()
+        snap.refresh()
+        assert not snap.due()
+        assert snap.connect().execute("SELECT end_ts FROM sessions").fetchone()[0] == "2024-03-01T10:00:00"
+
+        with con:  # a closed session refrozen by a late sync
+            snapshots.refreeze_session(con, 1)
+        assert snap.due()
+        snap.refresh()
+
+        old = time.time() - 2 * 3600
+        os.utime(snap.path, (old, old))
+        assert snap.due()
+        assert snap.status()["refreshes"] == 3
+    finally:
+        snap.close()
+
+
+def closed_session(client, student):
+    client.post("/api/session/start", json={"name": "a", "room": "A"})
+    assert client.post("/api/validate", json={"mac_address": student["MAC"], "room": "A"}).get_json()["logged"]
+    client.post("/api/session/end", json={"room": "A"})
+
+
+def test_reports_read_the_copy_and_say_how_old_it_is(make_app):
+    client = make_app({"REPORT_SNAPSHOT_SECONDS": 3600}).test_client()
+    snap = app_module.report_snapshot
+    snap.close()  # stop the refresh thread; refreshes below are explicit
+    snap.refresh()
+    closed_session(client, STUDENTS[0])
+
+    stale = client.get("/api/reports/students")
+    assert stale.headers["X-Data-Source"] == "snapshot"
+    assert stale.headers["X-Data-As-Of"] == datetime.fromtimestamp(snap.as_of()).isoformat(timespec="seconds")
+    assert float(stale.headers["X-Data-Age-Seconds"]) >= 0
+    assert stale.get_json()["total_sessions"] == 0
+
+    fresh = client.get("/api/reports/students?live=1")
+    assert fresh.headers["X-Data-Source"] == "live"
+    assert fresh.headers["X-Data-Age-Seconds"] == "0.0"
+    assert fresh.get_json()["total_sessions"] == 1
+
+    assert snap.due()
+    snap.refresh()
+    assert client.get("/api/reports/students").get_json()["total_sessions"] == 1
+
+
+def test_without_reporting_mode_reports_read_the_live_database(make_app):
+    client = make_app().test_client()
+    closed_session(client, STUDENTS[0])
+    reply = client.get("/api/reports/students")
+    assert reply.headers["X-Data-Source"] == "live"
+    assert reply.get_json()["total_sessions"] == 1
+    # Endpoints that are not reports carry no staleness headers
+    assert "X-Data-Source" not in client.get("/api/sessions").headers
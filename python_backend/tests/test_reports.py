@@ -0,0 +1,49 @@
+import app as app_module
+from conftest import STUDENTS
+
+
+def scan(client, student, room):
+    assert client.post("/api/validate", json={"mac_address": student["MAC"], "room": room}).get_json()["logged"]
+
+
+def test_student_report_counts_closed_sessions_in_the_students_rooms(make_app):
+    client = make_app().test_client()
+    for _ in range(2):
+        client.post("/api/session/start", json={"name": "a", "room": "A"})
+        scan(client, STUDENTS[0], "A")
+        client.post("/api/session/end", json={"room": "A"})
+    client.post("/api/session/start", json={"name": "b", "room": "B"})
+    scan(client, STUDENTS[1], "B")
+    client.post("/api/session/end", json={"room": "B"})
+    client.post("/api/session/start", json={"name": "open", "room": "A"})
+    scan(client, STUDENTS[2], "A")
+
+    report = client.get("/api/reports/students").get_json()
+    assert report["total_sessions"] == 3
+    by_id = {s["student_id"]: s for s in report["students"]}
+    assert (by_id["S0001"]["sessions_attended"], by_id["S0001"]["total_sessions"], by_id["S0001"]["rate"]) == (2, 2, 1.0)
+    assert (by_id["S0002"]["sessions_attended"], by_id["S0002"]["total_sessions"], by_id["S0002"]["rate"]) == (1, 1, 1.0)
+    # Only seen in the open session: nothing counted yet
+    assert (by_id["S0003"]["sessions_attended"], by_id["S0003"]["total_sessions"], by_id["S0003"]["rate"]) == (0, 0, None)
+
+    in_b = client.get("/api/reports/students?room=B").get_json()
+    assert in_b["total_sessions"] == 1
+    assert {s["student_id"]: s["total_sessions"] for s in in_b["students"]}["S0001"] == 0
+
+
+def test_set_report_freezes_a_missing_snapshot_on_the_live_database(make_app):
+    client = make_app({"REPORT_SNAPSHOT_SECONDS": 3600}).test_client()
+    client.post("/api/session/start", json={"name": "a", "room": "A"})
+    scan(client, STUDENTS[0], "A")
+    client.post("/api/session/end", json={"room": "A"})
+    with app_module.db_pool.connect() as con:  # as if closed by an older version of the app
+        con.execute("DELETE FROM session_snapshots")
+    app_module.report_snapshot.refresh()
+
+    # The reporting copy is read-only: the snapshot is written to the live database instead
+    reply = client.get("/api/reports/sets?present=1")
+    assert reply.status_code == 200
+    assert reply.headers["X-Data-Source"] == "snapshot"
+    assert [s["student_id"] for s in reply.get_json()["students"]] == ["S0001"]
+    with app_module.db_pool.connect() as con:
+        assert [r[0] for r in con.execute("SELECT session_id FROM session_snapshots")] == [1]
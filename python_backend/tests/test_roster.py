@@ -0,0 +1,40 @@
+import threading
+
+from roster import RosterIndex
+
+
+def roster(n, tag):
+    return [{"Name": f"{tag} {i}", "Student ID": f"{tag}{i}", "MAC": f"02:00:00:00:{i >> 8:02X}:{i & 0xFF:02X}"}
+            for i in range(n)]
+
+
+def test_lookups_and_add():
+    index = RosterIndex(roster(3, "A"), version=1)
+    assert index.match(mac="02-00-00-00-00-01")["Student ID"] == "A1"
+    assert index.match(name="  a   2 ")["Student ID"] == "A2"
+    index.add({"Name": "Bea Quinn", "Student ID": "B1", "MAC": ""}, version=2)
+    assert (len(index), index.version, index.get_by_id("B1")["Name"]) == (4, 2, "Bea Quinn")
+    assert index.search_name("Bea's iPhone")[0][1]["Student ID"] == "B1"
+
+
+def test_readers_never_see_a_mix_of_two_rosters():
+    index = RosterIndex(roster(500, "A"), version=1)
+    rosters = [(roster(500, "A"), 1), (roster(800, "B"), 2)]
+    stop = threading.Event()
+    mixed = []
+
+    def read():
+        while not stop.is_set():
+            snap = index.snapshot
+            tag = "A" if snap.version == 1 else "B"
+            if len(snap.students) != len(snap.by_id) or any(
+                    not s["Student ID"].startswith(tag) for s in snap.by_mac.values()):
+                mixed.append(snap.version)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    for i in range(50):
+        index.rebuild(*rosters[i % 2])
+    stop.set()
+    reader.join()
+    assert mixed == []
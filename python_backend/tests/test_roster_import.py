@@ -0,0 +1,83 @@
+import io
+
+import app as app_module
+from conftest import STUDENTS
+
+
+def class_list(*rows, header="Name,Student ID,MAC"):
+    return "\n".join([header, *(",".join(r) for r in rows)]) + "\n"
+
+
+def upload(client, csv_text, query=""):
+    return client.post(f"/api/students/upload{query}", json={"csv": csv_text})
+
+
+def roster(client):
+    return {s["Student ID"]: (s["Name"], s["MAC"]) for s in client.get("/api/students").get_json()}
+
+
+# The five students of the fixture, with Student 2 renamed, Student 5 dropped and one new
+UPLOAD = class_list(
+    *[(s["Name"], s["Student ID"], s["MAC"]) for s in STUDENTS[:4] if s is not STUDENTS[1]],
+    ("Student Two", "S0002", STUDENTS[1]["MAC"]),
+    ("Student 6", "S0006", "02:00:00:00:00:06"),
+)
+
+
+def test_replace_reports_and_applies_the_diff(make_app):
+    client = make_app().test_client()
+    reply = upload(client, UPLOAD)
+    assert reply.status_code == 200
+    report = reply.get_json()
+    assert (report["inserted"], report["updated"], report["deleted"], report["unchanged"]) == (1, 1, 1, 3)
+    assert report["samples"] == {"inserted": ["S0006"], "updated": ["S0002"], "deleted": ["S0005"]}
+    assert report["message"] == "Applied 5 students: 1 added, 1 updated, 1 removed"
+    students = roster(client)
+    assert sorted(students) == ["S0001", "S0002", "S0003", "S0004", "S0006"]
+    assert students["S0002"][0] == "Student Two"
+
+    # The same file again changes nothing, and does not bump the roster version
+    again = upload(client, UPLOAD).get_json()
+    assert (again["inserted"], again["updated"], again["deleted"], again["unchanged"]) == (0, 0, 0, 5)
+    assert again["version"] == report["version"]
+
+
+def test_dry_run_reports_without_applying(make_app):
+    client = make_app().test_client()
+    before = roster(client)
+    report = upload(client, UPLOAD, "?dry_run=1").get_json()
+    assert report["dry_run"] is True
+    assert (report["inserted"], report["updated"], report["deleted"]) == (1, 1, 1)
+    assert report["message"].startswith("Would apply 5 students")
+    assert roster(client) == before
+
+
+def test_merge_keeps_students_missing_from_the_file(make_app):
+    client = make_app().test_client()
+    report = upload(client, UPLOAD, "?mode=merge").get_json()
+    assert (report["inserted"], report["updated"], report["deleted"]) == (1, 1, 0)
+    assert sorted(roster(client)) == ["S0001", "S0002", "S0003", "S0004", "S0005", "S0006"]
+
+
+def test_multipart_upload_with_first_and_last_name_columns(make_app):
+    client = make_app().test_client()
+    text = class_list(("Ada", "Lovelace", "S0001", ""), header="First Name,Last Name,Student ID,MAC")
+    reply = client.post("/api/students/upload?mode=merge",
+                        data={"file": (io.BytesIO(text.encode("utf-8-sig")), "list.csv")})
+    assert reply.get_json()["updated"] == 1
+    assert roster(client)["S0001"] == ("Ada Lovelace", "")
+
+
+def test_replace_with_no_students_leaves_the_roster_alone(make_app):
+    client = make_app().test_client()
+    before = roster(client)
+    version = app_module.class_list.version
+    for text in (class_list(), class_list(("Someone", "X1"), header="Full Title,Code")):
+        for query in ("", "?dry_run=1"):
+            reply = upload(client, text, query)
+            assert reply.status_code == 400
+            assert "No students found" in reply.get_json()["error"]
+    assert roster(client) == before
+    assert app_module.class_list.version == version
+    # Merging nothing is harmless
+    assert upload(client, class_list(), "?mode=merge").get_json()["deleted"] == 0
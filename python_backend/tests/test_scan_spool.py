@@ -0,0 +1,94 @@
+import os
+import threading
+
+import pytest
+
+import scan_spool
+from scan_spool import Spool
+
+
+def test_compact_keeps_concurrent_appends(tmp_path):
+    path = str(tmp_path / "spool.jsonl")
+    capture, syncer = Spool(path, "s1"), Spool(path, "s1")
+    done = threading.Event()
+
+    def append():
+        for i in range(300):
+            capture.append([{"mac_address": f"02:00:00:00:{i >> 8:02X}:{i & 0xFF:02X}"}])
+        done.set()
+
+    thread = threading.Thread(target=append)
+    thread.start()
+    while not done.is_set():
+        syncer.compact(0)
+    thread.join()
+    assert [e["seq"] for e in Spool(path).events()] == list(range(1, 301))
+
+
+def test_spools_sharing_a_file_keep_one_sequence(tmp_path):
+    path = str(tmp_path / "spool.jsonl")
+    capture, syncer = Spool(path, "s1"), Spool(path, "s1")
+    capture.append([{"mac_address": "02:00:00:00:00:01"}] * 3)
+    syncer.set_watermark(2)  # must not write back the next_seq it read before the append
+    capture.append([{"mac_address": "02:00:00:00:00:02"}])
+    Spool(path).append([{"mac_address": "02:00:00:00:00:03"}])
+    assert [e["seq"] for e in Spool(path).events()] == [1, 2, 3, 4, 5]
+    assert Spool(path).state["watermark"] == 2
+
+
+class StubServer:
+    """POST /api/sync that applies each event id once and reports a high watermark."""
+
+    def __init__(self, watermark=0):
+        self.watermark = watermark
+        self.applied = set()
+
+    def __call__(self, method, url, body=None, timeout=60):
+        if method == "GET":
+            return {"watermark": self.watermark}
+        counts = {"logged": 0, "replayed": 0}
+        results = []
+        for e in body["events"]:
+            replayed = e["event_id"] in self.applied
+            self.applied.add(e["event_id"])
+            counts["replayed" if replayed else "logged"] += 1
+            results.append({"event_id": e["event_id"], "replayed": replayed})
+        self.watermark = max([self.watermark] + [e["seq"] for e in body["events"]])
+        return {"watermark": self.watermark, "counts": counts, "results": results}
+
+
+def test_sync_sends_events_below_a_higher_server_watermark(tmp_path, monkeypatch):
+    # A new spool (another directory, or the state file lost) under a scanner id the
+    # server already holds up to seq 6000
+    server = StubServer(watermark=6000)
+    monkeypatch.setattr(scan_spool, "call", server)
+    spool = Spool(str(tmp_path / "spool.jsonl"), "hall-b")
+    spool.append([{"mac_address": "02:00:00:00:00:01"}, {"mac_address": "02:00:00:00:00:02"}])
+
+    totals = scan_spool.sync(spool, "http://server", batch=1)
+    assert (totals["sent"], totals["requests"], totals["logged"]) == (2, 2, 2)
+    assert len(server.applied) == 2
+    assert list(spool.events()) == []
+
+    # Resending after a lost state file is harmless
+    spool.append([{"mac_address": "02:00:00:00:00:03"}])
+    os.remove(spool.state_path)
+    again = Spool(spool.path, "hall-b")
+    assert again.state["next_seq"] == 4
+    assert scan_spool.sync(again, "http://server")["logged"] == 1
+
+
+def test_sync_keeps_events_the_server_did_not_answer(tmp_path, monkeypatch):
+    server = StubServer()
+
+    def failing(method, url, body=None, timeout=60):
+        if len(server.applied) >= 2:
+            raise OSError("connection reset")
+        return server(method, url, body, timeout)
+
+    monkeypatch.setattr(scan_spool, "call", failing)
+    spool = Spool(str(tmp_path / "spool.jsonl"), "hall-b")
+    spool.append([{"mac_address": f"02:00:00:00:00:0{i}"} for i in range(1, 5)])
+    with pytest.raises(OSError):
+        scan_spool.sync(spool, "http://server", batch=2)
+    assert [e["seq"] for e in spool.events(after=spool.state["watermark"])] == [3, 4]
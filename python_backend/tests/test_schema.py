@@ -0,0 +1,76 @@
+import sqlite3
+
+import pytest
+
+import schema
+from app import INSERT_ATTENDANCE_SQL
+
+
+@pytest.fixture
+def old_db(tmp_path):
+    """A database as the first version of the app left it (user_version 0): no room or
+    day columns, no dedup indexes, duplicate logs and two open sessions."""
+    con = sqlite3.connect(str(tmp_path / "old.db"))
+    con.executescript(
+        """
+        CREATE TABLE sessions (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, start_ts TEXT NOT NULL, end_ts TEXT);
+        CREATE TABLE attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, student_id TEXT NOT NULL, name TEXT NOT NULL, mac TEXT,
+            ts TEXT NOT NULL, session_id INTEGER, FOREIGN KEY(session_id) REFERENCES sessions(id)
+        );
+        INSERT INTO sessions (name, start_ts, end_ts) VALUES
+            ('closed', '2024-03-01T09:00:00', '2024-03-01T10:00:00'),
+            ('stray', '2024-03-02T09:00:00', NULL),
+            ('open', '2024-03-03T09:00:00', NULL);
+        INSERT INTO attendance (student_id, name, mac, ts, session_id) VALUES
+            ('S1', 'A', '', '2024-03-01T09:05:00', 1),
+            ('S1', 'A', '', '2024-03-01T09:06:00', 1),
+            ('S2', 'B', '', '2024-03-01T09:07:00', 1),
+            ('S1', 'A', '', '2024-03-04T09:00:00', NULL),
+            ('S1', 'A', '', '2024-03-04T15:00:00', NULL),
+            ('S1', 'A', '', '2024-03-05T09:00:00', NULL);
+        """
+    )
+    yield con
+    con.close()
+
+
+def test_migration_quarantines_duplicates_and_steps_user_version(old_db):
+    assert schema.user_version(old_db) == 0
+    report = schema.ensure_schema(old_db)
+    assert report == {"backfilled_days": 6, "quarantined_duplicates": 2, "frozen_sessions": 2}
+    assert schema.user_version(old_db) == schema.SCHEMA_VERSION
+
+    # The first log of each student per session / day stays; later ones are moved aside
+    assert [r[0] for r in old_db.execute("SELECT id FROM attendance ORDER BY id")] == [1, 3, 4, 6]
+    assert [r[0] for r in old_db.execute("SELECT id FROM attendance_duplicates ORDER BY id")] == [2, 5]
+    assert old_db.execute("SELECT day FROM attendance WHERE id = 4").fetchone()[0] == "2024-03-04"
+    # The stray open session is closed when the next one started
+    assert old_db.execute("SELECT id, end_ts FROM sessions WHERE id = 2").fetchone() == (2, "2024-03-03T09:00:00")
+    assert [r[0] for r in old_db.execute("SELECT id FROM sessions WHERE end_ts IS NULL")] == [3]
+    assert old_db.execute("SELECT present FROM session_stats WHERE session_id = 1").fetchone()[0] == 2
+    assert old_db.execute("SELECT present FROM session_snapshots WHERE session_id = 1").fetchone()[0] == 2
+
+    # Up to date: nothing runs. A file left behind at an older version migrates again, idempotently
+    assert schema.ensure_schema(old_db) is None
+    old_db.execute("PRAGMA user_version = 3")
+    assert schema.ensure_schema(old_db) == {"backfilled_days": 0, "quarantined_duplicates": 0, "frozen_sessions": 0}
+    assert schema.user_version(old_db) == schema.SCHEMA_VERSION
+    assert old_db.execute("SELECT COUNT(*) FROM attendance_duplicates").fetchone()[0] == 2
+
+
+def test_insert_on_conflict_do_nothing_under_the_dedup_indexes(old_db):
+    schema.ensure_schema(old_db)
+
+    def insert(student_id, ts, session_id):
+        with old_db:
+            return old_db.execute(INSERT_ATTENDANCE_SQL, (student_id, "A", "", ts, ts[:10], session_id)).rowcount
+
+    assert insert("S1", "2024-03-03T09:10:00", 3) == 1
+    assert insert("S1", "2024-03-03T09:20:00", 3) == 0      # same session
+    assert insert("S2", "2024-03-03T09:20:00", 3) == 1
+    assert insert("S1", "2024-03-03T18:00:00", None) == 1   # day mode is its own scope
+    assert insert("S1", "2024-03-03T19:00:00", None) == 0   # same day
+    assert insert("S1", "2024-03-06T09:00:00", None) == 1
+    assert old_db.execute("SELECT COUNT(*) FROM attendance").fetchone()[0] == 8
+    assert old_db.execute("SELECT present FROM session_stats WHERE session_id = 3").fetchone()[0] == 2
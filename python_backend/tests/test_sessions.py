@@ -0,0 +1,33 @@
+import threading
+import time
+
+import app as app_module
+
+
+def test_concurrent_starts_leave_one_open_session(make_app, monkeypatch):
+    flask_app = make_app()
+    flask_app.test_client().post("/api/session/start", json={"name": "first", "room": "A"})
+    close_session = app_module.close_session
+
+    def slow_close_session(con, session_id, now):
+        close_session(con, session_id, now)
+        time.sleep(0.05)  # widen the window between reading the open session and inserting
+
+    monkeypatch.setattr(app_module, "close_session", slow_close_session)
+    barrier = threading.Barrier(4)
+    statuses = []
+
+    def start():
+        client = flask_app.test_client()
+        barrier.wait()
+        statuses.append(client.post("/api/session/start", json={"name": "t", "room": "A"}).status_code)
+
+    threads = [threading.Thread(target=start) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert statuses == [200] * 4
+    with app_module.get_db() as con:
+        assert con.execute("SELECT COUNT(*) FROM sessions WHERE end_ts IS NULL AND room = 'A'").fetchone()[0] == 1
+        assert con.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 5
@@ -0,0 +1,101 @@
+import gzip
+
+import pytest
+
+import static_assets
+
+SCRIPT = "console.log('attendance');\n" * 40
+INDEX = "<!doctype html><title>Attendance</title>" + "<p>hello</p>" * 40
+
+
+@pytest.fixture
+def client(make_app, tmp_path):
+    web = tmp_path / "web"
+    (web / "static" / "js").mkdir(parents=True)
+    (web / "index.html").write_text(INDEX)
+    (web / "static" / "js" / "main.3f2a9c1b.js").write_text(SCRIPT)
+    (web / "small.txt").write_text("tiny")
+    (web / "logo.png").write_bytes(b"\x89PNG" + bytes(range(256)) * 4)
+    return make_app({"WEB_DIR": str(web), "STATIC_ASSET_TABLE": True}).test_client()
+
+
+def get(client, path, encoding=None, etag=None):
+    headers = {}
+    if encoding is not None:
+        headers["Accept-Encoding"] = encoding
+    if etag is not None:
+        headers["If-None-Match"] = etag
+    return client.get(path, headers=headers)
+
+
+@pytest.mark.skipif(static_assets.brotli is None, reason="Brotli not installed")
+def test_brotli_is_preferred_when_accepted(client):
+    reply = get(client, "/static/js/main.3f2a9c1b.js", "gzip, deflate, br")
+    assert reply.headers["Content-Encoding"] == "br"
+    assert static_assets.brotli.decompress(reply.get_data()).decode() == SCRIPT
+    # A lower quality for br lets gzip win
+    assert get(client, "/static/js/main.3f2a9c1b.js", "br;q=0.5, gzip").headers["Content-Encoding"] == "gzip"
+
+
+def test_encoding_negotiation(client):
+    path = "/static/js/main.3f2a9c1b.js"
+    gz = get(client, path, "gzip")
+    assert gz.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(gz.get_data()).decode() == SCRIPT
+    for accept in (None, "identity", "gzip;q=0"):
+        plain = get(client, path, accept)
+        assert "Content-Encoding" not in plain.headers
+        assert plain.get_data(as_text=True) == SCRIPT
+    assert gz.headers["Vary"] == plain.headers["Vary"] == "Accept-Encoding"
+    assert gz.headers["Content-Type"].endswith("javascript; charset=utf-8")
+
+
+def test_small_and_binary_files_are_sent_as_they_are(client):
+    for path in ("/small.txt", "/logo.png"):
+        reply = get(client, path, "gzip, br")
+        assert reply.status_code == 200
+        assert "Content-Encoding" not in reply.headers
+        assert "Vary" not in reply.headers
+
+
+def test_etags_per_variant_and_304(client):
+    path = "/static/js/main.3f2a9c1b.js"
+    plain, gz = get(client, path, "identity"), get(client, path, "gzip")
+    assert plain.headers["ETag"] != gz.headers["ETag"]
+
+    not_modified = get(client, path, "gzip", etag=gz.headers["ETag"])
+    assert not_modified.status_code == 304
+    assert not_modified.get_data() == b""
+    assert not_modified.headers["ETag"] == gz.headers["ETag"]
+    # The identity ETag does not validate the gzip variant
+    assert get(client, path, "gzip", etag=plain.headers["ETag"]).status_code == 200
+
+
+def test_hashed_names_are_immutable_and_the_rest_revalidate(client):
+    hashed = get(client, "/static/js/main.3f2a9c1b.js")
+    assert hashed.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    for path in ("/", "/small.txt", "/some/client/route"):
+        reply = get(client, path)
+        assert reply.status_code == 200
+        assert reply.headers["Cache-Control"] == "no-cache"
+    # Client-side routes get index.html
+    assert get(client, "/some/client/route").get_data(as_text=True) == INDEX
+    assert get(client, "/api/nope").status_code == 404
+
+
+def test_hashed_name_detection():
+    assert static_assets.is_hashed_name("main.3f2a9c1b.js")
+    assert static_assets.is_hashed_name("787.a1b2c3d4.chunk.css")
+    assert static_assets.is_hashed_name("logo-9f8e7d6c.svg")
+    assert not static_assets.is_hashed_name("index.html")
+    assert not static_assets.is_hashed_name("app.deadbeef.js")      # no digit: a word, not a hash
+    assert not static_assets.is_hashed_name("app.1234.js")          # too short
+
+
+def test_build_time_variants_are_used_and_not_served_as_files(tmp_path):
+    (tmp_path / "app.js").write_text(SCRIPT)
+    prebuilt = gzip.compress(SCRIPT.encode(), mtime=0)
+    (tmp_path / "app.js.gz").write_bytes(prebuilt)
+    table = static_assets.AssetTable(str(tmp_path))
+    assert list(table.assets) == ["app.js"]
+    assert table.get("app.js").variants["gzip"][0] == prebuilt
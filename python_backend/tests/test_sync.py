@@ -0,0 +1,68 @@
+import app as app_module
+import snapshots
+from conftest import STUDENTS
+
+
+def event(event_id, seq, student, captured_at="2025-03-03T09:15:00", **extra):
+    return {"event_id": event_id, "seq": seq, "captured_at": captured_at, "mac_address": student["MAC"], **extra}
+
+
+def closed_session(room="Hall B", start="2025-03-03T09:00:00", end="2025-03-03T10:00:00"):
+    """A lecture that ended before the scanner synced, frozen like end_active_session does."""
+    with app_module.get_db() as con:
+        session_id = con.execute("INSERT INTO sessions (name, start_ts, end_ts, room) VALUES ('past', ?, ?, ?)",
+                                 (start, end, room)).lastrowid
+        snapshots.freeze_session(con, session_id)
+    return session_id
+
+
+def present(session_id):
+    with app_module.get_db() as con:
+        return con.execute("SELECT present FROM session_snapshots WHERE session_id = ?", (session_id,)).fetchone()[0]
+
+
+def test_replayed_event_ids_change_nothing(make_app):
+    client = make_app().test_client()
+    body = {"scanner": "s1", "events": [event("e1", 1, STUDENTS[0]), event("e1", 1, STUDENTS[0]),
+                                        event("e2", 2, STUDENTS[1])]}
+    first = client.post("/api/sync", json=body).get_json()
+    assert [(r["status"], r["replayed"]) for r in first["results"]] == [("logged", False), ("logged", True),
+                                                                         ("logged", False)]
+    again = client.post("/api/sync", json=body).get_json()
+    assert again["counts"]["replayed"] == 3
+    with app_module.get_db() as con:
+        assert con.execute("SELECT COUNT(*) FROM attendance").fetchone()[0] == 2
+        assert con.execute("SELECT COUNT(*) FROM scan_events").fetchone()[0] == 2
+
+
+def test_capture_in_a_closed_session_is_logged_there_and_refrozen(make_app):
+    client = make_app().test_client()
+    session_id = closed_session()
+    assert present(session_id) == 0
+    res = client.post("/api/sync", json={"scanner": "s1", "room": "Hall B", "events": [
+        event("e1", 1, STUDENTS[0]),
+        event("e2", 2, STUDENTS[1], captured_at="2025-03-03T10:30:00"),  # after the lecture: day scope
+    ]}).get_json()
+    assert [(r["status"], r["session_id"]) for r in res["results"]] == [("logged", session_id), ("logged", None)]
+    assert present(session_id) == 1
+    assert app_module.snapshot_store.bitmaps(app_module.get_db(), [session_id])[session_id] != 0
+
+
+def test_unparseable_capture_time_is_invalid(make_app):
+    client = make_app().test_client()
+    res = client.post("/api/sync", json={"scanner": "s1", "events": [
+        event("e1", 1, STUDENTS[0], captured_at="yesterday at nine"),
+        {"event_id": "e2", "seq": 2, "mac_address": STUDENTS[1]["MAC"]},
+    ]}).get_json()
+    assert [r["status"] for r in res["results"]] == ["invalid", "invalid"]
+    with app_module.get_db() as con:
+        assert con.execute("SELECT COUNT(*) FROM scan_events").fetchone()[0] == 0
+
+
+def test_watermark_only_moves_forward(make_app):
+    client = make_app().test_client()
+    later = {"scanner": "s1", "events": [event("e3", 3, STUDENTS[2]), event("e4", 4, STUDENTS[3])]}
+    earlier = {"scanner": "s1", "events": [event("e1", 1, STUDENTS[0]), event("e2", 2, STUDENTS[1])]}
+    assert client.post("/api/sync", json=later).get_json()["watermark"] == 4
+    assert client.post("/api/sync", json=earlier).get_json()["watermark"] == 4
+    assert client.get("/api/sync/s1").get_json()["watermark"] == 4
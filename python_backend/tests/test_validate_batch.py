@@ -0,0 +1,76 @@
+import app as app_module
+from conftest import STUDENTS
+
+
+def post(client, sightings, room="A"):
+    return client.post("/api/validate/batch", json={"room": room, "sightings": sightings})
+
+
+def test_outcome_per_sighting_in_a_session(make_app):
+    client = make_app().test_client()
+    client.post("/api/session/start", json={"name": "a", "room": "A"})
+    assert client.post("/api/validate", json={"mac_address": STUDENTS[2]["MAC"], "room": "A"}).get_json()["logged"]
+
+    reply = post(client, [
+        {"mac_address": STUDENTS[0]["MAC"]},
+        {"device_id": STUDENTS[1]["MAC"]},
+        {"mac_address": STUDENTS[0]["MAC"]},             # again in this batch
+        {"mac_address": STUDENTS[2]["MAC"]},             # already logged before the batch
+        {"name": STUDENTS[3]["Name"]},                   # matched by name
+        {"mac_address": "02:ff:ff:ff:ff:ff"},
+        "not an object",
+        {"mac_address": STUDENTS[4]["MAC"], "timestamp": "yesterday"},
+    ])
+    assert reply.status_code == 200
+    body = reply.get_json()
+    assert body["scope"] == "session"
+    assert [(r["index"], r["status"]) for r in body["results"]] == [
+        (0, "logged"), (1, "logged"), (2, "duplicate"), (3, "duplicate"), (4, "logged"),
+        (5, "unknown"), (6, "invalid"), (7, "invalid"),
+    ]
+    assert body["results"][2]["reason"] == body["results"][3]["reason"] == "already_logged_in_session"
+    assert body["counts"] == {"logged": 3, "duplicate": 2, "dwell_pending": 0, "unknown": 1, "invalid": 2}
+    rows = client.get("/api/attendance").get_json()
+    assert sorted(r["student_id"] for r in rows) == ["S0001", "S0002", "S0003", "S0004"]
+
+    # The whole batch again: every student is now a duplicate
+    again = post(client, [{"mac_address": s["MAC"]} for s in STUDENTS[:4]]).get_json()
+    assert again["counts"]["duplicate"] == 4
+    assert len(client.get("/api/attendance").get_json()) == 4
+
+
+def test_day_mode_deduplicates_per_day_of_the_sighting(make_app):
+    client = make_app().test_client()
+    mac = STUDENTS[0]["MAC"]
+    body = post(client, [
+        {"mac_address": mac, "timestamp": "2024-03-01T09:00:00"},
+        {"mac_address": mac, "timestamp": "2024-03-01T15:00:00"},
+        {"mac_address": mac, "timestamp": "2024-03-02T09:00:00"},
+    ], room="").get_json()
+    assert body["scope"] == "day"
+    assert [r["status"] for r in body["results"]] == ["logged", "duplicate", "logged"]
+    assert body["results"][1]["reason"] == "already_logged_today"
+    assert post(client, [{"mac_address": mac, "timestamp": "2024-03-02T10:00:00"}], room="").get_json()[
+        "results"][0]["status"] == "duplicate"
+
+
+def test_batch_limits(make_app, monkeypatch):
+    client = make_app().test_client()
+    monkeypatch.setattr(app_module, "BATCH_MAX_SIGHTINGS", 3)
+    too_many = post(client, [{"mac_address": s["MAC"]} for s in STUDENTS[:4]])
+    assert too_many.status_code == 413
+    assert post(client, [{"mac_address": s["MAC"]} for s in STUDENTS[:3]]).status_code == 200
+    assert client.post("/api/validate/batch", json={"sightings": "nope"}).status_code == 400
+    assert client.post("/api/validate/batch", json={}).status_code == 400
+
+
+def test_macs_are_stored_in_canonical_form(make_app):
+    client = make_app().test_client()
+    # 02:00:00:00:00:0N in the notations scanners send
+    assert client.post("/api/validate", json={"mac_address": " 02-00-00-00-00-01 "}).get_json()["logged"]
+    post(client, [{"mac_address": "020000000002"}, {"device_id": "0200.0000.0003"}], room="")
+    client.post("/api/sync", json={"scanner": "s1", "events": [
+        {"event_id": "e1", "seq": 1, "captured_at": "2024-03-01T09:00:00", "mac_address": "02:00:00:00:00:04"},
+    ]})
+    macs = {r["student_id"]: r["mac"] for r in client.get("/api/attendance").get_json()}
+    assert macs == {s["Student ID"]: s["MAC"] for s in STUDENTS[:4]}
@@ -0,0 +1,90 @@
+import sqlite3
+
+import pytest
+
+import app as app_module
+from conftest import STUDENTS
+from write_behind import PresentSet, WriteBehindQueue
+
+
+def stored_rows(session_id=None):
+    with app_module.get_db() as con:
+        if session_id is None:
+            return con.execute("SELECT COUNT(*) FROM attendance").fetchone()[0]
+        return con.execute("SELECT COUNT(*) FROM attendance WHERE session_id = ?", (session_id,)).fetchone()[0]
+
+
+def test_present_set_loads_scope_once_and_dedupes(tmp_path):
+    con = sqlite3.connect(tmp_path / "t.db")
+    con.execute("CREATE TABLE attendance (student_id TEXT, day TEXT, session_id INTEGER)")
+    con.execute("INSERT INTO attendance VALUES ('S1', '2025-01-06', 7)")
+    loads = []
+    present = PresentSet(before_load=lambda: loads.append(1))
+
+    assert not present.claim(con, ("session", 7), "S1")   # already in the database
+    assert present.claim(con, ("session", 7), "S2")
+    assert not present.claim(con, ("session", 7), "S2")
+    assert present.claim(con, ("day", "2025-01-06"), "S1")  # other scope
+    assert len(loads) == 2
+
+    assert present.claim_loaded(("session", 8), "S1")  # not loaded: the caller's insert decides
+    assert not present.claim_loaded(("session", 7), "S2")
+    assert present.claim_loaded(("session", 7), "S3")
+
+
+def test_repeated_scans_log_once(make_app):
+    client = make_app({"WRITE_BEHIND": "sync"}).test_client()
+    session_id = client.post("/api/session/start", json={"name": "t"}).get_json()["active_session"]["id"]
+    mac = STUDENTS[0]["MAC"]
+    first = client.post("/api/validate", json={"mac_address": mac}).get_json()
+    second = client.post("/api/validate", json={"mac_address": mac}).get_json()
+    assert first["logged"] and not second["logged"]
+    assert stored_rows(session_id) == 1
+
+
+def test_session_end_freezes_queued_rows(make_app):
+    # A long flush interval keeps the scans queued until the session ends
+    client = make_app({"WRITE_BEHIND": "on", "WRITE_BEHIND_FLUSH_MS": 60000}).test_client()
+    session_id = client.post("/api/session/start", json={"name": "t"}).get_json()["active_session"]["id"]
+    for s in STUDENTS[:3]:
+        assert client.post("/api/validate", json={"mac_address": s["MAC"]}).get_json()["logged"]
+    assert client.post("/api/session/end", json={}).status_code == 200
+    with app_module.get_db() as con:
+        present = con.execute("SELECT present FROM session_snapshots WHERE session_id = ?",
+                              (session_id,)).fetchone()[0]
+    assert present == 3
+    assert stored_rows(session_id) == 3
+
+
+def test_batch_sees_queued_scans(make_app):
+    client = make_app({"WRITE_BEHIND": "on", "WRITE_BEHIND_FLUSH_MS": 60000}).test_client()
+    session_id = client.post("/api/session/start", json={"name": "t"}).get_json()["active_session"]["id"]
+    assert client.post("/api/validate", json={"mac_address": STUDENTS[0]["MAC"]}).get_json()["logged"]
+    res = client.post("/api/validate/batch", json={"sightings": [
+        {"mac_address": STUDENTS[0]["MAC"]}, {"mac_address": STUDENTS[1]["MAC"]}]}).get_json()
+    assert [r["status"] for r in res["results"]] == ["duplicate", "logged"]
+    # ...and scans after the batch see the batch's rows
+    again = client.post("/api/validate", json={"mac_address": STUDENTS[1]["MAC"]}).get_json()
+    assert not again["logged"]
+    app_module.write_behind.flush()
+    assert stored_rows(session_id) == 2
+
+
+def test_writer_keeps_rows_it_cannot_insert(tmp_path):
+    path = tmp_path / "t.db"
+    with sqlite3.connect(path) as con:
+        con.execute("CREATE TABLE t (x INTEGER NOT NULL)")
+    committed = []
+    queue = WriteBehindQueue(lambda: sqlite3.connect(path, check_same_thread=False),
+                             "INSERT INTO t (x) VALUES (?)", flush_interval=0.5, on_commit=committed.extend)
+    for x in (1, None, 2):
+        queue.submit((x,), x)
+    assert queue.flush(timeout=5)
+    with pytest.raises(RuntimeError, match="failed"):
+        queue.submit((3,), 3)
+    queue.close()
+
+    with sqlite3.connect(path) as con:
+        assert sorted(r[0] for r in con.execute("SELECT x FROM t")) == [1, 2]
+    assert sorted(committed) == [1, 2]
+    assert queue.failed == [((None,), None)]
@@ -0,0 +1,233 @@
+"""Write-behind ingestion: scans are deduplicated in memory and inserted by one writer thread.
+
+With WRITE_BEHIND=on, validate_scan and manual_attendance decide "already logged"
+against PresentSet and hand the insert to WriteBehindQueue, which commits whatever has
+queued up (every flush_interval seconds or max_batch rows) in one transaction. Scans at
+the start of a lecture then share transactions instead of queueing for the SQLite write
+lock one by one. Live-feed events go out after the rows are committed.
+
+The present-set is per worker process. With several workers on one database the UNIQUE
+indexes still keep one row per student and scope, but a worker may answer "logged" for
+a scan another worker stored first.
+"""
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+log = logging.getLogger("attendance.write_behind")
+
+Scope = Tuple[str, Any]  # ("session", session id) or ("day", "YYYY-MM-DD")
+
+_STOP = object()
+
+
+class PresentSet:
+    """Student IDs logged per scope, loaded from the database the first time a scope is used.
+
+    before_load() runs ahead of each load (the queue's flush), so rows still waiting in
+    the queue are in the database when the scope is read.
+    """
+
+    def __init__(self, before_load: Optional[Callable[[], None]] = None):
+        self.before_load = before_load
+        self._lock = threading.Lock()
+        self._scopes: Dict[Scope, Set[str]] = {}
+
+    def _load(self, con, scope: Scope) -> Set[str]:
+        if self.before_load:
+            self.before_load()
+        kind, key = scope
+        if kind == "session":
+            rows = con.execute("SELECT student_id FROM attendance WHERE session_id = ?", (key,))
+        else:
+            rows = con.execute("SELECT student_id FROM attendance WHERE day = ? AND session_id IS NULL", (key,))
+        return {r[0] for r in rows}
+
+    def claim(self, con, scope: Scope, student_id: str) -> bool:
+        """Mark the student present in scope. False if they already were."""
+        with self._lock:
+            present = self._scopes.get(scope)
+            if present is None:
+                if scope[0] == "day":
+                    # A new day: earlier days no longer take scans
+                    for old in [s for s in self._scopes if s[0] == "day"]:
+                        del self._scopes[old]
+                present = self._scopes[scope] = self._load(con, scope)
+            if student_id in present:
+                return False
+            present.add(student_id)
+            return True
+
+    def claim_loaded(self, scope: Scope, student_id: str) -> bool:
+        """claim() for writers that insert the row themselves inside a write transaction
+        (batch uploads, sync, confirmed matches). It never loads a scope, because loading
+        flushes the queue, which would wait on their write lock. Rows are only queued
+        after a claim has loaded their scope, so in a scope not loaded yet the caller's
+        insert decides. False if the student is already present or queued."""
+        with self._lock:
+            present = self._scopes.get(scope)
+            if present is None:
+                return True
+            if student_id in present:
+                return False
+            present.add(student_id)
+            return True
+
+    def forget(self, scope: Scope) -> None:
+        with self._lock:
+            self._scopes.pop(scope, None)
+
+
+class WriteBehindQueue:
+    """Single writer thread that group-commits queued rows.
+
+    submit() returns once the row is queued; flush() waits until everything queued before
+    it is committed; close() flushes and stops the thread. With synchronous=True there is
+    no thread and submit() commits before returning, which keeps tests deterministic.
+    on_commit(payloads) runs after each commit with the payloads of the rows that were
+    actually inserted (the statement's conflict clause may skip some).
+
+    Callers have already answered "logged" for queued rows, so none is dropped quietly.
+    Lock and I/O errors are retried until the batch commits. Any other error re-runs the
+    batch one row per transaction. Rows that still fail are kept in `failed` and the
+    queue is marked failed: later submits raise, so clients see an error rather than a
+    false "logged".
+    """
+
+    def __init__(self, connect: Callable, sql: str, flush_interval: float = 0.005,
+                 max_batch: int = 500, on_commit: Optional[Callable[[List[Any]], None]] = None,
+                 synchronous: bool = False):
+        self.connect = connect
+        self.sql = sql
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.on_commit = on_commit
+        self.synchronous = synchronous
+        self.batches = 0
+        self.rows = 0
+        self.failed: List[Tuple[Tuple, Any]] = []
+        self.error: Optional[str] = None
+        self._con = None
+        self._lock = threading.Lock()  # serializes writes in synchronous mode
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        if not synchronous:
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, params: Tuple, payload: Any = None) -> None:
+        if self._closed:
+            raise RuntimeError("write-behind queue is closed")
+        if self.error is not None:
+            raise RuntimeError(f"write-behind queue failed: {self.error}")
+        if self.synchronous:
+            with self._lock:
+                self._write([(params, payload)])
+        else:
+            self._queue.put((params, payload))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until rows submitted so far are committed. False on timeout."""
+        if self.synchronous or self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self) -> None:
+        """Commit everything still queued, then stop the writer."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+        if self._con is not None:
+            self._con.close()
+            self._con = None
+
+    def _insert(self, rows: List[Tuple[Tuple, Any]]) -> List[Any]:
+        """Insert rows in one transaction; returns the payloads of rows actually inserted."""
+        if self._con is None:
+            self._con = self.connect()
+        inserted = []
+        with self._con:
+            for params, payload in rows:
+                if self._con.execute(self.sql, params).rowcount == 1:
+                    inserted.append(payload)
+        return inserted
+
+    def _insert_each(self, batch: List[Tuple[Tuple, Any]]) -> List[Any]:
+        inserted = []
+        for row in batch:
+            while True:
+                try:
+                    inserted.extend(self._insert([row]))
+                    break
+                except sqlite3.OperationalError as e:
+                    log.error(f"Write-behind insert failed, retrying: {e}")
+                    time.sleep(0.05)
+                except Exception as e:
+                    log.error(f"Write-behind insert failed, row kept in .failed and queue stopped: {e}; {row[0]!r}")
+                    self.failed.append(row)
+                    self.error = str(e)
+                    break
+        return inserted
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch, waiters = [], []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if stopping or waiters or len(batch) >= self.max_batch:
+                    break
+                # Take what is already queued, then wait out the rest of the interval
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            for w in waiters:
+                w.set()
+
+    def _write(self, batch: List[Tuple[Tuple, Any]]) -> None:
+        """Insert and commit one batch. Lock and I/O errors are retried with backoff until
+        the batch is stored; after any other error the rows are written one by one, so
+        only the rows that cannot be stored are set aside (see the class docstring)."""
+        delay = 0.05
+        while True:
+            try:
+                inserted = self._insert(batch)
+                break
+            except sqlite3.OperationalError as e:
+                log.error(f"Write-behind flush of {len(batch)} rows failed, retrying: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, 1.0)
+            except Exception as e:
+                log.error(f"Write-behind flush of {len(batch)} rows failed, writing them one by one: {e}")
+                inserted = self._insert_each(batch)
+                break
+        self.batches += 1
+        self.rows += len(inserted)
+        if self.on_commit and inserted:
+            try:
+                self.on_commit(inserted)
+            except Exception as e:
+                log.error(f"Write-behind commit callback failed: {e}")
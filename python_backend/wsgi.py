@@ -0,0 +1,7 @@
+"""Production entry point: each worker process imports this module and builds its own app.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from app import create_app
+
+app = create_app()
@@ -7,6 +7,7 @@ const Attendance = () => {
   const [sessionName, setSessionName] = useState('');
   const [activeSession, setActiveSession] = useState(null);
   const [attendance, setAttendance] = useState([]);
+  const [newestCursor, setNewestCursor] = useState(null);
   const [status, setStatus] = useState('');
   const [scope, setScope] = useState('session');
   const [showManualModal, setShowManualModal] = useState(false);
@@ -27,17 +28,22 @@ const Attendance = () => {
     }
   };
 
+  const attendanceUrl = () => {
+    let url = `${API_BASE}/api/attendance?limit=500`;
+    if (scope === 'session' && activeSession) {
+      url += `&session_id=${activeSession.id}`;
+    } else if (scope === 'today') {
+      const today = new Date().toISOString().slice(0, 10);
+      url += `&date_from=${today}&date_to=${today}`;
+    }
+    return url;
+  };
+
   const fetchAttendance = async () => {
     try {
-      let url = `${API_BASE}/api/attendance?limit=500`;
-      if (scope === 'session' && activeSession) {
-        url += `&session_id=${activeSession.id}`;
-      } else if (scope === 'today') {
-        const today = new Date().toISOString().slice(0, 10);
-        url += `&date_from=${today}&date_to=${today}`;
-      }
-      const res = await axios.get(url);
+      const res = await axios.get(attendanceUrl());
       setAttendance(res.data);
+      setNewestCursor(res.headers['x-prev-cursor'] || null);
       setStatus(`Loaded ${res.data.length} attendance rows.`);
     } catch (error) {
       console.error('Error fetching attendance:', error);
@@ -45,6 +51,23 @@ const Attendance = () => {
     }
   };
 
+  // After a scan or manual mark, fetch only rows newer than the newest one shown
+  const fetchNewAttendance = async () => {
+    if (!newestCursor) {
+      fetchAttendance();
+      return;
+    }
+    try {
+      const res = await axios.get(`${attendanceUrl()}&before=${encodeURIComponent(newestCursor)}`);
+      if (res.data.length > 0) {
+        setAttendance((rows) => [...res.data, ...rows]);
+        setNewestCursor(res.headers['x-prev-cursor']);
+      }
+    } catch (error) {
+      console.error('Error fetching new attendance:', error);
+    }
+  };
+
   const startSession = async () => {
     try {
       const res = await axios.post(`${API_BASE}/api/session/start`, { name: sessionName });
@@ -91,7 +114,13 @@ const Attendance = () => {
       const payload = macOrId ? { mac_address: macOrId } : { name: name };
       const res = await axios.post(`${API_BASE}/api/validate`, payload);
 
-      if (res.data.logged) {
+      if (res.data.status === 'pending_confirmation') {
+        const best = res.data.pending_match.candidates[0];
+        setStatus(`UNSURE: ${name} looks like ${best.name} (${Math.round(best.score * 100)}%) — waiting for confirmation`);
+      } else if (res.data.reason === 'dwell_pending') {
+        const minutes = Math.round(res.data.min_dwell_seconds / 60);
+        setStatus(`SEEN: ${res.data.student.Name} — counted as present after ${minutes} min in the room`);
+      } else if (res.data.logged) {
         const scopeNote = res.data.scope === 'session' ? ' (session)' : ' (day)';
         setStatus(`VALID & LOGGED: ${res.data.student.Name} at ${res.data.timestamp}${scopeNote}`);
       } else {
@@ -100,7 +129,7 @@ const Attendance = () => {
           : 'already logged today';
         setStatus(`VALID (duplicate): ${res.data.student.Name} — ${reason}`);
       }
-      fetchAttendance();
+      fetchNewAttendance();
     } catch (err) {
       console.error(err);
       setStatus('Bluetooth scan failed or was cancelled.');
@@ -123,7 +152,7 @@ const Attendance = () => {
       await axios.post(`${API_BASE}/api/attendance`, manualStudent);
       setManualStudent({ student_id: '', name: '' });
       setShowManualModal(false);
-      fetchAttendance();
+      fetchNewAttendance();
       setStatus('Manual attendance logged.');
     } catch (error) {
       console.error('Error logging manual attendance:', error);
@@ -179,6 +208,7 @@ const Attendance = () => {
             <th>Name</th>
             <th>MAC</th>
             <th>Session</th>
+            <th>Dwell</th>
           </tr>
         </thead>
         <tbody>
@@ -189,6 +219,7 @@ const Attendance = () => {
               <td>{row.name}</td>
               <td>{row.mac}</td>
               <td>{row.session_id || ''}</td>
+              <td>{row.dwell_seconds == null ? '' : `${Math.round(row.dwell_seconds / 60)} min`}</td>
             </tr>
           ))}
         </tbody>
@@ -16,7 +16,7 @@ const Dashboard = () => {
     try {
       const [studentsRes, summaryRes, sessionRes] = await Promise.all([
         axios.get(`${API_BASE}/api/students`),
-        axios.get(`${API_BASE}/api/reports/summary?date=${new Date().toISOString().split('T')[0]}`),
+        axios.get(`${API_BASE}/api/reports/summary?live=1&date=${new Date().toISOString().split('T')[0]}`),
         axios.get(`${API_BASE}/api/session`)
       ]);
       setTotalStudents(studentsRes.data.length);
@@ -47,16 +47,14 @@ const Students = () => {
   const handleFileUpload = async (event) => {
     const file = event.target.files[0];
     if (file) {
-      const reader = new FileReader();
-      reader.onload = async (e) => {
-        try {
-          await axios.post(`${API_BASE}/api/students/upload`, { csv: e.target.result });
-          fetchStudents();
-        } catch (error) {
-          console.error('Error uploading CSV:', error);
-        }
-      };
-      reader.readAsText(file);
+      const form = new FormData();
+      form.append('file', file);
+      try {
+        await axios.post(`${API_BASE}/api/students/upload`, form);
+        fetchStudents();
+      } catch (error) {
+        console.error('Error uploading CSV:', error);
+      }
     }
   };
 
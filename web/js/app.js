@@ -114,15 +114,16 @@ studentSearchInput.addEventListener("input", renderStudents);
 csvUploadInput.addEventListener("change", async e => {
   const file = e.target.files[0];
   if (!file) return;
-  const text = await file.text();
+  const form = new FormData();
+  form.append("file", file);
   try {
     const res = await fetch(`${API_BASE}/students/upload`, {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ csv: text }),
+      body: form,
     });
     if (res.ok) {
-      setStatus("CSV uploaded successfully", "ok");
+      const report = await res.json();
+      setStatus(report.message || "CSV uploaded successfully", "ok");
       await fetchStudents();
     } else {
       const err = await res.json();
@@ -251,6 +252,7 @@ function renderAttendance() {
       <td>${r.name}</td>
       <td>${r.mac || ""}</td>
       <td>${r.session_id || ""}</td>
+      <td>${r.dwell_seconds == null ? "" : `${Math.round(r.dwell_seconds / 60)} min`}</td>
     `;
     attendanceTableBody.appendChild(tr);
   });
@@ -263,7 +265,7 @@ exportBtn.addEventListener("click", () => {
     return;
   }
   const format = exportFormatSelect.value;
-  const url = `${API_BASE}/attendance/export?session_id=${encodeURIComponent(activeSession.id)}&format=${format}`;
+  const url = `${API_BASE}/attendance/export?session_id=${encodeURIComponent(activeSession.id)}&format=${format}&live=1`;
   window.open(url, "_blank");
 });
 
@@ -384,12 +386,12 @@ exportReportBtn.addEventListener("click", () => {
 
 async function fetchSummary() {
   try {
-    let url = `${API_BASE}/reports/summary`;
+    let url = `${API_BASE}/reports/summary?live=1`;
     if (activeSession) {
-      url += `?session_id=${encodeURIComponent(activeSession.id)}`;
+      url += `&session_id=${encodeURIComponent(activeSession.id)}`;
     } else {
       const today = new Date().toISOString().slice(0, 10);
-      url += `?date=${today}`;
+      url += `&date=${today}`;
     }
     const res = await fetch(url);
     const data = await res.json();